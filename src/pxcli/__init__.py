@@ -1,2 +1,9 @@
-from . import layout
-from . import main
+import importlib
+
+__all__ = ["layout", "main", "top"]
+
+
+def __getattr__(name: str):
+    if name in __all__:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,44 +1,130 @@
 import json
-import os
-from typing import List
+import sys
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Tuple
 
-from tabulate import tabulate
+from pxctl.eta import EtaEstimator
+from pxctl.state_diff import ChangeDetector
+from pxctl.structs import Estimate, PrinterCatalog, PrinterState, Printer
 
-from pxctl.printer_service import PrinterState, Printer
+if TYPE_CHECKING:
+    from pxctl.instrumentation import CommandStats
+    from pxctl.sinks import SinkWriter
+
+CURSOR_HOME = "\x1b[H"
+CLEAR_SCREEN = "\x1b[2J"
+CLEAR_LINE_END = "\x1b[K"
+CLEAR_SCREEN_END = "\x1b[J"
+
+
+def command_name(code: int) -> str:
+    from pxctl.printer_service import COMMAND_NAMES
+
+    return COMMAND_NAMES.get(code, f"0x{code:02x}")
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+class ProgressEstimates:
+    """Feeds polled states to an ETA estimator once each.
+
+    A fleet redraw passes the last state of every printer, only the freshly
+    polled ones are new samples.
+    """
+
+    def __init__(self, estimator: EtaEstimator | None = None, clock: Callable[[], float] = time.monotonic):
+        self.__estimator = estimator or EtaEstimator()
+        self.__clock = clock
+        self.__fed: Dict[str, PrinterState | None] = {}
+
+    def of(self, states: Dict[str, PrinterState | None]) -> Dict[str, Estimate | None]:
+        estimates = {}
+        for address, info in states.items():
+            if address in self.__fed and self.__fed[address] is info:
+                estimates[address] = self.__estimator.estimate(address)
+            else:
+                self.__fed[address] = info
+                estimates[address] = self.__estimator.update(address, info, self.__clock())
+        return estimates
 
 
 class TableLayout:
-    def print_info(self, address: str, info: PrinterState | None = None):
-        headers = [
-            "Address",
-            "State",
-            "Task name",
-            "Progress %",
-            "Left ℃",
-            "Right ℃",
-            "Table ℃",
-            "Ready",
-        ]
+    HEADERS = [
+        "Address",
+        "State",
+        "Task name",
+        "Progress %",
+        "Rate %/min",
+        "ETA",
+        "Left ℃",
+        "Right ℃",
+        "Table ℃",
+        "Ready",
+    ]
+
+    @staticmethod
+    def info_row(address: str, info: PrinterState | None = None, estimate: Estimate | None = None) -> list:
         if info:
-            table = [
-                [
-                    address,
-                    info.state.name,
-                    info.current_task_file,
-                    round(info.progress_percents, 1),
-                    round(info.left_extruder_temperature, 1),
-                    round(info.right_extruder_temperature, 1),
-                    round(info.table_temperature, 1),
-                    info.is_ready,
-                ]
+            rate, eta = "", ""
+            if estimate is not None:
+                rate = round(estimate.progress_rate * 60, 2)
+                eta = format_duration(estimate.eta_seconds) if estimate.eta_seconds is not None else ""
+            return [
+                address,
+                info.state.name,
+                info.current_task_file,
+                round(info.progress_percents, 1),
+                rate,
+                eta,
+                round(info.left_extruder_temperature, 1),
+                round(info.right_extruder_temperature, 1),
+                round(info.table_temperature, 1),
+                info.is_ready,
             ]
-        else:
-            table = [[address, "NOT_CONNECTED", "", "", "", "", "", ""]]
+        return [address, "NOT_CONNECTED", "", "", "", "", "", "", "", ""]
 
-        os.system('cls' if os.name == 'nt' else 'clear')
-        print(tabulate(table, headers=headers, tablefmt="github"))
+    def __init__(self, change_detector: ChangeDetector | None = None, estimates: ProgressEstimates | None = None):
+        self.__change_detector = change_detector
+        self.__estimates = estimates or ProgressEstimates()
+        self.__drawn = False
+
+    def print_info(self, address: str, info: PrinterState | None = None, estimate: Estimate | None = None):
+        self.print_fleet({address: info}, None if estimate is None else {address: estimate})
+
+    def print_fleet(self, states: Dict[str, PrinterState | None], estimates: Dict[str, Estimate | None] | None = None):
+        """Prints the state of printers
+
+        Args:
+            states (Dict[str, PrinterState | None]): the last state of every printer
+            estimates (Dict[str, Estimate | None] | None): ETAs estimated elsewhere, e.g. by the daemon,
+                estimated from the printed states if omitted
+        """
+        if estimates is None:
+            estimates = self.__estimates.of(states)
+        if self.__change_detector is not None:
+            changed = [self.__change_detector.changes(address, info) for address, info in states.items()]
+            if self.__drawn and not any(changed):
+                return
+
+        from tabulate import tabulate
+
+        table = [self.info_row(address, info, estimates.get(address)) for address, info in states.items()]
+        lines = tabulate(table, headers=self.HEADERS, tablefmt="github").splitlines()
+
+        # redraw in place over the previous frame instead of clearing the terminal
+        frame = CURSOR_HOME if self.__drawn else CURSOR_HOME + CLEAR_SCREEN
+        frame += "".join(f"{line}{CLEAR_LINE_END}\n" for line in lines) + CLEAR_SCREEN_END
+        sys.stdout.write(frame)
+        sys.stdout.flush()
+        self.__drawn = True
 
     def print_discover(self, printers: List[Printer]):
+        from tabulate import tabulate
+
         headers = ["Printer type", "Address", "Serial", "Left profile", "Right profile"]
 
         table = []
@@ -56,28 +142,137 @@ class TableLayout:
 
         print(tabulate(table, headers=headers, tablefmt="github"))
 
+    def print_printlists(self, catalogs: Dict[str, PrinterCatalog]):
+        from tabulate import tabulate
+
+        headers = ["Address", "Serial", "Print list", "Tasks"]
+        table = [
+            [address, catalog.serial, printlist.name or "(default)", printlist.task_count]
+            for address, catalog in catalogs.items()
+            for printlist in catalog.printlists.values()
+        ]
+        print(tabulate(table, headers=headers, tablefmt="github"))
+
+    def print_tasks(self, catalogs: Dict[str, PrinterCatalog], printlist: str | None = None):
+        from tabulate import tabulate
+
+        headers = ["Address", "Serial", "Print list", "Task name", "Size, MB"]
+        table = [
+            [address, catalog.serial, name or "(default)", task.name, round(task.size / 1e6, 2)]
+            for address, catalog in catalogs.items()
+            for name, tasks in catalog.tasks.items()
+            if printlist is None or name == printlist
+            for task in tasks
+        ]
+        print(tabulate(table, headers=headers, tablefmt="github"))
+
+    def print_stats(self, stats: Dict[Tuple[str, int], "CommandStats"], started_at: float):
+        from datetime import datetime
+        from tabulate import tabulate
+
+        headers = ["Printer", "Command", "Sent", "Replies", "Loss %", "Retries", "Timeouts", "Stale", "Malformed",
+                   "p50 ms", "p90 ms", "p99 ms", "Max ms", "Decode p50 µs"]
+        table = [
+            [
+                address,
+                command_name(code),
+                command_stats.sends,
+                command_stats.replies,
+                round(command_stats.loss_percents, 1),
+                command_stats.retries,
+                command_stats.timeouts,
+                command_stats.stale_frames,
+                command_stats.malformed_frames,
+                round(command_stats.latency.percentile(50) * 1e3, 2),
+                round(command_stats.latency.percentile(90) * 1e3, 2),
+                round(command_stats.latency.percentile(99) * 1e3, 2),
+                round(command_stats.latency.max / 1e3, 2),
+                round(command_stats.decode.percentile(50) * 1e6),
+            ]
+            for (address, code), command_stats in stats.items()
+        ]
+        print(f"Since {datetime.fromtimestamp(started_at).isoformat(sep=' ', timespec='seconds')}")
+        print(tabulate(table, headers=headers, tablefmt="github"))
+
 
 class JsonLayout:
-    def print_info(self, address: str, info: PrinterState | None = None):
+    DELTA_KEYS = {
+        "state": "state",
+        "current_task_file": "task_name",
+        "progress_percents": "progress_percent",
+        "left_extruder_temperature": "left_extruder_temperature",
+        "right_extruder_temperature": "right_extruder_temperature",
+        "table_temperature": "table_temperature",
+        "is_ready": "is_ready",
+    }
 
+    def __init__(self, change_detector: ChangeDetector | None = None, delta: bool = False,
+                 estimates: ProgressEstimates | None = None):
+        self.__change_detector = change_detector
+        self.__delta = delta
+        self.__estimates = estimates or ProgressEstimates()
+
+    @staticmethod
+    def info_dto(address: str, info: PrinterState | None = None, estimate: Estimate | None = None) -> dict:
         if info:
-            dto = {
+            eta_seconds = None
+            if estimate is not None and estimate.eta_seconds is not None:
+                eta_seconds = round(estimate.eta_seconds)
+            return {
                 "address": address,
                 "state": info.state.name,
                 "task_name": info.current_task_file,
                 "progress_percent": round(info.progress_percents, 1),
                 "left_extruder_temperature": round(info.left_extruder_temperature, 1),
                 "right_extruder_temperature": round(info.right_extruder_temperature, 1),
-                "table_temperature": round(info.right_extruder_temperature, 1),
+                "table_temperature": round(info.table_temperature, 1),
                 "is_ready": info.is_ready,
+                "progress_rate": round(estimate.progress_rate, 5) if estimate is not None else None,
+                "eta_seconds": eta_seconds,
             }
-        else:
-            dto = {
-                "address": address,
-                "state": "NOT_CONNECTED",
-            }
+        return {
+            "address": address,
+            "state": "NOT_CONNECTED",
+        }
 
-        print(json.dumps(dto))
+    @classmethod
+    def delta_dto(cls, address: str, changes: Dict[str, object]) -> dict:
+        dto = {"address": address}
+        for name, value in changes.items():
+            key = cls.DELTA_KEYS.get(name)
+            if key is None:
+                continue
+            if name == "state":
+                value = value.name if value is not None else "NOT_CONNECTED"
+            elif isinstance(value, float):
+                value = round(value, 1)
+            dto[key] = value
+        return dto
+
+    def __dto(self, address: str, info: PrinterState | None, estimate: Estimate | None) -> dict | None:
+        if self.__change_detector is None:
+            return self.info_dto(address, info, estimate)
+        changes = self.__change_detector.changes(address, info)
+        if changes is None:
+            return None
+        if self.__delta:
+            return self.delta_dto(address, changes)
+        return self.info_dto(address, info, estimate)
+
+    def print_info(self, address: str, info: PrinterState | None = None, estimate: Estimate | None = None):
+        if estimate is None:
+            estimate = self.__estimates.of({address: info})[address]
+        dto = self.__dto(address, info, estimate)
+        if dto is not None:
+            print(json.dumps(dto), flush=True)
+
+    def print_fleet(self, states: Dict[str, PrinterState | None], estimates: Dict[str, Estimate | None] | None = None):
+        if estimates is None:
+            estimates = self.__estimates.of(states)
+        dtos = [self.__dto(address, info, estimates.get(address)) for address, info in states.items()]
+        dtos = [dto for dto in dtos if dto is not None]
+        if dtos or self.__change_detector is None:
+            print(json.dumps(dtos), flush=True)
 
     def print_discover(self, printers: List[Printer]):
         dto = []
@@ -94,3 +289,93 @@ class JsonLayout:
             )
 
         print(json.dumps(dto))
+
+    def print_printlists(self, catalogs: Dict[str, PrinterCatalog]):
+        dto = [
+            {
+                "ip_address": address,
+                "serial": catalog.serial,
+                "printlist": printlist.name,
+                "task_count": printlist.task_count,
+            }
+            for address, catalog in catalogs.items()
+            for printlist in catalog.printlists.values()
+        ]
+        print(json.dumps(dto))
+
+    def print_tasks(self, catalogs: Dict[str, PrinterCatalog], printlist: str | None = None):
+        dto = [
+            {
+                "ip_address": address,
+                "serial": catalog.serial,
+                "printlist": name,
+                "task_name": task.name,
+                "size": task.size,
+            }
+            for address, catalog in catalogs.items()
+            for name, tasks in catalog.tasks.items()
+            if printlist is None or name == printlist
+            for task in tasks
+        ]
+        print(json.dumps(dto))
+
+    def print_stats(self, stats: Dict[Tuple[str, int], "CommandStats"], started_at: float):
+        dto = {
+            "started_at": started_at,
+            "stats": [
+                {
+                    "address": address,
+                    "code": code,
+                    "command": command_name(code),
+                    **command_stats.to_dict(),
+                    "loss_percent": round(command_stats.loss_percents, 2),
+                    "latency_ms": {
+                        f"p{percent}": round(command_stats.latency.percentile(percent) * 1e3, 3)
+                        for percent in (50, 90, 99)
+                    },
+                }
+                for (address, code), command_stats in stats.items()
+            ],
+        }
+        print(json.dumps(dto))
+
+
+class SinkLayout:
+    """Feeds polled states to an output sink, stamped with the poll time and printer serial."""
+
+    def __init__(
+        self,
+        writer: "SinkWriter",
+        change_detector: ChangeDetector | None = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.__writer = writer
+        self.__clock = clock
+        self.__serials: Dict[str, str | None] = {}
+        self.__change_detector = change_detector
+        self.__emitted: Dict[str, PrinterState | None] = {}
+
+    def __serial(self, address: str) -> str | None:
+        if address not in self.__serials:
+            from pxctl.discovery_cache import DiscoveryCache
+
+            for printer in DiscoveryCache().lookup():
+                self.__serials.setdefault(printer.ip_address, printer.serial)
+            self.__serials.setdefault(address, None)
+        return self.__serials[address]
+
+    def print_info(self, address: str, info: PrinterState | None = None, estimate: Estimate | None = None):
+        self.print_fleet({address: info})
+
+    def print_fleet(self, states: Dict[str, PrinterState | None], estimates: Dict[str, Estimate | None] | None = None):
+        from pxctl.sinks import SinkRecord
+
+        timestamp = self.__clock()
+        for address, info in states.items():
+            # a fleet redraw passes every printer, only the freshly polled ones are new samples
+            if address in self.__emitted and self.__emitted[address] is info:
+                continue
+            self.__emitted[address] = info
+            if self.__change_detector is not None and self.__change_detector.changes(address, info) is None:
+                continue
+            self.__writer.write(SinkRecord(timestamp, address, self.__serial(address), info))
@@ -4,54 +4,363 @@ import argparse
 import os
 import sys
 import signal
-from time import sleep
+from time import monotonic, sleep, time
+from typing import TYPE_CHECKING, Callable
 
-from pxctl.notifications import Notifications
-from pxctl.printer_service import Connection, PrinterService
-from .layout import JsonLayout, TableLayout
+# Subcommands import what they use when they run, 'pxctl beep -a ADDRESS'
+# doesn't load asyncio, netifaces or tabulate
+if TYPE_CHECKING:
+    from pxctl.catalog import CatalogIndex
+    from pxctl.connection import Connection
+    from pxctl.dispatch import BatchProgress, DispatchResult
+    from pxctl.notifications import Notifications
+    from pxctl.scheduler import PollScheduler
+    from pxctl.sinks import SinkWriter
+    from pxctl.structs import PrinterCatalog
+    from pxctl.upload import UploadProgress
+
+DEFAULT_STATS_DURATION = 10.0
 
 cur_dir = os.path.realpath(os.path.dirname(os.path.abspath(__file__)))
 SRC_DIR = os.path.realpath(cur_dir)
 
-if os.path.isdir(SRC_DIR):
-    sys.path.insert(0, SRC_DIR)
-
-
 
 def signal_handler(sig, frame):
     sys.exit(0)
 
 
-signal.signal(signal.SIGINT, signal_handler)
+def split_patterns(values: list | None) -> list:
+    return [pattern.strip() for value in values or [] for pattern in value.split(",") if pattern.strip()]
+
+
+def get_broadcast_addresses(args) -> set:
+    from pxctl.utils import NetworkUtils
+
+    include = split_patterns(getattr(args, "iface", None))
+    broadcast_addresses = NetworkUtils.get_all_ipv4_broadcast_addresses(
+        include, split_patterns(getattr(args, "exclude_iface", None))
+    )
+    if include and not broadcast_addresses:
+        print(f"No IPv4 broadcast address on interfaces {', '.join(include)}", file=sys.stderr)
+    return broadcast_addresses
+
+
+def discover_printers(args, timeout: float = 1.0, expect: int | None = None) -> list:
+    from pxctl.printer_service import PrinterService
+
+    subnets = split_patterns(getattr(args, "subnet", None))
+    if not subnets:
+        return PrinterService.discover_printers(timeout, expect, get_broadcast_addresses(args))
+    try:
+        return PrinterService.sweep_printers(subnets, timeout, expect, args.sweep_rate)
+    except ValueError as e:
+        print(f"Wrong subnet: {e}", file=sys.stderr)
+        sys.exit(-1)
+
+
+def add_discovery_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--iface", type=str, action="append", metavar="PATTERNS",
+                        help="Discover printers only on the comma separated interfaces, shell patterns like 'eth*' are allowed. "
+                             "By default, all interfaces which are up except loopback and virtual ones are used.")
+    parser.add_argument("--exclude-iface", type=str, action="append", metavar="PATTERNS",
+                        help="Never discover printers on the comma separated interfaces, shell patterns are allowed.")
+    parser.add_argument("--subnet", type=str, action="append", metavar="CIDRS",
+                        help="Discover printers on the comma separated routed subnets, e.g. 10.20.0.0/22, "
+                             "by probing every host instead of broadcasting.")
+    parser.add_argument("--sweep-rate", type=float, default=5000.0, metavar="PROBES_PER_SECOND",
+                        help="Send at most this many probes per second with --subnet. Default: %(default)s")
+
+
+def add_output_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("-j", "--json", help="Output the information of printer state in JSON format.",
+                        action="store_true")
+    parser.add_argument("-o", "--output", choices=("ndjson", "csv", "binary"),
+                        help="Stream timestamped states with the printer serial in this format, "
+                             "written in batches so a slow reader never holds up polling.")
+    parser.add_argument("--output-file", type=str, default="-", metavar="PATH",
+                        help="With --output, append to PATH instead of the standard output. Default: %(default)s")
+    parser.add_argument("--backpressure", choices=("drop-oldest", "block"), default="drop-oldest",
+                        help="With --output, when the reader falls --queue-size states behind, drop the oldest "
+                             "queued state or wait for the reader. Default: %(default)s")
+    parser.add_argument("--queue-size", type=int, default=10000, metavar="STATES",
+                        help="With --output, queue at most this many states. Default: %(default)s")
+    parser.add_argument("--flush-interval", type=float, default=0.0, metavar="SECONDS",
+                        help="With --output, flush a busy stream at most every SECONDS, 0 flushes every batch. "
+                             "An idle stream is always flushed. Default: %(default)s")
+    parser.add_argument("--changes-only",
+                        help="Output the state only when it meaningfully changed since the last output.",
+                        action="store_true")
+    parser.add_argument("--delta",
+                        help="Output only the changed fields of the state in JSON format, implies --changes-only.",
+                        action="store_true")
+    parser.add_argument("--temperature-deadband", type=float, default=0.5, metavar="DEGREES",
+                        help="Ignore temperature changes smaller than DEGREES with --changes-only. Default: %(default)s")
+    parser.add_argument("--progress-deadband", type=float, default=0.1, metavar="PERCENTS",
+                        help="Ignore progress changes smaller than PERCENTS with --changes-only. Default: %(default)s")
+
+
+def add_hook_arguments(parser: argparse.ArgumentParser):
+    from pxctl.notifications import EVENT_KINDS, TEMPERATURE_CHANNELS
+
+    parser.add_argument("-s", "--on-success", type=str,
+                        help="Once the printing is complete, execute the bash script hook. example: %(prog)s --on-success='touch /tmp/done' ",
+                        metavar="BASH_SCRIPT")
+    parser.add_argument("--on-event", type=str, action="append", default=[], metavar="EVENTS=BASH_SCRIPT",
+                        help=f"Execute the bash script hook on comma separated EVENTS, one of {', '.join(EVENT_KINDS)}. "
+                             "Event details are passed in PXCTL_* environment variables. "
+                             "example: %(prog)s --on-event='state,print_done=notify.sh'")
+    parser.add_argument("--temperature-threshold", type=str, action="append", default=[],
+                        metavar="CHANNEL=DEGREES",
+                        help=f"Emit a temperature event when CHANNEL, one of {', '.join(TEMPERATURE_CHANNELS)}, crosses DEGREES.")
+    parser.add_argument("--progress-milestones", type=str, default="25,50,75,100", metavar="PERCENTS",
+                        help="Comma separated progress milestones to emit progress events on. Default: %(default)s")
+    parser.add_argument("--anomaly-window", type=int, default=60, metavar="POLLS",
+                        help="Compare temperatures with their mean and deviation over the last POLLS polls "
+                             "of the printer to emit anomaly events. Default: %(default)s")
+    parser.add_argument("--anomaly-sigmas", type=float, default=4.0, metavar="SIGMAS",
+                        help="Emit an anomaly event when a temperature is more than SIGMAS deviations off its mean. "
+                             "Default: %(default)s")
+    parser.add_argument("--anomaly-rate", type=float, default=3.0, metavar="DEGREES_PER_SECOND",
+                        help="Emit an anomaly event when a temperature changes faster than this while printing. Default: %(default)s")
+    parser.add_argument("--anomaly-fleet-deviation", type=float, default=10.0, metavar="DEGREES",
+                        help="Emit an anomaly event when a temperature is further off the median of the printers "
+                             "printing with the same material profile. Default: %(default)s")
+    parser.add_argument("--hook-workers", type=int, default=4,
+                        help="Run at most this many hooks at once. Default: %(default)s")
+    parser.add_argument("--hook-timeout", type=float, default=60.0, metavar="SECONDS",
+                        help="Kill hooks running longer than SECONDS. Default: %(default)s")
 
 
 def get_address(args) -> str:
     if args.address:
-        address = args.address
-    else:
-        printers = PrinterService.discover_printers()
-        if len(printers) == 0:
+        return args.address
+
+    from pxctl.discovery_cache import DiscoveryCache
+
+    serial = getattr(args, "serial", None)
+    cache = DiscoveryCache()
+    if not getattr(args, "no_cache", False):
+        printer = cache.find(serial)
+        if printer is not None:
+            return printer.ip_address
+
+    printers = discover_printers(args, expect=1 if serial is None else None)
+    cache.update(printers)
+    if serial is not None:
+        printers = [printer for printer in printers if printer.serial == serial]
+    if len(printers) == 0:
+        print("Printers not found, try set ip address manually", file=sys.stderr)
+        sys.exit(-1)
+
+    return printers[0].ip_address
+
+
+def get_addresses(args) -> list:
+    from pxctl.discovery_cache import DiscoveryCache
+
+    if args.all:
+        printers = discover_printers(args)
+        DiscoveryCache().update(printers)
+        addresses = [printer.ip_address for printer in printers]
+        if len(addresses) == 0:
             print("Printers not found, try set ip address manually", file=sys.stderr)
             sys.exit(-1)
-        else:
-            address = printers[0].ip_address
+        return addresses
+
+    if args.address:
+        return [address.strip() for address in args.address.split(",") if address.strip()]
 
-    return address
+    return [get_address(args)]
 
 
-def get_layout(args):
-    if args.json:
-        return JsonLayout()
+def get_layout(args, writer: "SinkWriter | None" = None, clock: "Callable[[], float] | None" = None):
+    from pxctl.state_diff import ChangeDetector, Deadbands
+    from .layout import JsonLayout, ProgressEstimates, SinkLayout, TableLayout
+
+    change_detector = None
+    if getattr(args, "changes_only", False) or getattr(args, "delta", False):
+        change_detector = ChangeDetector(
+            Deadbands(temperature=args.temperature_deadband, progress=args.progress_deadband)
+        )
+
+    if writer is not None:
+        return SinkLayout(writer, change_detector, clock or time)
+    estimates = ProgressEstimates(clock=clock) if clock is not None else None
+    if args.json or getattr(args, "delta", False):
+        return JsonLayout(change_detector, delta=getattr(args, "delta", False), estimates=estimates)
+    else:
+        return TableLayout(change_detector, estimates)
+
+
+def parse_assignment(parser, value: str, option: str) -> tuple:
+    key, sep, assigned = value.partition("=")
+    if not sep or not key or not assigned:
+        parser.error(f"{option} expects KEY=VALUE, got '{value}'")
+    return key, assigned
+
+
+def get_notifications(args) -> "Notifications":
+    from pxctl.anomaly import AnomalyDetector, AnomalyThresholds
+    from pxctl.notifications import (
+        EVENT_ANOMALY,
+        EVENT_KINDS,
+        TEMPERATURE_CHANNELS,
+        EventEngine,
+        Hook,
+        HookRunner,
+        Notifications,
+    )
+
+    parser = args.parser
+    hooks = []
+    for value in args.on_event:
+        kinds, command = parse_assignment(parser, value, "--on-event")
+        kinds = tuple(kinds.split(","))
+        unknown = set(kinds) - set(EVENT_KINDS)
+        if unknown:
+            parser.error(f"Unknown events {', '.join(sorted(unknown))}, expected {', '.join(EVENT_KINDS)}")
+        hooks.append(Hook(command, kinds))
+
+    temperature_thresholds = {}
+    for value in args.temperature_threshold:
+        channel, degrees = parse_assignment(parser, value, "--temperature-threshold")
+        if channel not in TEMPERATURE_CHANNELS:
+            parser.error(f"Unknown channel {channel}, expected {', '.join(TEMPERATURE_CHANNELS)}")
+        temperature_thresholds.setdefault(channel, []).append(float(degrees))
+
+    milestones = [float(milestone) for milestone in args.progress_milestones.split(",") if milestone]
+
+    # temperatures are only watched for anomalies when a hook wants to hear about them
+    anomaly_detector = None
+    if any(EVENT_ANOMALY in hook.kinds for hook in hooks):
+        anomaly_detector = AnomalyDetector(AnomalyThresholds(
+            window=args.anomaly_window,
+            sigmas=args.anomaly_sigmas,
+            rate=args.anomaly_rate,
+            fleet_deviation=args.anomaly_fleet_deviation,
+        ))
+
+    return Notifications(
+        args.on_success,
+        hooks,
+        EventEngine(temperature_thresholds, milestones, anomaly_detector),
+        HookRunner(args.hook_workers, args.hook_timeout),
+    )
+
+
+def get_scheduler(args) -> "PollScheduler":
+    from pxctl.scheduler import PollIntervals, PollScheduler
+
+    return PollScheduler(PollIntervals(idle=args.idle_interval, printing=args.interval, fast=args.fast_interval))
+
+
+def ask_daemon(args, request):
+    if getattr(args, "no_daemon", False):
+        return None
+    # the daemon knows only the printers it discovered itself
+    if getattr(args, "iface", None) or getattr(args, "exclude_iface", None) or getattr(args, "subnet", None):
+        return None
+
+    from pxctl.daemon_client import DaemonClient, DaemonError
+
+    try:
+        return request(DaemonClient())
+    except DaemonError as e:
+        print(f"{e}, falling back to direct mode", file=sys.stderr)
+        return None
+
+
+def show_via_daemon(args, layout_service, notifications: "Notifications") -> bool:
+    addresses = [address.strip() for address in args.address.split(",") if address.strip()] if args.address else None
+    result = ask_daemon(
+        args, lambda client: client.show_with_estimates(addresses, getattr(args, "serial", None), args.all)
+    )
+    if result is None:
+        return False
+    states, estimates = result
+    if len(states) == 0:
+        print("Printers not found, try set ip address manually", file=sys.stderr)
+        sys.exit(-1)
+
+    if args.all or len(states) > 1:
+        layout_service.print_fleet(states, estimates)
     else:
-        return TableLayout()
+        address, optional_info = next(iter(states.items()))
+        layout_service.print_info(address, optional_info, estimates.get(address))
+    for address, optional_info in states.items():
+        notifications.update_state(optional_info, address)
+    return True
+
+
+def get_sink_writer(args) -> "SinkWriter | None":
+    from pxctl.sinks import SinkWriter
+
+    if args.output is None:
+        return None
+    if args.json or args.delta:
+        args.parser.error("--output can't be combined with --json or --delta, use --changes-only instead")
+    if args.output_file == "-":
+        sys.stdout.flush()
+        stream, header = sys.stdout.buffer, True
+    else:
+        stream = open(args.output_file, "ab")
+        header = stream.tell() == 0
+    return SinkWriter(stream, args.output, args.backpressure, args.queue_size,
+                      flush_interval=args.flush_interval, header=header)
+
+
+def resolve_serials(addresses: list):
+    from concurrent.futures import ThreadPoolExecutor
+    from pxctl.connection import Connection
+    from pxctl.discovery_cache import DiscoveryCache
+
+    def resolve(address: str):
+        with Connection(address) as connection:
+            get_serial(address, connection)
+
+    # serials missing from the discovery cache are asked once, before polling starts
+    known = {printer.ip_address for printer in DiscoveryCache().lookup()}
+    missing = [address for address in addresses if address not in known]
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(16, len(missing))) as executor:
+            list(executor.map(resolve, missing))
 
 
 def show(args):
-    layout_service = get_layout(args)
-    address = get_address(args)
+    writer = get_sink_writer(args)
+    layout_service = get_layout(args, writer)
+    notifications = get_notifications(args)
+    try:
+        if not args.continuous and show_via_daemon(args, layout_service, notifications):
+            return
+
+        addresses = get_addresses(args)
+        if writer is not None:
+            resolve_serials(addresses)
+        if args.continuous:
+            from pxctl.discovery_cache import DiscoveryCache
+
+            notifications.set_printers(DiscoveryCache().lookup())
+        if args.all or len(addresses) > 1:
+            import asyncio
+
+            asyncio.run(show_fleet(args, layout_service, notifications, addresses))
+        else:
+            show_printer(args, layout_service, notifications, addresses[0])
+    finally:
+        notifications.close()
+        if writer is not None:
+            writer.close()
+
+
+def show_printer(args, layout_service, notifications: "Notifications", address: str):
+    from pxctl.connection import Connection
+    from pxctl.printer_service import PrinterService
+
     should_repeat = args.continuous
 
-    notifications = Notifications(args.on_success)
+    scheduler = get_scheduler(args)
+    scheduler.add(address)
 
     with Connection(address) as connection:
         print_service = PrinterService(connection)
@@ -59,33 +368,424 @@ def show(args):
         while True:
             optional_info = print_service.get_printing_info()
             layout_service.print_info(address, optional_info)
-            notifications.update_state(optional_info)
+            notifications.update_state(optional_info, address)
 
             if not should_repeat:
                 break
 
-            sleep(0.6)
+            scheduler.schedule(address, optional_info)
+            sleep(scheduler.sleep_time())
+
+
+def polled_states(states: dict, addresses: list) -> dict:
+    """Gets the states of the printers polled so far, in the order they were given"""
+    return {address: states[address] for address in addresses if address in states}
+
+
+async def show_fleet(args, layout_service, notifications: "Notifications", addresses: list):
+    import asyncio
+    from pxctl.async_printer_service import AsyncPrinterService
+
+    async with AsyncPrinterService(addresses) as print_service:
+        if not args.continuous:
+            states = await print_service.poll_all()
+            layout_service.print_fleet(states)
+            for address, optional_info in states.items():
+                notifications.update_state(optional_info, address)
+            return
+
+        scheduler = get_scheduler(args)
+        states = {}
+        updated = asyncio.Event()
+
+        # every printer is polled on its own schedule, a slow one never holds the others back
+        async def poll_printer(address: str):
+            scheduler.add(address)
+            while True:
+                optional_info = await print_service.get_printing_info(address)
+                states[address] = optional_info
+                notifications.update_state(optional_info, address)
+                updated.set()
+                scheduler.schedule(address, optional_info)
+                await asyncio.sleep(max(0.0, scheduler.deadline(address) - monotonic()))
+
+        pollers = [asyncio.create_task(poll_printer(address)) for address in addresses]
+        try:
+            # the polls of a tick are output together, no faster than the fastest printer is polled
+            while True:
+                await updated.wait()
+                updated.clear()
+                layout_service.print_fleet(polled_states(states, addresses))
+                await asyncio.sleep(args.fast_interval)
+        finally:
+            for poller in pollers:
+                poller.cancel()
 
 
 def discover(args):
+    from pxctl.discovery_cache import DiscoveryCache
+
     layout_service = get_layout(args)
-    printers = PrinterService.discover_printers()
+    printers = ask_daemon(args, lambda client: client.discover())
+    if printers is None:
+        printers = discover_printers(args, args.timeout, args.expect)
+        DiscoveryCache().update(printers)
     layout_service.print_discover(printers)
 
 
+def daemon(args):
+    import asyncio
+    from pxctl.daemon import Daemon, DaemonError
+
+    addresses = [address.strip() for address in args.address.split(",") if address.strip()] if args.address else None
+    service = Daemon(
+        addresses,
+        args.socket,
+        get_scheduler(args),
+        args.discovery_interval,
+        split_patterns(args.iface),
+        split_patterns(args.exclude_iface),
+        split_patterns(args.subnet),
+        args.sweep_rate,
+        args.board,
+        args.board_slots,
+    )
+    print(f"Listening on {service.path}", file=sys.stderr)
+    try:
+        asyncio.run(service.serve_forever())
+    except DaemonError as e:
+        print(e, file=sys.stderr)
+        sys.exit(-1)
+
+
+def export(args):
+    from pxctl.exporter import MetricsExporter
+
+    host, _, port = args.listen.rpartition(":")
+    try:
+        port = int(port)
+    except ValueError:
+        print(f"Wrong listen address {args.listen}, expected [HOST]:PORT", file=sys.stderr)
+        sys.exit(-1)
+
+    exporter = MetricsExporter(get_addresses(args), interval=args.interval)
+    exporter.start(host, port)
+    try:
+        exporter.serve_forever()
+    finally:
+        exporter.stop()
+
+
+async def record_fleet(args, addresses: list, writers: dict):
+    import asyncio
+    from pxctl.async_printer_service import AsyncPrinterService
+
+    async with AsyncPrinterService(addresses) as print_service:
+        while True:
+            timestamp = time()
+            states = await print_service.poll_all()
+            for address, optional_info in states.items():
+                if optional_info is not None:
+                    writers[address].append(timestamp, optional_info)
+
+            await asyncio.sleep(max(0.0, timestamp + args.interval - time()))
+
+
+def record(args):
+    import asyncio
+    from pxctl.history import HistoryWriter, default_history_dir, printer_dir
+
+    addresses = get_addresses(args)
+    root = args.dir or default_history_dir()
+    writers = {address: HistoryWriter(printer_dir(root, address)) for address in addresses}
+    try:
+        asyncio.run(record_fleet(args, addresses, writers))
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+
+def history(args):
+    from datetime import datetime
+    import json
+    from pxctl.history import HistoryReader, default_history_dir, parse_since, printer_dir
+
+    root = args.dir or default_history_dir()
+    printers = sorted(os.listdir(root)) if os.path.isdir(root) else []
+    if not args.address:
+        print("\n".join(printers))
+        return
+
+    directory = printer_dir(root, args.address)
+    if not os.path.isdir(directory):
+        print(f"No history of {args.address}, recorded printers: {', '.join(printers)}", file=sys.stderr)
+        sys.exit(-1)
+
+    since = parse_since(args.since) if args.since else None
+    until = parse_since(args.until) if args.until else None
+
+    with HistoryReader(directory) as reader:
+        if args.tasks:
+            print("\n".join(reader.tasks))
+            return
+
+        samples = reader.query(since, until, args.task, args.step)
+        if args.json:
+            for sample in samples:
+                print(json.dumps({
+                    "timestamp": round(sample.timestamp, 3),
+                    "state": sample.state.name,
+                    "task_name": sample.task,
+                    "progress_percent": round(sample.progress_percents, 1),
+                    "left_extruder_temperature": round(sample.left_extruder_temperature, 1),
+                    "right_extruder_temperature": round(sample.right_extruder_temperature, 1),
+                    "table_temperature": round(sample.table_temperature, 1),
+                }))
+        else:
+            from tabulate import tabulate
+
+            table = [
+                [
+                    datetime.fromtimestamp(sample.timestamp).isoformat(sep=" ", timespec="milliseconds"),
+                    sample.state.name,
+                    sample.task,
+                    round(sample.progress_percents, 1),
+                    round(sample.left_extruder_temperature, 1),
+                    round(sample.right_extruder_temperature, 1),
+                    round(sample.table_temperature, 1),
+                ]
+                for sample in samples
+            ]
+            headers = ["Time", "State", "Task name", "Progress %", "Left ℃", "Right ℃", "Table ℃"]
+            print(tabulate(table, headers=headers, tablefmt="github"))
+
+
+async def measure_fleet(addresses: list, interval: float, duration: float):
+    import asyncio
+    from pxctl.async_printer_service import AsyncPrinterService
+
+    async with AsyncPrinterService(addresses) as print_service:
+        deadline = monotonic() + duration
+        while True:
+            started_at = monotonic()
+            await print_service.poll_all()
+            if started_at + interval >= deadline:
+                break
+            await asyncio.sleep(max(0.0, started_at + interval - monotonic()))
+
+
+def stats(args):
+    import ipaddress
+    import json
+    from pxctl import instrumentation
+    from pxctl.instrumentation import Instruments
+
+    if args.load:
+        try:
+            with open(args.load, "r") as f:
+                instruments = Instruments.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Can't read stats {args.load}: {e}", file=sys.stderr)
+            sys.exit(-1)
+    else:
+        instruments = None
+        if args.duration is None:
+            instruments = ask_daemon(args, lambda client: client.stats())
+        if instruments is None:
+            import asyncio
+
+            addresses = get_addresses(args)
+            instruments = instrumentation.enable()
+            asyncio.run(measure_fleet(addresses, args.interval, args.duration or DEFAULT_STATS_DURATION))
+
+    wanted = {address.strip() for address in args.address.split(",") if address.strip()} if args.address else None
+
+    def group(address: str) -> str | None:
+        if wanted is not None and address not in wanted:
+            return None
+        if args.prefix is None:
+            return address
+        try:
+            return str(ipaddress.ip_network(f"{address}/{args.prefix}", strict=False))
+        except ValueError:
+            return address
+
+    # the worst printers first: most lost requests, then slowest replies
+    grouped = sorted(
+        instruments.grouped(group).items(),
+        key=lambda item: (item[1].loss_percents, item[1].latency.percentile(99)),
+        reverse=True,
+    )
+    get_layout(args).print_stats(dict(grouped), instruments.started_at)
+
+
+def dump_stats_at_exit(path: str):
+    import atexit
+    import json
+    from pxctl import instrumentation
+    from pxctl.instrumentation import Instruments
+
+    instruments = instrumentation.enable()
+
+    # successive commands add up in the same dump
+    def dump():
+        try:
+            with open(path, "r") as f:
+                instruments.merge(Instruments.from_dict(json.load(f)))
+        except (OSError, ValueError, KeyError):
+            pass
+        try:
+            with open(path, "w") as f:
+                json.dump(instruments.to_dict(), f)
+        except OSError as e:
+            print(f"Can't write stats {path}: {e}", file=sys.stderr)
+
+    atexit.register(dump)
+
+
+def top(args):
+    import asyncio
+    import curses
+    from pxctl.discovery_cache import DiscoveryCache
+    from .top import SORT_KEYS, Dashboard, parse_states, parse_types, run
+
+    if args.sort not in SORT_KEYS:
+        print(f"Unknown sort column {args.sort}, expected one of {', '.join(SORT_KEYS)}", file=sys.stderr)
+        sys.exit(-1)
+    try:
+        states = parse_states([state for state in args.state.split(",") if state.strip()]) if args.state else None
+        printer_types = parse_types([name for name in args.type.split(",") if name.strip()]) if args.type else None
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(-1)
+
+    cached = {} if args.no_cache else {printer.ip_address: printer for printer in DiscoveryCache().lookup()}
+    if args.address or args.serial:
+        addresses = get_addresses(args)
+    elif cached and not args.all:
+        addresses = list(cached)
+    else:
+        # the whole fleet unless told otherwise
+        args.all = True
+        addresses = get_addresses(args)
+        cached = {printer.ip_address: printer for printer in DiscoveryCache().lookup()}
+
+    types = {address: cached[address].printer_type if address in cached else None for address in addresses}
+    dashboard = Dashboard(types, states, printer_types, args.sort, args.reverse)
+    scheduler = get_scheduler(args)
+    try:
+        curses.wrapper(lambda window: asyncio.run(run(window, dashboard, addresses, scheduler, args.refresh)))
+    except KeyboardInterrupt:
+        pass
+
+
+def replay(args):
+    from pxctl.capture import read_capture
+    from pxctl.discovery_cache import DiscoveryCache
+    from pxctl.replay import Replay, parse_speed
+
+    try:
+        speed = parse_speed(args.speed)
+        with open(args.file, "rb") as f:
+            data = f.read()
+        addresses = list(dict.fromkeys(frame.address for frame in read_capture(data)))
+    except (OSError, ValueError) as e:
+        print(f"Can't replay {args.file}: {e}", file=sys.stderr)
+        sys.exit(-1)
+    if args.address:
+        wanted = [address.strip() for address in args.address.split(",") if address.strip()]
+        addresses = [address for address in addresses if address in wanted]
+
+    frames = Replay(read_capture(data), speed, set(addresses))
+    writer = get_sink_writer(args)
+    layout_service = get_layout(args, writer, frames.now)
+    notifications = get_notifications(args)
+    notifications.set_printers(DiscoveryCache().lookup())
+    metrics = None
+    if args.metrics:
+        from pxctl.exporter import PrinterMetrics
+
+        metrics = {address: PrinterMetrics() for address in addresses}
+
+    states = {}
+    output_at = None
+    started_at = monotonic()
+    try:
+        for timestamp, address, optional_info in frames:
+            if len(addresses) > 1:
+                # like show, the frames of a tick of capture time are output together
+                states[address] = optional_info
+                if output_at is None or timestamp - output_at >= args.refresh:
+                    layout_service.print_fleet(polled_states(states, addresses))
+                    output_at = timestamp
+            else:
+                layout_service.print_info(address, optional_info)
+            notifications.update_state(optional_info, address, timestamp)
+            if metrics is not None:
+                printer = metrics[address]
+                printer.polls += 1
+                printer.state = optional_info
+                if optional_info is None:
+                    printer.timeouts += 1
+                else:
+                    printer.last_success = timestamp
+        if len(addresses) > 1 and states and output_at != frames.now():
+            layout_service.print_fleet(polled_states(states, addresses))
+    finally:
+        notifications.close()
+        if writer is not None:
+            writer.close()
+    elapsed = monotonic() - started_at
+
+    if metrics is not None:
+        from pxctl.exporter import render
+
+        with open(args.metrics, "wb") as f:
+            f.write(render(metrics))
+    rate = frames.count / elapsed if elapsed > 0 else 0.0
+    print(f"Replayed {frames.count} frames of {len(addresses)} printers in {elapsed:.3f} s, {rate:.0f} frames/s"
+          + (f", {frames.malformed} malformed" if frames.malformed else ""), file=sys.stderr)
+
+
+def capture_at_exit(path: str):
+    import atexit
+    from pxctl import capture
+
+    try:
+        capture.start(path)
+    except OSError as e:
+        print(f"Can't write capture {path}: {e}", file=sys.stderr)
+        return
+    atexit.register(capture.stop)
+
+
 def beep_on(address):
+    from pxctl.connection import Connection
+    from pxctl.printer_service import PrinterService
+
     with Connection(address) as connection:
         printer_service = PrinterService(connection)
         printer_service.beep_on()
 
 
 def beep_off(address):
+    from pxctl.connection import Connection
+    from pxctl.printer_service import PrinterService
+
     with Connection(address) as connection:
         printer_service = PrinterService(connection)
         printer_service.beep_off()
 
 
 def beep(args):
+    enable = args.operation == "enable"
+    beeped = ask_daemon(args, lambda client: client.beep(args.address, enable, getattr(args, "serial", None)))
+    if beeped is not None:
+        if not beeped:
+            print("Printers not found, try set ip address manually", file=sys.stderr)
+            sys.exit(-1)
+        return
+
     address = get_address(args)
     if args.operation == "enable":
         beep_on(address)
@@ -94,37 +794,313 @@ def beep(args):
         beep_off(address)
 
 
+def get_serial(address: str, connection: "Connection | None" = None) -> str | None:
+    from pxctl.discovery_cache import DiscoveryCache
+    from pxctl.printer_service import PrinterService
+
+    for printer in DiscoveryCache().lookup():
+        if printer.ip_address == address:
+            return printer.serial
+    if connection is None:
+        return None
+    printer = PrinterService(connection).get_printer_info()
+    if printer is None:
+        return None
+    DiscoveryCache().update([printer])
+    return printer.serial
+
+
+def load_catalog(index: "CatalogIndex", address: str, offline: bool) -> "PrinterCatalog | None":
+    from pxctl.connection import Connection
+    from pxctl.printer_service import PrinterService
+
+    if offline:
+        serial = get_serial(address)
+        catalog = index.get(serial) if serial is not None else None
+        if catalog is None:
+            print(f"{address}: no print lists in the index", file=sys.stderr)
+        return catalog
+
+    with Connection(address) as connection:
+        serial = get_serial(address, connection)
+        if serial is None:
+            print(f"{address}: printer didn't respond", file=sys.stderr)
+            return None
+        catalog, _ = index.refresh(serial, PrinterService(connection))
+    if catalog is None:
+        print(f"{address}: printer didn't respond, showing the index", file=sys.stderr)
+        catalog = index.get(serial)
+    return catalog
+
+
+def load_catalogs(args, addresses: list) -> dict:
+    from concurrent.futures import ThreadPoolExecutor
+    from pxctl.catalog import CatalogIndex
+
+    index = CatalogIndex()
+    with ThreadPoolExecutor(max_workers=min(16, len(addresses))) as executor:
+        catalogs = executor.map(lambda address: load_catalog(index, address, args.offline), addresses)
+        catalogs = {address: catalog for address, catalog in zip(addresses, catalogs) if catalog is not None}
+    index.save()
+    return catalogs
+
+
+def refresh_catalog(address: str, connection: "Connection"):
+    from pxctl.catalog import CatalogIndex
+    from pxctl.printer_service import PrinterService
+
+    serial = get_serial(address, connection)
+    if serial is None:
+        return
+    index = CatalogIndex()
+    index.refresh(serial, PrinterService(connection))
+    index.save()
+
+
+def change_catalog(args, change, failure: str):
+    from pxctl.connection import Connection
+    from pxctl.printer_service import PrinterService
+
+    failed = False
+    for address in get_addresses(args):
+        with Connection(address) as connection:
+            changed = change(PrinterService(connection))
+            if changed is None:
+                print(f"{address}: printer didn't respond", file=sys.stderr)
+                failed = True
+                continue
+            if not changed:
+                print(f"{address}: {failure}", file=sys.stderr)
+                failed = True
+            refresh_catalog(address, connection)
+    if failed:
+        sys.exit(-1)
+
+
 def printlist(args):
-    print("Not implemented yet", file=sys.stderr)
+    if args.operation == "list":
+        if not args.offline:
+            require_experimental(args, "printlist list")
+        get_layout(args).print_printlists(load_catalogs(args, get_addresses(args)))
+        return
+
+    require_experimental(args, f"printlist {args.operation}" if args.operation else "printlist")
+    if not args.name:
+        print("Please provide the print list --name", file=sys.stderr)
+        sys.exit(-1)
+    if args.operation == "create":
+        change_catalog(args, lambda service: service.create_printlist(args.name),
+                       f"print list {args.name} already exists")
+    if args.operation == "delete":
+        change_catalog(args, lambda service: service.delete_printlist(args.name),
+                       f"print list {args.name} doesn't exist")
+
+
+def require_experimental(args, command: str):
+    from pxctl import experimental
+
+    if not args.experimental:
+        print(f"{command} is experimental and only works with the simulator, pass --experimental to use it",
+              file=sys.stderr)
+        sys.exit(-1)
+    experimental.enable()
+
+
+def print_upload_progress(progress: "UploadProgress"):
+    print(
+        f"\r{progress.name}: {progress.percents:5.1f}% "
+        f"{progress.acked / 1e6:.1f}/{progress.total / 1e6:.1f} MB "
+        f"{progress.throughput / 1e6:.2f} MB/s, {progress.retransmits} retransmits",
+        end="",
+        file=sys.stderr,
+        flush=True,
+    )
+
+
+def upload_file(address: str, args) -> str:
+    from pxctl.connection import Connection
+    from pxctl.upload import Uploader, UploadError
+
+    name = args.name or os.path.basename(args.file)
+    with Connection(address) as connection:
+        try:
+            progress = Uploader(connection).upload(args.file, name, args.printlist or "", print_upload_progress)
+        except (OSError, UploadError) as e:
+            print(f"\nUpload of {args.file} failed: {e}", file=sys.stderr)
+            sys.exit(-1)
+    print(file=sys.stderr)
+    if progress.resumed_from:
+        print(f"Resumed from {progress.resumed_from / 1e6:.1f} MB", file=sys.stderr)
+    return name
+
+
+def print_batch_progress(address: str, progress: "UploadProgress", batch: "BatchProgress"):
+    print(
+        f"\r{batch.completed + batch.failed} done, {batch.failed} failed: {batch.percents:5.1f}% "
+        f"{batch.acked / 1e6:.1f}/{batch.total / 1e6:.1f} MB {batch.throughput / 1e6:.2f} MB/s",
+        end="",
+        file=sys.stderr,
+        flush=True,
+    )
+
+
+def print_dispatch_result(result: "DispatchResult", batch: "BatchProgress"):
+    if result.ok:
+        progress = result.progress
+        status = f"uploaded {progress.total / 1e6:.1f} MB in {progress.elapsed:.1f}s ({progress.throughput / 1e6:.2f} MB/s)"
+        if progress.resumed_from:
+            status += f", resumed from {progress.resumed_from / 1e6:.1f} MB"
+        if result.started:
+            status += ", started"
+    else:
+        status = f"failed: {result.error}"
+    print(f"\r\x1b[K{result.address}: {status}", file=sys.stderr, flush=True)
+
+
+def dispatch_file(addresses: list, args, start: bool) -> str:
+    from pxctl.dispatch import BatchUploader
+
+    name = args.name or os.path.basename(args.file)
+    uploader = BatchUploader(
+        addresses,
+        parallel=args.parallel,
+        bandwidth=args.bandwidth * 1e6 if args.bandwidth else None,
+    )
+    started_at = monotonic()
+    try:
+        results = uploader.upload(
+            args.file, name, args.printlist or "", start, print_batch_progress, print_dispatch_result
+        )
+    except OSError as e:
+        print(f"Upload of {args.file} failed: {e}", file=sys.stderr)
+        sys.exit(-1)
+
+    failed = [result for result in results.values() if not result.ok]
+    total = sum(result.progress.total for result in results.values() if result.progress is not None)
+    elapsed = monotonic() - started_at
+    print(
+        f"{len(results) - len(failed)} of {len(results)} printers done, "
+        f"{total / 1e6:.1f} MB in {elapsed:.1f}s ({total / elapsed / 1e6 if elapsed else 0.0:.2f} MB/s)",
+        file=sys.stderr,
+    )
+    if failed:
+        sys.exit(-1)
+    return name
 
 
 def task(args):
-    print("Not implemented yet", file=sys.stderr)
+    if args.operation == "create":
+        require_experimental(args, "task create")
+        if not args.file:
+            print("Please provide the .plgx file to upload with --file", file=sys.stderr)
+            sys.exit(-1)
+        addresses = get_addresses(args)
+        if args.all or len(addresses) > 1:
+            dispatch_file(addresses, args, start=False)
+        else:
+            upload_file(addresses[0], args)
+        return
+
+    if args.operation == "list":
+        if not args.offline:
+            require_experimental(args, "task list")
+        get_layout(args).print_tasks(load_catalogs(args, get_addresses(args)), args.printlist)
+        return
+
+    if args.operation == "delete":
+        require_experimental(args, "task delete")
+        if not args.name:
+            print("Please provide the task --name to delete", file=sys.stderr)
+            sys.exit(-1)
+        change_catalog(args, lambda service: service.delete_task(args.name, args.printlist or ""),
+                       f"task {args.name} doesn't exist")
 
 
 def execute(args):
+    from pxctl.connection import Connection
+    from pxctl.printer_service import PrinterService
+
+    if args.operation == "start":
+        require_experimental(args, "ex start")
+        if not args.file and not args.name:
+            print("Please provide the task --name or the .plgx --file to start", file=sys.stderr)
+            sys.exit(-1)
+        addresses = get_addresses(args)
+        if args.file and (args.all or len(addresses) > 1):
+            dispatch_file(addresses, args, start=True)
+            return
+
+        failed = False
+        name = upload_file(addresses[0], args) if args.file else args.name
+        for address in addresses:
+            with Connection(address) as connection:
+                if not PrinterService(connection).start_task(name, args.printlist or ""):
+                    print(f"{address}: printer didn't start {name}", file=sys.stderr)
+                    failed = True
+        if failed:
+            sys.exit(-1)
+        return
+
     print("Not implemented yet", file=sys.stderr)
 
 
+def exit_on_broken_pipe():
+    # the reader went away, e.g. '| head' or a restarting log shipper: exit like a killed pipeline stage,
+    # with nothing left to flush to the closed pipe at exit
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+    sys.exit(128 + signal.SIGPIPE)
+
+
 def main():
+    try:
+        run_command()
+    except BrokenPipeError:
+        exit_on_broken_pipe()
+
+
+def run_command():
+
+    if os.path.isdir(SRC_DIR):
+        sys.path.insert(0, SRC_DIR)
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
     parser = argparse.ArgumentParser(prog="pxctl")
     subparsers = parser.add_subparsers()
 
     ADDRESS_HELP = "Please provide the IPv4 address of the printer. By default, the printer is discovered automatically on the local network."
+    ADDRESSES_HELP = "Please provide the comma separated IPv4 addresses of the printers. By default, the printer is discovered automatically on the local network."
+    SERIAL_HELP = "Please provide the serial number of the printer. Its address is taken from the discovery cache or discovered on the local network."
+    NO_CACHE_HELP = "Ignore the discovery cache and discover the printer on the local network."
+    OFFLINE_HELP = "List from the local index without asking the printers what changed."
+    NO_DAEMON_HELP = ("Talk to the printers directly even when a pxctl daemon is running. "
+                      "--iface, --exclude-iface and --subnet always talk to them directly.")
     PRINTLIST_HELP = "Please provide the name of the print list. If there is only one print list, it will be used by default."
+    EXPERIMENTAL_HELP = ("Allow commands whose protocol isn't documented for Picaso printers and is only answered "
+                         "by the simulator in tools/simulator.")
 
     show_parser = subparsers.add_parser("show",
                                         help="Print the details of the 3D printer state to the standard output. '%(prog)s show -h' for more details")
-    show_parser.add_argument("-j", "--json", help="Output the information of printer state in JSON format.",
+    add_output_arguments(show_parser)
+    show_parser.add_argument("-a", "--address", type=str, help=ADDRESSES_HELP)
+    show_parser.add_argument("--serial", type=str, help=SERIAL_HELP)
+    show_parser.add_argument("--no-cache", help=NO_CACHE_HELP, action="store_true")
+    show_parser.add_argument("--all", help="Discover all printers on the local network and show the state of each of them.",
                              action="store_true")
-    show_parser.add_argument("-a", "--address", type=str, help=ADDRESS_HELP)
     show_parser.add_argument("-c", "--continuous",
                              help="Continuously output the current state of the 3D printer to the standard output.",
                              action="store_true")
-    show_parser.add_argument("-s", "--on-success", type=str,
-                             help="Once the printing is complete, execute the bash script hook. example: %(prog)s --on-success='touch /tmp/done' ",
-                             metavar="BASH_SCRIPT")
-    show_parser.set_defaults(mode="show")
+    add_hook_arguments(show_parser)
+    show_parser.add_argument("-i", "--interval", type=float, default=0.6, metavar="SECONDS",
+                             help="With --continuous, poll printing printers every SECONDS. Default: %(default)s")
+    show_parser.add_argument("--idle-interval", type=float, default=5.0, metavar="SECONDS",
+                             help="With --continuous, poll idle printers every SECONDS. Default: %(default)s")
+    show_parser.add_argument("--fast-interval", type=float, default=0.3, metavar="SECONDS",
+                             help="With --continuous, poll printers preparing to print or close to completion every SECONDS. Default: %(default)s")
+    show_parser.add_argument("--no-daemon", help=NO_DAEMON_HELP, action="store_true")
+    add_discovery_arguments(show_parser)
+    show_parser.set_defaults(mode="show", parser=show_parser)
 
     beep_parser = subparsers.add_parser("beep",
                                         help="Triggers the 3D printer to emit a series of beeps for identification purposes. '%(prog)s beep -h' for more details")
@@ -133,14 +1109,161 @@ def main():
                              nargs="?",
                              choices=("enable", "disable"))
     beep_parser.add_argument("-a", "--address", type=str, help=ADDRESS_HELP)
+    beep_parser.add_argument("--serial", type=str, help=SERIAL_HELP)
+    beep_parser.add_argument("--no-cache", help=NO_CACHE_HELP, action="store_true")
+    beep_parser.add_argument("--no-daemon", help=NO_DAEMON_HELP, action="store_true")
+    add_discovery_arguments(beep_parser)
     beep_parser.set_defaults(mode="beep")
 
     discover_parser = subparsers.add_parser("discover",
                                             help="Search for printers connected to the local network. '%(prog)s discover -h' for more details")
     discover_parser.add_argument("-j", "--json", help="Output the results of the printer discovery in JSON format.",
                                  action="store_true")
+    discover_parser.add_argument("-t", "--timeout", type=float, default=1.0,
+                                 help="Stop waiting for printers to answer after TIMEOUT seconds. Default: %(default)s")
+    discover_parser.add_argument("-e", "--expect", type=int, metavar="N",
+                                 help="Stop the discovery as soon as N printers answered.")
+    discover_parser.add_argument("--no-daemon", help=NO_DAEMON_HELP + " A running daemon ignores --timeout and --expect.",
+                                 action="store_true")
+    add_discovery_arguments(discover_parser)
     discover_parser.set_defaults(mode="discover")
 
+    daemon_parser = subparsers.add_parser("daemon",
+                                          help="Keep the state of printers warm and answer show, beep and discover instantly. '%(prog)s daemon -h' for more details")
+    daemon_parser.add_argument("-a", "--address", type=str,
+                               help="Comma separated IPv4 addresses of the printers to keep warm. By default, all printers on the local network are discovered.")
+    daemon_parser.add_argument("--socket", type=str,
+                               help="Listen on this Unix socket, clients use the PXCTL_SOCKET environment variable. "
+                                    "Default: $PXCTL_SOCKET, or pxctl-UID.sock in $XDG_RUNTIME_DIR")
+    daemon_parser.add_argument("--discovery-interval", type=float, default=300.0, metavar="SECONDS",
+                               help="Discover printers again every SECONDS. Default: %(default)s")
+    daemon_parser.add_argument("-i", "--interval", type=float, default=0.6, metavar="SECONDS",
+                               help="Poll printing printers every SECONDS. Default: %(default)s")
+    daemon_parser.add_argument("--idle-interval", type=float, default=5.0, metavar="SECONDS",
+                               help="Poll idle printers every SECONDS. Default: %(default)s")
+    daemon_parser.add_argument("--fast-interval", type=float, default=0.3, metavar="SECONDS",
+                               help="Poll printers preparing to print or close to completion every SECONDS. Default: %(default)s")
+    daemon_parser.add_argument("--board", type=str, nargs="?", const="", metavar="NAME",
+                               help="Publish the state of every printer in the shared memory status board NAME, "
+                                    "local processes read it with pxctl.board.BoardReader. Default NAME: pxctl-board-UID")
+    daemon_parser.add_argument("--board-slots", type=int, default=256, metavar="PRINTERS",
+                               help="Make room for this many printers on the status board. Default: %(default)s")
+    add_discovery_arguments(daemon_parser)
+    daemon_parser.set_defaults(mode="daemon")
+
+    export_parser = subparsers.add_parser("export",
+                                          help="Poll printers in the background and serve their state as OpenMetrics. '%(prog)s export -h' for more details")
+    export_parser.add_argument("-l", "--listen", type=str, default=":9110", metavar="[HOST]:PORT",
+                               help="Serve metrics on this address. Default: %(default)s")
+    export_parser.add_argument("-a", "--address", type=str, help=ADDRESSES_HELP)
+    export_parser.add_argument("--serial", type=str, help=SERIAL_HELP)
+    export_parser.add_argument("--no-cache", help=NO_CACHE_HELP, action="store_true")
+    export_parser.add_argument("--all", help="Discover all printers on the local network and export the state of each of them.",
+                               action="store_true")
+    export_parser.add_argument("-i", "--interval", type=float, default=0.6,
+                               help="Poll the printers every INTERVAL seconds. Default: %(default)s")
+    add_discovery_arguments(export_parser)
+    export_parser.set_defaults(mode="export")
+
+    HISTORY_DIR_HELP = "Directory of the recorded history. Default: pxctl/history in $XDG_DATA_HOME"
+
+    record_parser = subparsers.add_parser("record",
+                                          help="Record the state of printers into the local history. '%(prog)s record -h' for more details")
+    record_parser.add_argument("-a", "--address", type=str, help=ADDRESSES_HELP)
+    record_parser.add_argument("--serial", type=str, help=SERIAL_HELP)
+    record_parser.add_argument("--no-cache", help=NO_CACHE_HELP, action="store_true")
+    record_parser.add_argument("--all", help="Discover all printers on the local network and record the state of each of them.",
+                               action="store_true")
+    record_parser.add_argument("-i", "--interval", type=float, default=0.6,
+                               help="Poll the printers every INTERVAL seconds. Default: %(default)s")
+    record_parser.add_argument("-d", "--dir", type=str, help=HISTORY_DIR_HELP)
+    add_discovery_arguments(record_parser)
+    record_parser.set_defaults(mode="record")
+
+    history_parser = subparsers.add_parser("history",
+                                           help="Query the recorded history of a printer. '%(prog)s history -h' for more details")
+    history_parser.add_argument("-a", "--address", type=str,
+                                help="The IPv4 address of the recorded printer. Recorded printers are listed if omitted.")
+    history_parser.add_argument("--since", type=str,
+                                help="Only samples since this time, e.g. '12h', '30m' or '2024-05-01T20:00'.")
+    history_parser.add_argument("--until", type=str,
+                                help="Only samples before this time, e.g. '1h' or '2024-05-02T08:00'.")
+    history_parser.add_argument("-t", "--task", type=str, help="Only samples taken while printing this task.")
+    history_parser.add_argument("--tasks", help="List the recorded tasks instead of samples.", action="store_true")
+    history_parser.add_argument("--step", type=int, default=1, help="Output every STEP-th sample. Default: %(default)s")
+    history_parser.add_argument("-j", "--json", help="Output the samples in JSON format, one per line.",
+                                action="store_true")
+    history_parser.add_argument("-d", "--dir", type=str, help=HISTORY_DIR_HELP)
+    history_parser.set_defaults(mode="history")
+
+    stats_parser = subparsers.add_parser("stats",
+                                         help="Show sends, replies, losses and latency percentiles of the protocol per printer and command. '%(prog)s stats -h' for more details")
+    stats_parser.add_argument("-j", "--json", help="Dump the stats with their latency histograms in JSON format.",
+                              action="store_true")
+    stats_parser.add_argument("-a", "--address", type=str,
+                              help=ADDRESSES_HELP + " With a running daemon, only these printers are shown.")
+    stats_parser.add_argument("--serial", type=str, help=SERIAL_HELP)
+    stats_parser.add_argument("--no-cache", help=NO_CACHE_HELP, action="store_true")
+    stats_parser.add_argument("--all", help="Discover all printers on the local network and measure each of them.",
+                              action="store_true")
+    stats_parser.add_argument("--duration", type=float, metavar="SECONDS",
+                              help="Poll the printers for SECONDS and show what was measured instead of asking the daemon. "
+                                   f"Default: {DEFAULT_STATS_DURATION} without a running daemon")
+    stats_parser.add_argument("-i", "--interval", type=float, default=0.3, metavar="SECONDS",
+                              help="Poll the printers every SECONDS while measuring. Default: %(default)s")
+    stats_parser.add_argument("--prefix", type=int, metavar="LENGTH",
+                              help="Merge the printers of each subnet of this prefix length, e.g. 24 to compare Wi-Fi segments.")
+    stats_parser.add_argument("--load", type=str, metavar="PATH",
+                              help="Show the stats dumped to PATH by a command run with PXCTL_STATS=PATH.")
+    stats_parser.add_argument("--no-daemon", help=NO_DAEMON_HELP, action="store_true")
+    add_discovery_arguments(stats_parser)
+    stats_parser.set_defaults(mode="stats")
+
+    top_parser = subparsers.add_parser("top",
+                                       help="Full-screen dashboard of the state of every printer. '%(prog)s top -h' for more details")
+    top_parser.add_argument("-a", "--address", type=str, help=ADDRESSES_HELP)
+    top_parser.add_argument("--serial", type=str, help=SERIAL_HELP)
+    top_parser.add_argument("--no-cache", help=NO_CACHE_HELP, action="store_true")
+    top_parser.add_argument("--all", help="Discover the printers even if the discovery cache knows some. "
+                                          "Without -a or --serial all printers are shown.",
+                            action="store_true")
+    top_parser.add_argument("--state", type=str, metavar="STATES",
+                            help="Show only printers in one of the comma separated STATES, e.g. printing,paused. "
+                                 "Press f to cycle through the states.")
+    top_parser.add_argument("--type", type=str, metavar="TYPES",
+                            help="Show only printers of one of the comma separated printer TYPES, e.g. DesignerX. "
+                                 "Press t to cycle through the types.")
+    top_parser.add_argument("--sort", type=str, default="address", metavar="COLUMN",
+                            help="Sort the printers by COLUMN, one of address, type, state, progress, eta, left, right "
+                                 "or table, press s to change it. Default: %(default)s")
+    top_parser.add_argument("--reverse", help="Sort in descending order, press r to toggle it.", action="store_true")
+    top_parser.add_argument("--refresh", type=float, default=0.5, metavar="SECONDS",
+                            help="Redraw the screen at most every SECONDS however often printers are polled. Default: %(default)s")
+    top_parser.add_argument("-i", "--interval", type=float, default=0.6, metavar="SECONDS",
+                            help="Poll printing printers every SECONDS. Default: %(default)s")
+    top_parser.add_argument("--idle-interval", type=float, default=5.0, metavar="SECONDS",
+                            help="Poll idle printers every SECONDS. Default: %(default)s")
+    top_parser.add_argument("--fast-interval", type=float, default=0.3, metavar="SECONDS",
+                            help="Poll printers preparing to print or close to completion every SECONDS. Default: %(default)s")
+    add_discovery_arguments(top_parser)
+    top_parser.set_defaults(mode="top")
+
+    replay_parser = subparsers.add_parser("replay",
+                                          help="Feed status frames captured with PXCTL_CAPTURE=FILE through the output and hooks of show. "
+                                               "'%(prog)s replay -h' for more details")
+    replay_parser.add_argument("file", type=str, metavar="FILE", help="Capture written by a command run with PXCTL_CAPTURE=FILE.")
+    replay_parser.add_argument("--speed", type=str, default="1x",
+                               help="Replay this many times faster than captured, or 'max' to replay as fast as possible "
+                                    "and measure the frames per second of decoding and output. Default: %(default)s")
+    replay_parser.add_argument("-a", "--address", type=str, help="Replay only the frames of these comma separated printers.")
+    replay_parser.add_argument("--refresh", type=float, default=0.3, metavar="SECONDS",
+                               help="Output the state of a fleet at most every SECONDS of capture time. Default: %(default)s")
+    replay_parser.add_argument("--metrics", type=str, metavar="PATH",
+                               help="Write the OpenMetrics exposition of the last replayed states to PATH.")
+    add_output_arguments(replay_parser)
+    add_hook_arguments(replay_parser)
+    replay_parser.set_defaults(mode="replay", parser=replay_parser)
+
     printlist_parser = subparsers.add_parser("printlist", aliases=["pl"],
                                              help="create/delete/list print-lists, '%(prog)s printlist -h' for more details")
     printlist_parser.add_argument("operation",
@@ -149,7 +1272,13 @@ def main():
                                   choices=("create", "delete", "list")
                                   )
     printlist_parser.add_argument("-n", "--name", help="Please provide a name for the print-list")
-    printlist_parser.add_argument("-a", "--address", type=str, help=ADDRESS_HELP)
+    printlist_parser.add_argument("-a", "--address", type=str, help=ADDRESSES_HELP)
+    printlist_parser.add_argument("--all", help="Discover all printers on the local network and use each of them.",
+                                  action="store_true")
+    printlist_parser.add_argument("-j", "--json", help="Output the print lists in JSON format.", action="store_true")
+    printlist_parser.add_argument("--offline", help=OFFLINE_HELP, action="store_true")
+    printlist_parser.add_argument("--experimental", help=EXPERIMENTAL_HELP, action="store_true")
+    add_discovery_arguments(printlist_parser)
     printlist_parser.set_defaults(mode="printlist")
 
     task_parser = subparsers.add_parser("task", help="create/delete/list tasks. '%(prog)s task -h' for more details")
@@ -162,7 +1291,17 @@ def main():
     task_parser.add_argument("-f", "--file", type=str,
                              help="The file path to the .plgx file, which will be uploaded to the 3D printer, should only be used for creating.")
     task_parser.add_argument("-p", "--printlist", type=str, help=PRINTLIST_HELP)
-    task_parser.add_argument("-a", "--address", type=str, help=ADDRESS_HELP)
+    task_parser.add_argument("-a", "--address", type=str, help=ADDRESSES_HELP)
+    task_parser.add_argument("--all", help="Discover all printers on the local network and use each of them.",
+                             action="store_true")
+    task_parser.add_argument("-j", "--json", help="Output the tasks in JSON format.", action="store_true")
+    task_parser.add_argument("--offline", help=OFFLINE_HELP, action="store_true")
+    task_parser.add_argument("--parallel", type=int, default=8,
+                             help="Upload to at most this many printers at once. Default: %(default)s")
+    task_parser.add_argument("--bandwidth", type=float, metavar="MB_PER_SECOND",
+                             help="Limit the total upload rate of all printers. Unlimited by default.")
+    task_parser.add_argument("--experimental", help=EXPERIMENTAL_HELP, action="store_true")
+    add_discovery_arguments(task_parser)
     task_parser.set_defaults(mode="task")
 
     execute_parser = subparsers.add_parser("execute", aliases=['ex'],
@@ -176,7 +1315,15 @@ def main():
     execute_parser.add_argument("-f", "--file", type=str,
                                 help="Transfer the task from FILE to PRINTLIST. Exclusively for start purposes.")
     execute_parser.add_argument("-p", "--printlist", type=str, help=PRINTLIST_HELP)
-    execute_parser.add_argument("-a", "--address", type=str, help=ADDRESS_HELP)
+    execute_parser.add_argument("-a", "--address", type=str, help=ADDRESSES_HELP)
+    execute_parser.add_argument("--all", help="Discover all printers on the local network and start the task on each of them.",
+                                action="store_true")
+    execute_parser.add_argument("--parallel", type=int, default=8,
+                                help="Upload to at most this many printers at once. Default: %(default)s")
+    execute_parser.add_argument("--bandwidth", type=float, metavar="MB_PER_SECOND",
+                                help="Limit the total upload rate of all printers. Unlimited by default.")
+    execute_parser.add_argument("--experimental", help=EXPERIMENTAL_HELP, action="store_true")
+    add_discovery_arguments(execute_parser)
     execute_parser.set_defaults(mode="execute")
     args = parser.parse_args()
 
@@ -184,12 +1331,38 @@ def main():
         parser.print_help()
         sys.exit(-1)
 
+    if os.environ.get("PXCTL_STATS"):
+        dump_stats_at_exit(os.environ["PXCTL_STATS"])
+    if os.environ.get("PXCTL_CAPTURE") and args.mode != "replay":
+        capture_at_exit(os.environ["PXCTL_CAPTURE"])
+
     if args.mode == "show":
         show(args)
 
     elif args.mode == "discover":
         discover(args)
 
+    elif args.mode == "daemon":
+        daemon(args)
+
+    elif args.mode == "export":
+        export(args)
+
+    elif args.mode == "record":
+        record(args)
+
+    elif args.mode == "history":
+        history(args)
+
+    elif args.mode == "stats":
+        stats(args)
+
+    elif args.mode == "top":
+        top(args)
+
+    elif args.mode == "replay":
+        replay(args)
+
     elif args.mode == "beep":
         if args.operation is None:
             beep_parser.print_help()
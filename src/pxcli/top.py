@@ -0,0 +1,321 @@
+import curses
+import sys
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Tuple
+
+from pxctl.enums import NetPrinterState, PrinterType
+from pxctl.eta import EtaEstimator
+from pxctl.structs import Estimate, PrinterState
+
+from .layout import format_duration
+
+if TYPE_CHECKING:
+    from pxctl.scheduler import PollScheduler
+
+NOT_CONNECTED = "NOT_CONNECTED"
+BAR_WIDTH = 16
+
+# name, width; the task column takes the room left over
+COLUMNS: List[Tuple[str, int]] = [
+    ("Address", 15),
+    ("Type", 18),
+    ("State", 22),
+    ("Task", 0),
+    ("Progress", BAR_WIDTH + 9),
+    ("ETA", 9),
+    ("Left ℃", 7),
+    ("Right ℃", 7),
+    ("Table ℃", 7),
+]
+MIN_TASK_WIDTH = 12
+
+SORT_KEYS: Dict[str, Callable[["_Row"], object]] = {
+    "address": lambda row: tuple(int(part) if part.isdigit() else 0 for part in row.address.split(".")),
+    "type": lambda row: row.type_name,
+    "state": lambda row: row.state_name,
+    "progress": lambda row: row.info.progress_percents if row.info else -1.0,
+    "eta": lambda row: row.eta if row.eta is not None else float("inf"),
+    "left": lambda row: row.info.left_extruder_temperature if row.info else -1.0,
+    "right": lambda row: row.info.right_extruder_temperature if row.info else -1.0,
+    "table": lambda row: row.info.table_temperature if row.info else -1.0,
+}
+
+KEYS_HELP = "q quit  s sort  r reverse  f state filter  t type filter  ↑↓ PgUp PgDn scroll"
+
+
+def parse_states(values: List[str]) -> set:
+    """Gets state names from names with or without the npst prefix, in any case"""
+    names = {state.name.lower(): state.name for state in NetPrinterState}
+    names.update({state.name[len("npst"):].lower(): state.name for state in NetPrinterState})
+    names[NOT_CONNECTED.lower()] = NOT_CONNECTED
+    states = set()
+    for value in values:
+        if value.lower() not in names:
+            raise ValueError(f"Unknown state {value}, expected one of {', '.join(sorted(names.values()))}")
+        states.add(names[value.lower()])
+    return states
+
+
+def parse_types(values: List[str]) -> set:
+    names = {printer_type.name.lower(): printer_type.name for printer_type in PrinterType}
+    types = set()
+    for value in values:
+        if value.lower() not in names:
+            raise ValueError(f"Unknown printer type {value}, expected one of {', '.join(names.values())}")
+        types.add(names[value.lower()])
+    return types
+
+
+def progress_bar(percents: float) -> str:
+    filled = int(round(BAR_WIDTH * min(max(percents, 0.0), 100.0) / 100.0))
+    return f"[{'#' * filled}{'.' * (BAR_WIDTH - filled)}] {percents:5.1f}%"
+
+
+class _Row:
+    __slots__ = ("address", "type_name", "info", "eta")
+
+    def __init__(self, address: str, type_name: str, info: PrinterState | None, estimate: Estimate | None):
+        self.address = address
+        self.type_name = type_name
+        self.info = info
+        self.eta = estimate.eta_seconds if estimate is not None else None
+
+    @property
+    def state_name(self) -> str:
+        return self.info.state.name if self.info else NOT_CONNECTED
+
+    def cells(self) -> List[str]:
+        info = self.info
+        if info is None:
+            return [self.address, self.type_name, NOT_CONNECTED, "", "", "", "", "", ""]
+        return [
+            self.address,
+            self.type_name,
+            info.state.name,
+            info.current_task_file,
+            progress_bar(info.progress_percents),
+            format_duration(self.eta) if self.eta is not None else "",
+            f"{info.left_extruder_temperature:7.1f}",
+            f"{info.right_extruder_temperature:7.1f}",
+            f"{info.table_temperature:7.1f}",
+        ]
+
+
+class Dashboard:
+    """Full-screen table of the printers, repainting only the cells which changed.
+
+    States are taken in as they are polled, the screen is drawn on its own
+    schedule, so the cost of drawing doesn't grow with the poll rate.
+    """
+
+    def __init__(
+        self,
+        types: Dict[str, PrinterType | None],
+        states: set | None = None,
+        printer_types: set | None = None,
+        sort: str = "address",
+        reverse: bool = False,
+    ):
+        self.__types = {address: printer_type.name if printer_type else "" for address, printer_type in types.items()}
+        self.__states: Dict[str, PrinterState | None] = {address: None for address in types}
+        self.__polled: set = set()
+        self.__estimator = EtaEstimator()
+        self.__state_filter = states or set()
+        self.__type_filter = printer_types or set()
+        self.__sort = sort
+        self.__reverse = reverse
+        self.__scroll = 0
+        self.__drawn: Dict[Tuple[int, int], Tuple[str, int]] = {}
+        self.__dirty = True
+        self.__colors: Dict[str, int] = {}
+
+    def update(self, address: str, info: PrinterState | None):
+        self.__states[address] = info
+        self.__polled.add(address)
+        self.__estimator.update(address, info)
+        self.__dirty = True
+
+    def __cycle(self, current: set, options: List[str]) -> set:
+        # no filter, then one option after the other
+        if not current:
+            return {options[0]} if options else set()
+        if len(current) > 1:
+            return set()
+        index = options.index(next(iter(current))) if next(iter(current)) in options else len(options) - 1
+        return {options[index + 1]} if index + 1 < len(options) else set()
+
+    def handle_key(self, key: int, page: int) -> bool:
+        """Applies a key press
+
+        Returns:
+            bool: False to quit
+        """
+        if key in (ord("q"), ord("Q"), 27):
+            return False
+        if key == ord("s"):
+            names = list(SORT_KEYS)
+            self.__sort = names[(names.index(self.__sort) + 1) % len(names)]
+        elif key == ord("r"):
+            self.__reverse = not self.__reverse
+        elif key == ord("f"):
+            options = sorted({row.state_name for row in self.__rows(False)})
+            self.__state_filter = self.__cycle(self.__state_filter, options)
+            self.__scroll = 0
+        elif key == ord("t"):
+            options = sorted({row.type_name for row in self.__rows(False)} - {""})
+            self.__type_filter = self.__cycle(self.__type_filter, options)
+            self.__scroll = 0
+        elif key in (curses.KEY_DOWN, ord("j")):
+            self.__scroll += 1
+        elif key in (curses.KEY_UP, ord("k")):
+            self.__scroll -= 1
+        elif key == curses.KEY_NPAGE:
+            self.__scroll += page
+        elif key == curses.KEY_PPAGE:
+            self.__scroll -= page
+        elif key == curses.KEY_RESIZE:
+            self.__drawn.clear()
+        else:
+            return True
+        self.__dirty = True
+        return True
+
+    def __rows(self, filtered: bool = True) -> List[_Row]:
+        rows = [
+            _Row(address, self.__types.get(address, ""), info, self.__estimator.estimate(address))
+            for address, info in self.__states.items()
+        ]
+        if filtered:
+            if self.__state_filter:
+                rows = [row for row in rows if row.state_name in self.__state_filter]
+            if self.__type_filter:
+                rows = [row for row in rows if row.type_name in self.__type_filter]
+        rows.sort(key=SORT_KEYS[self.__sort], reverse=self.__reverse)
+        return rows
+
+    def __color(self, state_name: str) -> int:
+        return self.__colors.get(state_name, curses.A_NORMAL)
+
+    def init_colors(self):
+        if not curses.has_colors():
+            return
+        curses.use_default_colors()
+        for pair, (state_names, color) in enumerate((
+            ((NetPrinterState.npstPrinting.name,), curses.COLOR_GREEN),
+            ((NetPrinterState.npstPaused.name, NetPrinterState.npstPrepareForPause.name,
+              NetPrinterState.npstPrepareForStop.name, NetPrinterState.npstService.name), curses.COLOR_YELLOW),
+            ((NOT_CONNECTED,), curses.COLOR_RED),
+        ), start=1):
+            curses.init_pair(pair, color, -1)
+            for state_name in state_names:
+                self.__colors[state_name] = curses.color_pair(pair)
+
+    def __put(self, window, y: int, x: int, width: int, text: str, attr: int = curses.A_NORMAL):
+        cell = (text, attr)
+        if self.__drawn.get((y, x)) == cell:
+            return
+        self.__drawn[(y, x)] = cell
+        try:
+            window.addnstr(y, x, text.ljust(width), width, attr)
+        except curses.error:
+            # writing the bottom right corner moves the cursor off the screen
+            pass
+
+    def draw(self, window, force: bool = False):
+        if not self.__dirty and not force:
+            return
+        self.__dirty = False
+        height, width = window.getmaxyx()
+        fixed = sum(column_width + 1 for _, column_width in COLUMNS)
+        task_width = max(MIN_TASK_WIDTH, width - fixed)
+        widths = [column_width or task_width for _, column_width in COLUMNS]
+
+        rows = self.__rows()
+        page = max(1, height - 3)
+        self.__scroll = max(0, min(self.__scroll, len(rows) - page))
+        visible = rows[self.__scroll:self.__scroll + page]
+
+        filters = []
+        if self.__state_filter:
+            filters.append(f"state={','.join(sorted(self.__state_filter))}")
+        if self.__type_filter:
+            filters.append(f"type={','.join(sorted(self.__type_filter))}")
+        title = (
+            f"pxctl top  {len(self.__states)} printers, {len(self.__polled)} polled, {len(rows)} shown  "
+            f"sort: {self.__sort}{' desc' if self.__reverse else ''}  {'  '.join(filters)}"
+        )
+        self.__put(window, 0, 0, width, title, curses.A_BOLD)
+
+        x = 0
+        for (name, _), column_width in zip(COLUMNS, widths):
+            if x >= width:
+                break
+            self.__put(window, 1, x, min(column_width, width - x), name, curses.A_REVERSE)
+            x += column_width + 1
+
+        for line in range(page):
+            y = line + 2
+            cells = visible[line].cells() if line < len(visible) else [""] * len(COLUMNS)
+            attr = self.__color(visible[line].state_name) if line < len(visible) else curses.A_NORMAL
+            x = 0
+            for index, (cell, column_width) in enumerate(zip(cells, widths)):
+                if x >= width:
+                    break
+                self.__put(window, y, x, min(column_width, width - x), cell, attr if index == 2 else curses.A_NORMAL)
+                x += column_width + 1
+
+        self.__put(window, height - 1, 0, width - 1, KEYS_HELP, curses.A_DIM)
+        window.noutrefresh()
+        curses.doupdate()
+
+    def page(self, window) -> int:
+        return max(1, window.getmaxyx()[0] - 3)
+
+
+async def run(window, dashboard: Dashboard, addresses: List[str], scheduler: "PollScheduler", refresh: float):
+    """Polls the printers and draws the dashboard until q is pressed"""
+    import asyncio
+    from pxctl.async_printer_service import AsyncPrinterService
+
+    loop = asyncio.get_running_loop()
+    window.nodelay(True)
+    window.keypad(True)
+    dashboard.init_colors()
+    window.erase()
+
+    key_pressed = asyncio.Event()
+    loop.add_reader(sys.stdin.fileno(), key_pressed.set)
+
+    async with AsyncPrinterService(addresses) as print_service:
+        async def poll_printer(address: str):
+            scheduler.add(address)
+            while True:
+                info = await print_service.get_printing_info(address)
+                dashboard.update(address, info)
+                scheduler.schedule(address, info)
+                await asyncio.sleep(max(0.0, scheduler.deadline(address) - time.monotonic()))
+
+        pollers = [loop.create_task(poll_printer(address)) for address in addresses]
+        try:
+            drawn_at = 0.0
+            while True:
+                # polled states are drawn at most every refresh seconds, keys right away
+                try:
+                    await asyncio.wait_for(key_pressed.wait(), max(0.0, drawn_at + refresh - time.monotonic()))
+                except asyncio.TimeoutError:
+                    pass
+                key_pressed.clear()
+                while True:
+                    key = window.getch()
+                    if key == -1:
+                        break
+                    if not dashboard.handle_key(key, dashboard.page(window)):
+                        return
+                    dashboard.draw(window)
+                if time.monotonic() - drawn_at >= refresh:
+                    dashboard.draw(window)
+                    drawn_at = time.monotonic()
+        finally:
+            loop.remove_reader(sys.stdin.fileno())
+            for poller in pollers:
+                poller.cancel()
@@ -1,4 +1,37 @@
-from . import notifications
-from . import printer_service
-from . import structs
-from . import enums
+import importlib
+
+# Submodules are imported on first access, a CLI call only pays for what it uses
+__all__ = [
+    "anomaly",
+    "async_printer_service",
+    "board",
+    "capture",
+    "catalog",
+    "codecs",
+    "connection",
+    "daemon",
+    "daemon_client",
+    "discovery_cache",
+    "dispatch",
+    "enums",
+    "eta",
+    "experimental",
+    "exporter",
+    "history",
+    "instrumentation",
+    "notifications",
+    "printer_service",
+    "replay",
+    "scheduler",
+    "sinks",
+    "state_diff",
+    "structs",
+    "upload",
+    "utils",
+]
+
+
+def __getattr__(name: str):
+    if name in __all__:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
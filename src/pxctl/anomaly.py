@@ -0,0 +1,215 @@
+import math
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from .enums import NetPrinterState
+from .structs import Printer, PrinterState
+
+# Temperatures are only judged while printing, heating up and cooling down
+# are expected to move them fast.
+CHANNELS: Tuple[Tuple[str, str], ...] = (
+    ("left", "left_extruder_temperature"),
+    ("right", "right_extruder_temperature"),
+    ("table", "table_temperature"),
+)
+
+CHECK_DEVIATION = "deviation"
+CHECK_RATE = "rate"
+CHECK_FLEET = "fleet"
+
+
+@dataclass
+class AnomalyThresholds:
+    window: int = 60
+    min_samples: int = 10
+    sigmas: float = 4.0
+    min_deviation: float = 3.0
+    rate: float = 3.0
+    rate_span: float = 5.0
+    fleet_deviation: float = 10.0
+    fleet_min_printers: int = 3
+    fleet_interval: float = 5.0
+
+
+@dataclass
+class Anomaly:
+    address: str
+    channel: str
+    check: str
+    value: float
+    expected: float
+
+
+class _Window:
+    """Rolling sums of the last samples of every channel of one printer.
+
+    Samples are kept interleaved in one array, the sums are updated as samples
+    enter and leave the window and recomputed once per full turn so the float
+    error doesn't build up.
+    """
+
+    __slots__ = ("size", "values", "times", "sums", "squares", "count", "position")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.values = array("d", bytes(8 * size * len(CHANNELS)))
+        self.times = array("d", bytes(8 * size))
+        self.sums = [0.0] * len(CHANNELS)
+        self.squares = [0.0] * len(CHANNELS)
+        self.count = 0
+        self.position = 0
+
+    def before(self, timestamp: float, span: float) -> int | None:
+        """Gets the slot of the newest sample taken at least span before timestamp"""
+        for back in range(1, self.count + 1):
+            slot = (self.position - back) % self.size
+            if timestamp - self.times[slot] >= span:
+                return slot
+        return None
+
+    def push(self, sample: Tuple[float, ...], timestamp: float):
+        base = self.position * len(CHANNELS)
+        full = self.count == self.size
+        for channel, value in enumerate(sample):
+            if full:
+                evicted = self.values[base + channel]
+                self.sums[channel] -= evicted
+                self.squares[channel] -= evicted * evicted
+            self.values[base + channel] = value
+            self.sums[channel] += value
+            self.squares[channel] += value * value
+        self.times[self.position] = timestamp
+        self.count = min(self.count + 1, self.size)
+        self.position = (self.position + 1) % self.size
+        if self.position == 0:
+            self.__resum()
+
+    def __resum(self):
+        for channel in range(len(CHANNELS)):
+            values = self.values[channel::len(CHANNELS)][:self.count]
+            self.sums[channel] = math.fsum(values)
+            self.squares[channel] = math.fsum(value * value for value in values)
+
+    def mean(self, channel: int) -> float:
+        return self.sums[channel] / self.count
+
+    def std(self, channel: int) -> float:
+        mean = self.mean(channel)
+        return math.sqrt(max(0.0, self.squares[channel] / self.count - mean * mean))
+
+
+class AnomalyDetector:
+    """Finds temperatures of printing printers which misbehave.
+
+    Every poll is checked against the rolling mean and deviation of the
+    printer's own recent samples and for changing faster than rate over the
+    last rate_span seconds. Every
+    fleet_interval the rolling means of printers using the same material
+    profile are compared with their median, which catches a slow drift the
+    own window follows along. Anomalies are reported once when they start.
+    """
+
+    def __init__(self, thresholds: AnomalyThresholds | None = None):
+        self.__thresholds = thresholds or AnomalyThresholds()
+        self.__windows: Dict[str, _Window] = {}
+        self.__profiles: Dict[str, Tuple[str, str]] = {}
+        self.__active: Dict[Tuple[str, str, str], Anomaly] = {}
+        self.__compared_at: float | None = None
+
+    def set_printer(self, printer: Printer):
+        self.__profiles[printer.ip_address] = (printer.left_extruder_profile, printer.right_extruder_profile)
+
+    def update(self, address: str, info: PrinterState | None, timestamp: float | None = None) -> List[Anomaly]:
+        """Checks a polled state of a printer
+
+        Args:
+            address (str): the printer
+            info (PrinterState | None): the polled state, None if the printer didn't respond
+            timestamp (float | None): monotonic time of the poll, now if omitted
+
+        Returns:
+            List[Anomaly]: the anomalies which started with this poll, of this or other printers
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        found: Dict[Tuple[str, str, str], Anomaly] = {}
+        # (address, check) pairs evaluated now, their anomalies not found again are over
+        checked = set()
+
+        # a missed poll changes nothing
+        if info is not None and info.state != NetPrinterState.npstPrinting:
+            self.__windows.pop(address, None)
+            checked.update((address, check) for check in (CHECK_DEVIATION, CHECK_RATE, CHECK_FLEET))
+        elif info is not None:
+            checked.update(((address, CHECK_DEVIATION), (address, CHECK_RATE)))
+            self.__check(address, info, timestamp, found)
+
+        if self.__compared_at is None:
+            self.__compared_at = timestamp
+        if timestamp - self.__compared_at >= self.__thresholds.fleet_interval:
+            self.__compared_at = timestamp
+            checked.update((address, CHECK_FLEET) for address in self.__windows)
+            self.__compare_fleet(found)
+
+        return self.__edges(found, checked)
+
+    def __check(self, address: str, info: PrinterState, timestamp: float, found: Dict):
+        thresholds = self.__thresholds
+        sample = tuple(getattr(info, name) for _, name in CHANNELS)
+        window = self.__windows.get(address)
+        if window is None:
+            window = self.__windows[address] = _Window(thresholds.window)
+
+        if window.count >= thresholds.min_samples:
+            for channel, (channel_name, _) in enumerate(CHANNELS):
+                mean = window.mean(channel)
+                allowed = max(thresholds.sigmas * window.std(channel), thresholds.min_deviation)
+                if abs(sample[channel] - mean) > allowed:
+                    found[(address, channel_name, CHECK_DEVIATION)] = Anomaly(
+                        address, channel_name, CHECK_DEVIATION, sample[channel], mean
+                    )
+
+        # the rate over a few seconds, between two close polls it would be mostly sensor noise
+        slot = window.before(timestamp, thresholds.rate_span)
+        if slot is not None:
+            elapsed = timestamp - window.times[slot]
+            for channel, (channel_name, _) in enumerate(CHANNELS):
+                rate = (sample[channel] - window.values[slot * len(CHANNELS) + channel]) / elapsed
+                if abs(rate) > thresholds.rate:
+                    found[(address, channel_name, CHECK_RATE)] = Anomaly(
+                        address, channel_name, CHECK_RATE, rate, thresholds.rate
+                    )
+        window.push(sample, timestamp)
+
+    def __compare_fleet(self, found: Dict):
+        thresholds = self.__thresholds
+        for channel, (channel_name, _) in enumerate(CHANNELS):
+            groups: Dict[object, List[Tuple[str, float]]] = {}
+            for address, window in self.__windows.items():
+                profiles = self.__profiles.get(address)
+                if profiles is None or window.count < thresholds.min_samples:
+                    continue
+                # the table temperature follows the materials of both extruders
+                profile = profiles if channel_name == "table" else profiles[channel]
+                groups.setdefault(profile, []).append((address, window.mean(channel)))
+
+            for members in groups.values():
+                if len(members) < thresholds.fleet_min_printers:
+                    continue
+                means = sorted(mean for _, mean in members)
+                middle = len(means) // 2
+                median = means[middle] if len(means) % 2 else (means[middle - 1] + means[middle]) / 2
+                for address, mean in members:
+                    if abs(mean - median) > thresholds.fleet_deviation:
+                        found[(address, channel_name, CHECK_FLEET)] = Anomaly(
+                            address, channel_name, CHECK_FLEET, mean, median
+                        )
+
+    def __edges(self, found: Dict, checked: set) -> List[Anomaly]:
+        started = [anomaly for key, anomaly in found.items() if key not in self.__active]
+        for key in [key for key in self.__active if (key[0], key[2]) in checked and key not in found]:
+            del self.__active[key]
+        self.__active.update(found)
+        return started
@@ -0,0 +1,148 @@
+import asyncio
+import socket
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from . import capture, instrumentation
+from .codecs import StatusDecoder
+from .connection import command_code
+from .printer_service import STATUS_CMD, STATUS_CODE, STATUS_SIZE
+from .structs import PrinterState
+
+
+class _StatusProtocol(asyncio.DatagramProtocol):
+    def __init__(self, service: "AsyncPrinterService"):
+        self.__service = service
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]):
+        self.__service._on_datagram(data, addr[0])
+
+    def error_received(self, exc: Exception):
+        # ICMP port unreachable and friends: the pending request just times out
+        pass
+
+
+class AsyncPrinterService:
+    """Polls the status of many printers over a single UDP socket.
+
+    Requests to every printer share one datagram endpoint, replies are matched
+    to the pending request by their source address. Host names are resolved
+    once, when the service starts or a printer is first polled.
+    """
+
+    def __init__(self, addresses: Iterable[str], port: int = 54321, timeout: float = 0.3):
+        self.__addresses: List[str] = list(dict.fromkeys(addresses))
+        self.__port = port
+        self.__timeout = timeout
+        self.__transport: asyncio.DatagramTransport | None = None
+        self.__peers: Dict[str, str] = {}
+        self.__names: Dict[str, str] = {}
+        self.__pending: Dict[str, asyncio.Future] = {}
+        self.__decoders: Dict[str, StatusDecoder] = {}
+        self.__instruments = instrumentation.active()
+        self.__capture = capture.active()
+
+    @property
+    def addresses(self) -> List[str]:
+        return list(self.__addresses)
+
+    async def __aenter__(self):
+        loop = asyncio.get_running_loop()
+        self.__transport, _ = await loop.create_datagram_endpoint(
+            lambda: _StatusProtocol(self), local_addr=("0.0.0.0", 0)
+        )
+        # a printer which can't be resolved yet is tried again when it's polled
+        await asyncio.gather(*(self.__resolve(address) for address in self.__addresses), return_exceptions=True)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self.__transport is not None:
+            self.__transport.close()
+            self.__transport = None
+        for future in self.__pending.values():
+            future.cancel()
+        self.__pending.clear()
+
+    async def __resolve(self, address: str) -> str:
+        peer = self.__peers.get(address)
+        if peer is not None:
+            return peer
+        try:
+            is_ip = socket.inet_ntoa(socket.inet_aton(address)) == address
+        except OSError:
+            is_ip = False
+        if is_ip:
+            peer = address
+        else:
+            peer = await asyncio.get_running_loop().run_in_executor(None, socket.gethostbyname, address)
+        self.__peers[address] = peer
+        self.__names[peer] = address
+        return peer
+
+    def _on_datagram(self, data: bytes, peer: str):
+        address = self.__names.get(peer, peer)
+        future = self.__pending.get(peer)
+        if future is None or future.done():
+            if self.__instruments is not None:
+                self.__instruments.of(address, STATUS_CODE).stale_frames += 1
+            return
+        if command_code(data) != STATUS_CODE:
+            if self.__instruments is not None:
+                self.__instruments.of(address, STATUS_CODE).stale_frames += 1
+            return
+        if len(data) != STATUS_SIZE:
+            if self.__instruments is not None:
+                self.__instruments.of(address, STATUS_CODE).malformed_frames += 1
+            return
+        future.set_result(data)
+
+    async def get_printing_info(self, address: str) -> PrinterState | None:
+        stats = self.__instruments.of(address, STATUS_CODE) if self.__instruments is not None else None
+        try:
+            peer = await self.__resolve(address)
+        except OSError:
+            # nothing was sent, the name is resolved again on the next poll
+            if self.__capture is not None:
+                self.__capture.write(address, None)
+            return None
+        future = asyncio.get_running_loop().create_future()
+        self.__pending[peer] = future
+        sent_at = time.monotonic()
+        try:
+            self.__transport.sendto(STATUS_CMD, (peer, self.__port))
+            if stats is not None:
+                stats.sends += 1
+            data = await asyncio.wait_for(future, self.__timeout)
+        except (asyncio.TimeoutError, OSError):
+            if stats is not None:
+                stats.timeouts += 1
+            if self.__capture is not None:
+                self.__capture.write(address, None)
+            return None
+        finally:
+            if self.__pending.get(peer) is future:
+                del self.__pending[peer]
+        if stats is not None:
+            stats.replies += 1
+            stats.latency.record(time.monotonic() - sent_at)
+        if self.__capture is not None:
+            self.__capture.write(address, data)
+        decoder = self.__decoders.get(address)
+        if decoder is None:
+            decoder = self.__decoders[address] = StatusDecoder()
+        started_at = time.perf_counter()
+        try:
+            info = decoder.decode(data)
+        except ValueError:
+            if stats is not None:
+                stats.malformed_frames += 1
+            return None
+        if stats is not None:
+            stats.decode.record(time.perf_counter() - started_at)
+        return info
+
+    async def poll_all(self) -> Dict[str, PrinterState | None]:
+        states = await asyncio.gather(
+            *(self.get_printing_info(address) for address in self.__addresses)
+        )
+        return dict(zip(self.__addresses, states))
@@ -0,0 +1,267 @@
+import os
+import struct
+import sys
+from dataclasses import dataclass
+from typing import Dict, List
+
+from .enums import NetPrinterState
+from .sinks import FLAG_PRINTING, FLAG_READY, NOT_CONNECTED
+from .structs import PrinterState
+
+# Segment layout: HEADER, with the pid of the poller which owns the board,
+# then slot_count slots of slot_size bytes. A slot
+# is a sequence number followed by two copies of SLOT_BODY. The poller takes
+# a free slot the first time it publishes a printer and keeps it, slots are
+# filled in order so the first never written slot ends the scan.
+#
+# The sequence number is a seqlock over the two copies: it is odd while a
+# copy is being written and sequence // 2 writes are complete, write n goes
+# to copy n % 2. A reader copies the last complete body and keeps it unless
+# the poller started writing over that same copy meanwhile, which takes two
+# more writes, otherwise it reads again. Readers never write to the segment
+# and never wait on the poller.
+MAGIC = b"PXB1"
+VERSION = 2
+HEADER = struct.Struct("<4sHHIIB")
+HEADER_SIZE = 64
+SEQUENCE = struct.Struct("<Q")
+SLOT_BODY = struct.Struct("<32s16sdBBffff255s")
+SLOT_SIZE = -(-(SEQUENCE.size + 2 * SLOT_BODY.size) // 64) * 64
+DEFAULT_SLOTS = 256
+MAX_READ_ATTEMPTS = 1000
+
+OPEN = 1
+CLOSED = 0
+
+
+def default_board_name() -> str:
+    return f"pxctl-board-{os.getuid()}"
+
+
+@dataclass
+class BoardEntry:
+    serial: str
+    address: str
+    timestamp: float
+    info: PrinterState | None
+
+
+def _decode(body: bytes) -> BoardEntry:
+    serial, address, timestamp, state, flags, progress, left, right, table, task = SLOT_BODY.unpack(body)
+    info = None
+    if state != NOT_CONNECTED:
+        info = PrinterState(
+            NetPrinterState(state),
+            left,
+            right,
+            table,
+            task.rstrip(b"\x00").decode("utf-8", "replace"),
+            bool(flags & FLAG_PRINTING),
+            bool(flags & FLAG_READY),
+            progress,
+        )
+    return BoardEntry(serial.rstrip(b"\x00").decode("ascii"), address.rstrip(b"\x00").decode("ascii"), timestamp, info)
+
+
+class StatusBoard:
+    """Publishes the latest state of every printer in shared memory.
+
+    Only one process writes, the poller, any number of local processes read
+    it through BoardReader without syscalls or requests to the printers.
+    """
+
+    def __init__(self, name: str | None = None, slots: int = DEFAULT_SLOTS):
+        from multiprocessing import shared_memory
+
+        name = name or default_board_name()
+        size = HEADER_SIZE + slots * SLOT_SIZE
+        try:
+            self.__memory = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            _reclaim(name)
+            self.__memory = shared_memory.SharedMemory(name, create=True, size=size)
+        self.__buf = self.__memory.buf
+        self.__slots: Dict[str, int] = {}
+        self.__slot_count = slots
+        self.__full_reported = False
+        HEADER.pack_into(self.__buf, 0, MAGIC, VERSION, slots, SLOT_SIZE, os.getpid(), OPEN)
+
+    @property
+    def name(self) -> str:
+        return self.__memory.name
+
+    def publish(self, serial: str, address: str, info: PrinterState | None, timestamp: float):
+        """Writes the state of a printer
+
+        Args:
+            serial (str): key of the printer, at most 32 bytes
+            address (str): IPv4 address of the printer
+            info (PrinterState | None): the polled state, None if the printer didn't respond
+            timestamp (float): unix time of the poll
+        """
+        slot = self.__slots.get(serial)
+        if slot is None:
+            if len(self.__slots) >= self.__slot_count:
+                if not self.__full_reported:
+                    print(f"Status board {self.name} is full, {serial} isn't published", file=sys.stderr)
+                    self.__full_reported = True
+                return
+            slot = self.__slots[serial] = len(self.__slots)
+
+        if info is None:
+            body = (NOT_CONNECTED, 0, 0.0, 0.0, 0.0, 0.0, b"")
+        else:
+            flags = (FLAG_READY if info.is_ready else 0) | (FLAG_PRINTING if info.is_printing else 0)
+            body = (
+                info.state.value,
+                flags,
+                info.progress_percents,
+                info.left_extruder_temperature,
+                info.right_extruder_temperature,
+                info.table_temperature,
+                info.current_task_file.encode("utf-8"),
+            )
+        offset = HEADER_SIZE + slot * SLOT_SIZE
+        buf = self.__buf
+        (sequence,) = SEQUENCE.unpack_from(buf, offset)
+        copy = offset + SEQUENCE.size + (sequence // 2 + 1) % 2 * SLOT_BODY.size
+        SEQUENCE.pack_into(buf, offset, sequence + 1)
+        SLOT_BODY.pack_into(buf, copy, serial.encode("ascii"), address.encode("ascii"), timestamp, *body)
+        SEQUENCE.pack_into(buf, offset, sequence + 2)
+
+    def close(self):
+        _mark_closed(self.__buf)
+        self.__buf = None
+        self.__memory.close()
+        self.__memory.unlink()
+
+
+def _mark_closed(buf: memoryview):
+    if len(buf) >= HEADER.size and bytes(buf[:len(MAGIC)]) == MAGIC:
+        buf[HEADER.size - 1] = CLOSED
+
+
+def _untrack(memory):
+    # otherwise the exit of this process would unlink the segment of the poller
+    from multiprocessing import resource_tracker
+
+    resource_tracker.unregister(memory._name, "shared_memory")
+
+
+def _running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _reclaim(name: str):
+    """Unlinks a board left behind by a poller that didn't exit cleanly
+
+    Raises:
+        FileExistsError: the board is owned by a running poller, or name isn't a status board
+    """
+    from multiprocessing import shared_memory
+
+    existing = shared_memory.SharedMemory(name)
+    try:
+        if len(existing.buf) < HEADER_SIZE:
+            raise FileExistsError(f"{name} exists and is not a pxctl status board")
+        magic, version, _, _, owner, state = HEADER.unpack_from(existing.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise FileExistsError(f"{name} exists and is not a pxctl status board")
+        if state == OPEN and _running(owner):
+            raise FileExistsError(f"Status board {name} is published by the running process {owner}")
+    except FileExistsError:
+        existing.close()
+        _untrack(existing)
+        raise
+    # readers of it see it closed
+    _mark_closed(existing.buf)
+    existing.close()
+    existing.unlink()
+
+
+class BoardReader:
+    """Reads consistent printer states from a status board.
+
+    Example:
+        with BoardReader() as board:
+            entry = board.read("SIM00001")
+    """
+
+    def __init__(self, name: str | None = None):
+        from multiprocessing import shared_memory
+
+        name = name or default_board_name()
+        if sys.version_info >= (3, 13):
+            self.__memory = shared_memory.SharedMemory(name, track=False)
+        else:
+            self.__memory = shared_memory.SharedMemory(name)
+            _untrack(self.__memory)
+        self.__buf = self.__memory.buf
+        magic, version, slots, slot_size, _, _ = HEADER.unpack_from(self.__buf, 0)
+        if magic != MAGIC or version != VERSION or slot_size != SLOT_SIZE:
+            self.__memory.close()
+            raise ValueError(f"{name} is not a pxctl status board")
+        self.__slot_count = slots
+        self.__slots: Dict[str, int] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def closed(self) -> bool:
+        """Whether the poller has stopped, a new one publishes to a new board"""
+        return self.__buf[HEADER.size - 1] == CLOSED
+
+    def __read(self, slot: int) -> BoardEntry | None:
+        buf = self.__buf
+        offset = HEADER_SIZE + slot * SLOT_SIZE
+        for _ in range(MAX_READ_ATTEMPTS):
+            (before,) = SEQUENCE.unpack_from(buf, offset)
+            written = before // 2
+            if written == 0:
+                return None
+            start = offset + SEQUENCE.size + written % 2 * SLOT_BODY.size
+            body = bytes(buf[start:start + SLOT_BODY.size])
+            (after,) = SEQUENCE.unpack_from(buf, offset)
+            # the copy is overwritten once write written + 2 starts
+            if after < 2 * written + 3:
+                return _decode(body)
+        raise TimeoutError("The status board is being written too often to read a consistent state")
+
+    def snapshot(self) -> Dict[str, BoardEntry]:
+        """Gets the latest state of every published printer, by serial"""
+        entries: List[BoardEntry] = []
+        for slot in range(self.__slot_count):
+            entry = self.__read(slot)
+            if entry is None:
+                break
+            self.__slots.setdefault(entry.serial, slot)
+            entries.append(entry)
+        return {entry.serial: entry for entry in entries}
+
+    def read(self, serial: str) -> BoardEntry | None:
+        """Gets the latest state of a printer
+
+        Args:
+            serial (str): serial of the printer, or its address if the poller didn't know the serial
+
+        Returns:
+            BoardEntry | None: None if the printer isn't published
+        """
+        slot = self.__slots.get(serial)
+        if slot is None:
+            return self.snapshot().get(serial)
+        return self.__read(slot)
+
+    def close(self):
+        self.__buf = None
+        self.__memory.close()
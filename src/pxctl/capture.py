@@ -0,0 +1,98 @@
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator
+
+# Capture file: MAGIC once, then one record per status poll. A record is
+# RECORD_HEADER (unix time, address length, frame length) followed by the
+# address and the raw status frame as received. A poll the printer didn't
+# answer has an empty frame.
+MAGIC = b"PXF1"
+RECORD_HEADER = struct.Struct("<dBH")
+FLUSH_EVERY = 64
+
+
+@dataclass
+class CapturedFrame:
+    timestamp: float
+    address: str
+    frame: bytes | None
+
+
+def read_capture(data: bytes) -> Iterator[CapturedFrame]:
+    """Decodes a capture file
+
+    Args:
+        data (bytes): the whole file, starting with the magic
+
+    Yields:
+        CapturedFrame: the polls in the order they were captured, a truncated last record is skipped
+    """
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a pxctl capture")
+    offset = len(MAGIC)
+    while offset + RECORD_HEADER.size <= len(data):
+        timestamp, address_size, frame_size = RECORD_HEADER.unpack_from(data, offset)
+        offset += RECORD_HEADER.size
+        if offset + address_size + frame_size > len(data):
+            return
+        address = data[offset:offset + address_size].decode("ascii")
+        offset += address_size
+        frame = data[offset:offset + frame_size]
+        offset += frame_size
+        yield CapturedFrame(timestamp, address, frame or None)
+
+
+class Capture:
+    """Appends the raw status frames of every poll to a capture file.
+
+    Printer services pick up the active capture when they are created,
+    without one they only pay a None check per poll.
+    """
+
+    def __init__(self, stream: BinaryIO, header: bool = True):
+        self.__stream = stream
+        self.__lock = threading.Lock()
+        self.__pending = 0
+        if header:
+            stream.write(MAGIC)
+
+    def write(self, address: str, frame: bytes | bytearray | memoryview | None, timestamp: float | None = None):
+        raw_address = address.encode("ascii")
+        frame = frame or b""
+        record = RECORD_HEADER.pack(time.time() if timestamp is None else timestamp, len(raw_address), len(frame))
+        with self.__lock:
+            self.__stream.write(record)
+            self.__stream.write(raw_address)
+            self.__stream.write(frame)
+            self.__pending += 1
+            if self.__pending >= FLUSH_EVERY:
+                self.__stream.flush()
+                self.__pending = 0
+
+    def close(self):
+        with self.__lock:
+            self.__stream.close()
+
+
+_active: Capture | None = None
+
+
+def active() -> Capture | None:
+    return _active
+
+
+def start(path: str) -> Capture:
+    global _active
+    if _active is None:
+        stream = open(path, "ab")
+        _active = Capture(stream, header=stream.tell() == 0)
+    return _active
+
+
+def stop():
+    global _active
+    if _active is not None:
+        _active.close()
+        _active = None
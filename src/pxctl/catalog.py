@@ -0,0 +1,114 @@
+import json
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict
+
+from .discovery_cache import default_cache_dir
+from .printer_service import PrinterService
+from .structs import PrinterCatalog, PrintList, Task
+
+
+@dataclass
+class RefreshStats:
+    printlists: int = 0
+    fetched: int = 0
+    dropped: int = 0
+
+
+class CatalogIndex:
+    """Local copy of the print lists and tasks of each printer, by serial.
+
+    A refresh fetches the print list summaries only and re-fetches the
+    tasks of the lists whose generation or task count changed, unchanged
+    lists are served from the index.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.__path = path or os.path.join(default_cache_dir(), "catalog.json")
+        self.__records: Dict[str, dict] | None = None
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    def __load(self) -> Dict[str, dict]:
+        if self.__records is None:
+            try:
+                with open(self.__path, "r") as f:
+                    self.__records = json.load(f)
+            except (OSError, ValueError):
+                self.__records = {}
+        return self.__records
+
+    def save(self):
+        if self.__records is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.__path), exist_ok=True)
+            tmp_path = f"{self.__path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.__records, f)
+            os.replace(tmp_path, self.__path)
+        except OSError as e:
+            print(f"Can't write print list index {self.__path}: {e}", file=sys.stderr)
+
+    def get(self, serial: str) -> PrinterCatalog | None:
+        record = self.__load().get(serial)
+        if record is None:
+            return None
+        try:
+            return PrinterCatalog(
+                serial=serial,
+                refreshed_at=record["refreshed_at"],
+                printlists={name: PrintList(**fields) for name, fields in record["printlists"].items()},
+                tasks={name: [Task(**fields) for fields in tasks] for name, tasks in record["tasks"].items()},
+            )
+        except (KeyError, TypeError):
+            return None
+
+    def put(self, catalog: PrinterCatalog):
+        self.__load()[catalog.serial] = {
+            "refreshed_at": catalog.refreshed_at,
+            "printlists": {name: asdict(printlist) for name, printlist in catalog.printlists.items()},
+            "tasks": {name: [asdict(task) for task in tasks] for name, tasks in catalog.tasks.items()},
+        }
+
+    def forget(self, serial: str):
+        self.__load().pop(serial, None)
+
+    def refresh(self, serial: str, service: PrinterService) -> tuple[PrinterCatalog | None, RefreshStats]:
+        """Brings the index of a printer up to date, fetching only what changed
+
+        Args:
+            serial (str): the serial of the printer
+            service (PrinterService): connected to the printer
+
+        Returns:
+            tuple[PrinterCatalog | None, RefreshStats]: the refreshed catalog, None if the printer didn't
+                respond, and how much of it came from the wire
+        """
+        stats = RefreshStats()
+        printlists = service.get_printlists()
+        if printlists is None:
+            return None, stats
+
+        cached = self.get(serial) or PrinterCatalog(serial)
+        catalog = PrinterCatalog(serial, time.time())
+        stats.printlists = len(printlists)
+        for printlist in printlists:
+            tasks = cached.tasks.get(printlist.name)
+            if cached.printlists.get(printlist.name) != printlist or tasks is None:
+                tasks = service.get_tasks(printlist.name)
+                if tasks is None:
+                    # keep the stale copy, it is re-fetched on the next refresh
+                    catalog.printlists[printlist.name] = cached.printlists.get(printlist.name, PrintList(printlist.name, 0, -1))
+                    catalog.tasks[printlist.name] = cached.tasks.get(printlist.name, [])
+                    continue
+                stats.fetched += 1
+            catalog.printlists[printlist.name] = printlist
+            catalog.tasks[printlist.name] = tasks
+        stats.dropped = len(set(cached.printlists) - set(catalog.printlists))
+        self.put(catalog)
+        return catalog, stats
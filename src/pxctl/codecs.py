@@ -0,0 +1,114 @@
+import struct
+
+from .enums import NetPrinterState, PrinterType
+from .structs import PrinterState, Printer
+from .utils import MagicPicasoConverters
+
+# Every frame starts with this header: protocol version, command code, reserved
+# and the length of the whole frame. Replies echo the header of the request.
+HEADER = struct.Struct("<HHHH")
+PROTOCOL_VERSION = 1
+
+# Frames are decoded in place with unpack_from, string fields are padded out of
+# the structs and sliced from the buffer only when they are needed.
+STATUS_FRAME = struct.Struct("8xB7x?255xh1xf15xff4xff28x")
+STATUS_TASK_NAME_OFFSET = 17
+STATUS_TASK_NAME_SIZE = 255
+
+PRINTER_INFO_FRAME = struct.Struct("BB6xBB3x20x20x47x40x10x40xx")
+PRINTER_INFO_SERIAL = (33, 20)
+PRINTER_INFO_LEFT_PROFILE = (100, 40)
+PRINTER_INFO_RIGHT_PROFILE = (150, 40)
+
+
+class FrameError(ValueError):
+    pass
+
+
+def encode_header(code: int, payload_size: int = 0) -> bytes:
+    return HEADER.pack(PROTOCOL_VERSION, code, 0, HEADER.size + payload_size)
+
+
+def _check_size(frame: struct.Struct, nbytes: int, name: str):
+    if nbytes != frame.size:
+        raise FrameError(f"Wrong {name} frame size: {nbytes}, expected {frame.size}")
+
+
+def _c_string(buf: bytes | bytearray, field: tuple[int, int]) -> str:
+    offset, size = field
+    end = buf.find(b"\x00", offset, offset + size)
+    if end < 0:
+        end = offset + size
+    return str(buf[offset:end], "utf-8", "replace")
+
+
+def c_string(raw: bytes) -> str:
+    return _c_string(raw, (0, len(raw)))
+
+
+class StatusDecoder:
+    """Decodes status frames, the task name is decoded once per task.
+
+    The frame may live in a reused receive buffer, nothing refers to the
+    buffer after decode() returns.
+    """
+
+    def __init__(self):
+        self.__task_name_raw = b""
+        self.__task_name = ""
+
+    def decode(self, buf: bytes | bytearray, nbytes: int | None = None) -> PrinterState:
+        _check_size(STATUS_FRAME, len(buf) if nbytes is None else nbytes, "status")
+        (
+            code,
+            is_ready_to_print,
+            printing_marker,
+            progress,
+            left_extruder_temperature,
+            right_extruder_temperature,
+            table_temperature,
+            _,
+        ) = STATUS_FRAME.unpack_from(buf)
+
+        return PrinterState(
+            state=NetPrinterState(code),
+            left_extruder_temperature=left_extruder_temperature,
+            right_extruder_temperature=right_extruder_temperature,
+            table_temperature=table_temperature,
+            current_task_file=self.__decode_task_name(buf),
+            is_printing=printing_marker != 0,
+            is_ready=is_ready_to_print,
+            progress_percents=progress,
+        )
+
+    def __decode_task_name(self, buf: bytes | bytearray) -> str:
+        end = buf.find(b"\x00", STATUS_TASK_NAME_OFFSET, STATUS_TASK_NAME_OFFSET + STATUS_TASK_NAME_SIZE)
+        if end < 0:
+            end = STATUS_TASK_NAME_OFFSET + STATUS_TASK_NAME_SIZE
+        with memoryview(buf)[STATUS_TASK_NAME_OFFSET:end] as raw:
+            if raw != self.__task_name_raw:
+                self.__task_name_raw = raw.tobytes()
+                self.__task_name = str(self.__task_name_raw, "utf-8", "replace")
+        return self.__task_name
+
+
+def decode_status(buf: bytes | bytearray, nbytes: int | None = None) -> PrinterState:
+    return StatusDecoder().decode(buf, nbytes)
+
+
+def decode_printer(buf: bytes | bytearray, address: str, nbytes: int | None = None) -> Printer:
+    _check_size(PRINTER_INFO_FRAME, len(buf) if nbytes is None else nbytes, "printer info")
+    protocol_version, sub_version, low_hw_version, hi_hw_version = PRINTER_INFO_FRAME.unpack_from(buf)
+    return Printer(
+        protocol_version=protocol_version,
+        sub_version=sub_version,
+        low_hw_version=low_hw_version,
+        hi_hw_version=hi_hw_version,
+        printer_type=PrinterType(
+            MagicPicasoConverters.convert_hi_hw_ver_to_printer_model(hi_hw_version)
+        ),
+        serial=_c_string(buf, PRINTER_INFO_SERIAL),
+        ip_address=address,
+        left_extruder_profile=_c_string(buf, PRINTER_INFO_LEFT_PROFILE),
+        right_extruder_profile=_c_string(buf, PRINTER_INFO_RIGHT_PROFILE),
+    )
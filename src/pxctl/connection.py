@@ -1,14 +1,92 @@
 import select
 import socket
+import time
+from dataclasses import dataclass, field
+from typing import Dict
+
+from . import instrumentation
+from .instrumentation import CommandStats
+
+DEFAULT_TIMEOUT = 0.3
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 2.0
+RECV_BUFFER_SIZE = 2048
+
+
+def command_code(frame: bytes) -> int | None:
+    """Gets the command code from the header of a request or reply frame
+
+    Args:
+        frame (bytes): raw frame, replies echo the header of the request
+
+    Returns:
+        int | None: command code, None if the frame is too short to have a header
+    """
+    if len(frame) < 4:
+        return None
+    return int.from_bytes(frame[2:4], "little")
+
+
+@dataclass
+class LatencyStats:
+    count: int = 0
+    total: float = 0.0
+    min: float = float("inf")
+    max: float = 0.0
+
+    def add(self, latency: float):
+        self.count += 1
+        self.total += latency
+        self.min = min(self.min, latency)
+        self.max = max(self.max, latency)
+
+    @property
+    def avg(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+@dataclass
+class ConnectionStats:
+    requests: int = 0
+    replies: int = 0
+    retries: int = 0
+    timeouts: int = 0
+    stale_frames: int = 0
+    latency: Dict[int, LatencyStats] = field(default_factory=dict)
 
 
 class Connection:
-    def __init__(self, address: str, port: int = 54321):
+    def __init__(
+        self,
+        address: str,
+        port: int = 54321,
+        timeout: float = DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+        timeouts: Dict[int, float] | None = None,
+    ):
         self.__address = address
+        self.__peer = address
         self.__port = port
+        self.__timeout = timeout
+        self.__retries = retries
+        self.__backoff = backoff
+        self.__timeouts = dict(timeouts or {})
+        self.__stats = ConnectionStats()
+        self.__instruments = instrumentation.active()
+        self.__buffer = bytearray(RECV_BUFFER_SIZE)
         self.__socket: socket.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 
+    @property
+    def address(self) -> str:
+        return self.__address
+
+    @property
+    def stats(self) -> ConnectionStats:
+        return self.__stats
+
     def __enter__(self):
+        self.__peer = socket.gethostbyname(self.__address)
         self.__socket.setblocking(False)
         self.__socket.bind(("0.0.0.0", 0))
         return self
@@ -17,14 +95,150 @@ class Connection:
         if self.__socket is not None:
             self.__socket.close()
 
+    def set_timeout(self, code: int, timeout: float):
+        self.__timeouts[code] = timeout
+
     def send(self, buf: bytes) -> int:
-        return self.__socket.sendto(buf, (self.__address, self.__port))
+        return self.__socket.sendto(buf, (self.__peer, self.__port))
+
+    def send_parts(self, *parts: bytes | memoryview) -> int:
+        """Sends one datagram gathered from several buffers without joining them"""
+        return self.__socket.sendmsg(parts, [], 0, (self.__peer, self.__port))
 
-    def recv(self) -> bytes | None:
-        read_ready, _, _ = select.select([self.__socket], [], [], 0.3)
+    def receive_into(self, buffer: bytearray, timeout: float) -> int:
+        """Receives the next datagram of the printer into buffer
+
+        Args:
+            buffer (bytearray): reusable receive buffer
+            timeout (float): how long to wait for a datagram
+
+        Returns:
+            int: the length of the datagram, 0 on timeout
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            read_ready, _, _ = select.select([self.__socket], [], [], max(0.0, deadline - time.monotonic()))
+            if not read_ready:
+                return 0
+            try:
+                nbytes, (address, _) = self.__socket.recvfrom_into(buffer)
+            except (BlockingIOError, InterruptedError):
+                continue
+            except OSError:
+                continue
+            if address == self.__peer and nbytes > 0:
+                return nbytes
+            self.__stats.stale_frames += 1
+
+    def recv(self, timeout: float = DEFAULT_TIMEOUT) -> bytes | None:
+        read_ready, _, _ = select.select([self.__socket], [], [], timeout)
         if len(read_ready) != 1:
             return None
-        buf, _ = self.__socket.recvfrom(1024)
+        try:
+            buf, _ = self.__socket.recvfrom(1024)
+        except (BlockingIOError, InterruptedError):
+            return None
         if len(buf) <= 0:
             return None
         return buf
+
+    def request(self, cmd: bytes, reply_size: int | None = None) -> bytes | None:
+        """Sends a command and waits for its reply
+
+        Args:
+            cmd (bytes): command frame
+            reply_size (int | None): the expected length of the reply, any if omitted
+
+        Returns:
+            bytes | None: the reply, None if the printer didn't respond
+        """
+        nbytes = self.request_into(cmd, self.__buffer, reply_size)
+        if nbytes == 0:
+            return None
+        return bytes(self.__buffer[:nbytes])
+
+    def request_into(self, cmd: bytes, buffer: bytearray, reply_size: int | None = None) -> int:
+        """Sends a command and receives its reply into buffer
+
+        Frames which don't come from the printer, don't echo the command code
+        or have unexpected length are stale and dropped. The command is resent
+        with exponentially growing timeout until retries are exhausted.
+
+        Args:
+            cmd (bytes): command frame
+            buffer (bytearray): reusable receive buffer
+            reply_size (int | None): the expected length of the reply, any if omitted
+
+        Returns:
+            int: the length of the reply, 0 if the printer didn't respond
+        """
+        code = command_code(cmd)
+        timeout = self.__timeouts.get(code, self.__timeout)
+        command_stats = self.__instruments.of(self.__address, code) if self.__instruments is not None else None
+        self.__drain(command_stats)
+        self.__stats.requests += 1
+
+        for attempt in range(self.__retries + 1):
+            if attempt > 0:
+                self.__stats.retries += 1
+                if command_stats is not None:
+                    command_stats.retries += 1
+            sent_at = time.monotonic()
+            deadline = sent_at + timeout * self.__backoff ** attempt
+            self.send(cmd)
+            if command_stats is not None:
+                command_stats.sends += 1
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                read_ready, _, _ = select.select([self.__socket], [], [], remaining)
+                if not read_ready:
+                    break
+                try:
+                    nbytes, (address, _) = self.__socket.recvfrom_into(buffer)
+                except (BlockingIOError, InterruptedError):
+                    continue
+                except OSError:
+                    # ICMP port unreachable, the printer is not listening (yet)
+                    continue
+                if not self.__is_reply(buffer, nbytes, address, code):
+                    self.__stats.stale_frames += 1
+                    if command_stats is not None:
+                        command_stats.stale_frames += 1
+                    continue
+                if reply_size is not None and nbytes != reply_size:
+                    # the printer answered the command, but not with a frame we can decode
+                    self.__stats.stale_frames += 1
+                    if command_stats is not None:
+                        command_stats.malformed_frames += 1
+                    continue
+                latency = time.monotonic() - sent_at
+                self.__stats.replies += 1
+                self.__stats.latency.setdefault(code, LatencyStats()).add(latency)
+                if command_stats is not None:
+                    command_stats.replies += 1
+                    command_stats.latency.record(latency)
+                return nbytes
+
+        self.__stats.timeouts += 1
+        if command_stats is not None:
+            command_stats.timeouts += 1
+        return 0
+
+    def __is_reply(self, buf: bytearray, nbytes: int, address: str, code: int | None) -> bool:
+        if address != self.__peer or nbytes < 4:
+            return False
+        return int.from_bytes(buf[2:4], "little") == code
+
+    def __drain(self, command_stats: CommandStats | None = None):
+        while True:
+            try:
+                self.__socket.recvfrom_into(self.__buffer)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                continue
+            self.__stats.stale_frames += 1
+            if command_stats is not None:
+                command_stats.stale_frames += 1
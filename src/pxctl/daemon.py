@@ -0,0 +1,268 @@
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+from typing import Dict, Iterable, List
+
+from . import instrumentation
+from .async_printer_service import AsyncPrinterService
+from .board import DEFAULT_SLOTS, StatusBoard
+from .connection import Connection
+from .daemon_client import (
+    DaemonError,
+    default_socket_path,
+    encode_estimate,
+    encode_printer,
+    encode_state,
+)
+from .discovery_cache import DiscoveryCache
+from .eta import EtaEstimator
+from .printer_service import DEFAULT_SWEEP_RATE, PrinterService
+from .scheduler import PollScheduler
+from .structs import Printer, PrinterState
+from .utils import NetworkUtils
+
+DEFAULT_DISCOVERY_INTERVAL = 300.0
+MAX_REQUEST_SIZE = 64 * 1024
+
+
+class Daemon:
+    """Keeps the state of the printers warm for thin CLI calls.
+
+    Every printer is polled on its own adaptive schedule over a single UDP
+    socket, discovery results are refreshed periodically, and requests on
+    the Unix socket are answered from memory, protocol stats included.
+    Printers first asked about by a client are polled right away and then
+    kept warm as well.
+    """
+
+    def __init__(
+        self,
+        addresses: List[str] | None = None,
+        path: str | None = None,
+        scheduler: PollScheduler | None = None,
+        discovery_interval: float = DEFAULT_DISCOVERY_INTERVAL,
+        iface_include: Iterable[str] = (),
+        iface_exclude: Iterable[str] = (),
+        subnets: Iterable[str] = (),
+        sweep_rate: float = DEFAULT_SWEEP_RATE,
+        board: str | None = None,
+        board_slots: int = DEFAULT_SLOTS,
+    ):
+        self.__discover_all = addresses is None
+        self.__addresses: List[str] = list(dict.fromkeys(addresses or []))
+        self.__path = path or default_socket_path()
+        self.__scheduler = scheduler or PollScheduler()
+        self.__discovery_interval = discovery_interval
+        self.__iface_include = tuple(iface_include)
+        self.__iface_exclude = tuple(iface_exclude)
+        self.__subnets = list(subnets)
+        self.__sweep_rate = sweep_rate
+        self.__printers: List[Printer] = []
+        self.__discovered_at: float | None = None
+        self.__discovery: asyncio.Future | None = None
+        self.__states: Dict[str, PrinterState | None] = {}
+        self.__estimator = EtaEstimator()
+        self.__first_poll: Dict[str, asyncio.Event] = {}
+        self.__pollers: Dict[str, asyncio.Task] = {}
+        self.__rediscovery: asyncio.Task | None = None
+        self.__print_service: AsyncPrinterService | None = None
+        self.__board_name = board
+        self.__board_slots = board_slots
+        self.__board: StatusBoard | None = None
+        self.__serials: Dict[str, str] = {}
+        # a long running daemon is where degrading printers show up, it always keeps stats
+        self.__instruments = instrumentation.enable()
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    def __claim_socket(self):
+        if not os.path.exists(self.__path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.__path)
+        except OSError:
+            os.unlink(self.__path)
+            return
+        finally:
+            probe.close()
+        raise DaemonError(f"Another daemon is listening on {self.__path}")
+
+    async def serve_forever(self):
+        self.__claim_socket()
+        if self.__board_name is not None:
+            try:
+                self.__board = StatusBoard(self.__board_name, self.__board_slots)
+            except FileExistsError as e:
+                raise DaemonError(str(e)) from e
+            self.__serials = {printer.ip_address: printer.serial for printer in DiscoveryCache().lookup()}
+        async with AsyncPrinterService([]) as print_service:
+            self.__print_service = print_service
+            server = await asyncio.start_unix_server(self.__serve_client, path=self.__path, limit=MAX_REQUEST_SIZE)
+            os.chmod(self.__path, 0o600)
+            try:
+                if self.__discover_all:
+                    await self.__discover()
+                    self.__rediscovery = asyncio.get_running_loop().create_task(self.__rediscover())
+                for address in self.__addresses:
+                    self.__watch(address)
+                async with server:
+                    await server.serve_forever()
+            finally:
+                for poller in self.__pollers.values():
+                    poller.cancel()
+                if self.__rediscovery is not None:
+                    self.__rediscovery.cancel()
+                try:
+                    os.unlink(self.__path)
+                except OSError:
+                    pass
+                if self.__board is not None:
+                    self.__board.close()
+                    self.__board = None
+
+    def __discover_printers(self) -> List[Printer]:
+        if self.__subnets:
+            return PrinterService.sweep_printers(self.__subnets, rate=self.__sweep_rate)
+        broadcast_addresses = NetworkUtils.get_all_ipv4_broadcast_addresses(self.__iface_include, self.__iface_exclude)
+        return PrinterService.discover_printers(broadcast_addresses=broadcast_addresses)
+
+    async def __discover(self) -> List[Printer]:
+        # concurrent clients share one discovery round
+        if self.__discovery is None:
+            self.__discovery = asyncio.get_running_loop().run_in_executor(None, self.__discover_printers)
+        discovery = self.__discovery
+        try:
+            printers = await discovery
+        finally:
+            if self.__discovery is discovery:
+                self.__discovery = None
+        DiscoveryCache().update(printers)
+        self.__printers = printers
+        self.__serials.update((printer.ip_address, printer.serial) for printer in printers)
+        self.__discovered_at = time.monotonic()
+        if self.__discover_all:
+            for printer in printers:
+                self.__watch(printer.ip_address)
+        return printers
+
+    async def __rediscover(self):
+        while True:
+            await asyncio.sleep(self.__discovery_interval)
+            try:
+                await self.__discover()
+            except OSError as e:
+                print(f"Discovery failed: {e}", file=sys.stderr)
+
+    async def __printers_fresh(self) -> List[Printer]:
+        if self.__discovered_at is None or time.monotonic() - self.__discovered_at > self.__discovery_interval:
+            await self.__discover()
+        return self.__printers
+
+    def __watch(self, address: str) -> asyncio.Event:
+        if address not in self.__pollers:
+            if address not in self.__addresses:
+                self.__addresses.append(address)
+            self.__first_poll[address] = asyncio.Event()
+            self.__pollers[address] = asyncio.get_running_loop().create_task(self.__poll(address))
+        return self.__first_poll[address]
+
+    def __ask_serial(self, address: str) -> str | None:
+        with Connection(address) as connection:
+            printer = PrinterService(connection).get_printer_info()
+        return printer.serial if printer is not None else None
+
+    async def __poll(self, address: str):
+        scheduler = self.__scheduler
+        scheduler.add(address)
+        if self.__board is not None and address not in self.__serials:
+            # printers watched by address are asked for their serial once, the board is keyed by it
+            serial = await asyncio.get_running_loop().run_in_executor(None, self.__ask_serial, address)
+            if serial is not None:
+                self.__serials[address] = serial
+        while True:
+            info = await self.__print_service.get_printing_info(address)
+            self.__states[address] = info
+            self.__estimator.update(address, info)
+            if self.__board is not None:
+                self.__board.publish(self.__serials.get(address, address), address, info, time.time())
+            self.__first_poll[address].set()
+            scheduler.schedule(address, info)
+            await asyncio.sleep(max(0.0, scheduler.deadline(address) - time.monotonic()))
+
+    async def __resolve(self, address: str | None, serial: str | None) -> str | None:
+        if address:
+            return address
+        printers = await self.__printers_fresh()
+        for printer in printers:
+            if serial is None or printer.serial == serial:
+                return printer.ip_address
+        return None
+
+    async def __show(self, request: dict) -> dict:
+        addresses = request.get("addresses")
+        if request.get("all"):
+            addresses = [printer.ip_address for printer in await self.__printers_fresh()]
+        elif not addresses:
+            address = await self.__resolve(None, request.get("serial"))
+            addresses = [address] if address is not None else []
+        first_polls = [self.__watch(address) for address in addresses]
+        await asyncio.gather(*(first_poll.wait() for first_poll in first_polls))
+        return {
+            "states": {address: encode_state(self.__states.get(address)) for address in addresses},
+            "estimates": {address: encode_estimate(self.__estimator.estimate(address)) for address in addresses},
+        }
+
+    async def __beep(self, request: dict) -> dict:
+        address = await self.__resolve(request.get("address"), request.get("serial"))
+        if address is None:
+            return {"ok": False}
+
+        def beep():
+            with Connection(address) as connection:
+                service = PrinterService(connection)
+                if request.get("enable"):
+                    service.beep_on()
+                else:
+                    service.beep_off()
+
+        await asyncio.get_running_loop().run_in_executor(None, beep)
+        return {"ok": True}
+
+    async def __handle(self, request: dict) -> dict:
+        op = request.get("op")
+        if op == "ping":
+            return {"addresses": self.__addresses}
+        if op == "show":
+            return await self.__show(request)
+        if op == "discover":
+            return {"printers": [encode_printer(printer) for printer in await self.__printers_fresh()]}
+        if op == "beep":
+            return await self.__beep(request)
+        if op == "stats":
+            return {"stats": self.__instruments.to_dict()}
+        return {"error": f"Unknown request {op}"}
+
+    async def __serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = await self.__handle(json.loads(line))
+                except (ValueError, TypeError, KeyError) as e:
+                    reply = {"error": f"Bad request: {e}"}
+                writer.write(json.dumps(reply).encode("utf-8") + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            print(f"Daemon request failed: {e}", file=sys.stderr)
+        finally:
+            writer.close()
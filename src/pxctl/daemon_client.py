@@ -0,0 +1,156 @@
+import json
+import os
+import socket
+from dataclasses import asdict
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+from .enums import NetPrinterState, PrinterType
+from .structs import Estimate, Printer, PrinterState
+
+if TYPE_CHECKING:
+    from .instrumentation import Instruments
+
+CLIENT_TIMEOUT = 2.0
+
+
+def default_socket_path() -> str:
+    if os.environ.get("PXCTL_SOCKET"):
+        return os.environ["PXCTL_SOCKET"]
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or os.environ.get("TMPDIR") or "/tmp"
+    return os.path.join(runtime_dir, f"pxctl-{os.getuid()}.sock")
+
+
+def encode_state(info: PrinterState | None) -> dict | None:
+    if info is None:
+        return None
+    fields = asdict(info)
+    fields["state"] = info.state.name
+    return fields
+
+
+def decode_state(fields: dict | None) -> PrinterState | None:
+    if fields is None:
+        return None
+    fields = dict(fields)
+    fields["state"] = NetPrinterState[fields["state"]]
+    return PrinterState(**fields)
+
+
+def encode_estimate(estimate: Estimate | None) -> dict | None:
+    return asdict(estimate) if estimate is not None else None
+
+
+def decode_estimate(fields: dict | None) -> Estimate | None:
+    return Estimate(**fields) if fields is not None else None
+
+
+def encode_printer(printer: Printer) -> dict:
+    fields = asdict(printer)
+    fields["printer_type"] = printer.printer_type.name
+    return fields
+
+
+def decode_printer(fields: dict) -> Printer:
+    fields = dict(fields)
+    fields["printer_type"] = PrinterType[fields["printer_type"]]
+    return Printer(**fields)
+
+
+class DaemonError(Exception):
+    pass
+
+
+class DaemonClient:
+    """Talks to a running daemon, one JSON request and reply per line."""
+
+    def __init__(self, path: str | None = None, timeout: float = CLIENT_TIMEOUT):
+        self.__path = path or default_socket_path()
+        self.__timeout = timeout
+
+    def request(self, op: str, **params) -> dict | None:
+        """Sends a request to the daemon
+
+        Args:
+            op (str): show, discover, beep or ping
+            **params: parameters of the request
+
+        Returns:
+            dict | None: the reply, None if no daemon is running
+        """
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        except (AttributeError, OSError):
+            return None
+        with sock:
+            sock.settimeout(self.__timeout)
+            try:
+                sock.connect(self.__path)
+            except OSError:
+                return None
+            try:
+                sock.sendall(json.dumps({"op": op, **params}).encode("utf-8") + b"\n")
+                with sock.makefile("rb") as f:
+                    line = f.readline()
+            except OSError as e:
+                raise DaemonError(f"Daemon at {self.__path} failed: {e}") from e
+        if not line:
+            raise DaemonError(f"Daemon at {self.__path} closed the connection")
+        try:
+            reply = json.loads(line)
+        except ValueError as e:
+            raise DaemonError(f"Daemon at {self.__path} sent a malformed reply: {e}") from e
+        if not isinstance(reply, dict):
+            raise DaemonError(f"Daemon at {self.__path} sent a malformed reply")
+        if "error" in reply:
+            raise DaemonError(reply["error"])
+        return reply
+
+    def show(
+        self,
+        addresses: List[str] | None = None,
+        serial: str | None = None,
+        all: bool = False,
+    ) -> Dict[str, PrinterState | None] | None:
+        result = self.show_with_estimates(addresses, serial, all)
+        if result is None:
+            return None
+        return result[0]
+
+    def show_with_estimates(
+        self,
+        addresses: List[str] | None = None,
+        serial: str | None = None,
+        all: bool = False,
+    ) -> Tuple[Dict[str, PrinterState | None], Dict[str, Estimate | None]] | None:
+        """Gets the last polled states of printers and the ETAs of their tasks
+
+        Returns:
+            Tuple[Dict[str, PrinterState | None], Dict[str, Estimate | None]] | None: states and
+                estimates per address, None if no daemon is running
+        """
+        reply = self.request("show", addresses=addresses, serial=serial, all=all)
+        if reply is None:
+            return None
+        states = {address: decode_state(fields) for address, fields in reply["states"].items()}
+        estimates = {address: decode_estimate(fields) for address, fields in reply.get("estimates", {}).items()}
+        return states, estimates
+
+    def discover(self) -> List[Printer] | None:
+        reply = self.request("discover")
+        if reply is None:
+            return None
+        return [decode_printer(fields) for fields in reply["printers"]]
+
+    def beep(self, address: str | None, enable: bool, serial: str | None = None) -> bool | None:
+        reply = self.request("beep", address=address, serial=serial, enable=enable)
+        if reply is None:
+            return None
+        return reply["ok"]
+
+    def stats(self) -> "Instruments | None":
+        from .instrumentation import Instruments
+
+        reply = self.request("stats")
+        if reply is None:
+            return None
+        return Instruments.from_dict(reply["stats"])
@@ -0,0 +1,112 @@
+import json
+import os
+import sys
+import time
+from dataclasses import asdict
+from typing import Dict, List
+
+from .connection import Connection
+from .enums import PrinterType
+from .printer_service import PrinterService
+from .structs import Printer
+
+
+def default_cache_dir() -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "pxctl")
+
+
+class DiscoveryCache:
+    """Persistent serial -> Printer records of previously discovered printers.
+
+    Records older than the ttl are ignored, fresh ones are still validated by
+    a single unicast info probe before they are trusted.
+    """
+
+    def __init__(self, path: str | None = None, ttl: float = 24 * 60 * 60):
+        self.__path = path or os.path.join(default_cache_dir(), "printers.json")
+        self.__ttl = ttl
+        self.__records: Dict[str, dict] | None = None
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    def __load(self) -> Dict[str, dict]:
+        if self.__records is None:
+            try:
+                with open(self.__path, "r") as f:
+                    self.__records = json.load(f)
+            except (OSError, ValueError):
+                self.__records = {}
+        return self.__records
+
+    def __save(self):
+        try:
+            os.makedirs(os.path.dirname(self.__path), exist_ok=True)
+            tmp_path = f"{self.__path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.__records, f)
+            os.replace(tmp_path, self.__path)
+        except OSError as e:
+            print(f"Can't write discovery cache {self.__path}: {e}", file=sys.stderr)
+
+    def lookup(self, serial: str | None = None) -> List[Printer]:
+        """Gets fresh cached printers, most recently seen first
+
+        Args:
+            serial (str | None): only return the printer with this serial
+
+        Returns:
+            List[Printer]: cached printers
+        """
+        now = time.time()
+        records = [
+            record
+            for record in self.__load().values()
+            if now - record.get("seen_at", 0) <= self.__ttl
+            and (serial is None or record["printer"]["serial"] == serial)
+        ]
+        records.sort(key=lambda record: record["seen_at"], reverse=True)
+        printers = []
+        for record in records:
+            fields = dict(record["printer"])
+            try:
+                fields["printer_type"] = PrinterType[fields["printer_type"]]
+                printers.append(Printer(**fields))
+            except (KeyError, TypeError):
+                continue
+        return printers
+
+    def update(self, printers: List[Printer]):
+        if not printers:
+            return
+        records = self.__load()
+        now = time.time()
+        for printer in printers:
+            fields = asdict(printer)
+            fields["printer_type"] = printer.printer_type.name
+            records[printer.serial] = {"seen_at": now, "printer": fields}
+        self.__save()
+
+    def forget(self, serial: str):
+        if self.__load().pop(serial, None) is not None:
+            self.__save()
+
+    def find(self, serial: str | None = None) -> Printer | None:
+        """Gets a cached printer which still answers at its cached address
+
+        Args:
+            serial (str | None): the serial of the wanted printer, any printer if omitted
+
+        Returns:
+            Printer | None: the validated printer, None on cache miss
+        """
+        for cached in self.lookup(serial):
+            with Connection(cached.ip_address, retries=0) as connection:
+                printer = PrinterService(connection).get_printer_info()
+            if printer is not None and printer.serial == cached.serial:
+                self.update([printer])
+                return printer
+            self.forget(cached.serial)
+        return None
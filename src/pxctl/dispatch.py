@@ -0,0 +1,156 @@
+import mmap
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List
+
+from . import experimental
+from .connection import Connection
+from .printer_service import PRINTER_PORT, PrinterService
+from .upload import DEFAULT_CHUNK_SIZE, DEFAULT_WINDOW, BandwidthLimiter, Uploader, UploadError, UploadProgress
+
+DEFAULT_PARALLEL = 8
+
+
+@dataclass
+class DispatchResult:
+    address: str
+    progress: UploadProgress | None = None
+    started: bool = False
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class BatchProgress:
+    """Aggregate state of an upload to several printers"""
+    total: int
+    acked: int = 0
+    completed: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def percents(self) -> float:
+        return 100.0 * self.acked / self.total if self.total else 100.0
+
+    @property
+    def throughput(self) -> float:
+        return self.acked / self.elapsed if self.elapsed else 0.0
+
+
+class BatchUploader:
+    """Uploads one file to several printers at once and optionally starts it.
+
+    Uploading and starting are experimental, see pxctl.experimental.
+
+    The file is mapped once and every upload sends its chunks from the same
+    mapping. At most parallel printers are served at a time, each of them
+    with its own window of in-flight chunks, and all of them share one
+    bandwidth limit so a production run doesn't saturate the network.
+    """
+
+    def __init__(
+        self,
+        addresses: Iterable[str],
+        port: int = PRINTER_PORT,
+        parallel: int = DEFAULT_PARALLEL,
+        bandwidth: float | None = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        window: int = DEFAULT_WINDOW,
+    ):
+        # a printer listed twice would only race against itself
+        self.__addresses: List[str] = list(dict.fromkeys(addresses))
+        self.__port = port
+        self.__parallel = max(1, parallel)
+        self.__limiter = BandwidthLimiter(bandwidth) if bandwidth else None
+        self.__chunk_size = chunk_size
+        self.__window = window
+        self.__lock = threading.Lock()
+
+    def upload(
+        self,
+        path: str,
+        name: str | None = None,
+        printlist: str = "",
+        start: bool = False,
+        progress: Callable[[str, UploadProgress, BatchProgress], None] | None = None,
+        done: Callable[[DispatchResult, BatchProgress], None] | None = None,
+    ) -> Dict[str, DispatchResult]:
+        """Uploads a file to every printer
+
+        Args:
+            path (str): the file to upload
+            name (str | None): the task name on the printers, the file name if omitted
+            printlist (str): the print list to put the task into
+            start (bool): start printing the task once it is uploaded
+            progress (Callable[[str, UploadProgress, BatchProgress], None] | None): called periodically with
+                the address, the state of its upload and the aggregate state, from the worker threads
+            done (Callable[[DispatchResult, BatchProgress], None] | None): called once a printer is done
+
+        Returns:
+            Dict[str, DispatchResult]: the result of each printer by address
+
+        Raises:
+            ExperimentalCommandError: if experimental commands aren't enabled
+        """
+        # refused before any printer is contacted rather than once per printer
+        experimental.require("task start" if start else "upload")
+        name = name or os.path.basename(path)
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        try:
+            crc = zlib.crc32(data)
+            batch = BatchProgress(total=size * len(self.__addresses))
+            acked = {address: 0 for address in self.__addresses}
+            started_at = time.monotonic()
+
+            def report(address: str, state: UploadProgress):
+                with self.__lock:
+                    batch.acked += state.acked - acked[address]
+                    acked[address] = state.acked
+                    batch.elapsed = time.monotonic() - started_at
+                    if progress is not None:
+                        progress(address, state, batch)
+
+            def dispatch(address: str) -> DispatchResult:
+                result = self.__dispatch(address, data, crc, name, printlist, start, report)
+                with self.__lock:
+                    if result.ok:
+                        batch.completed += 1
+                    else:
+                        batch.failed += 1
+                    batch.elapsed = time.monotonic() - started_at
+                    if done is not None:
+                        done(result, batch)
+                return result
+
+            with ThreadPoolExecutor(max_workers=self.__parallel, thread_name_prefix="pxctl-upload") as executor:
+                results = list(executor.map(dispatch, self.__addresses))
+        finally:
+            if size:
+                data.close()
+        return {result.address: result for result in results}
+
+    def __dispatch(self, address, data, crc, name, printlist, start, report) -> DispatchResult:
+        result = DispatchResult(address)
+        try:
+            with Connection(address, self.__port) as connection:
+                uploader = Uploader(connection, self.__chunk_size, self.__window, limiter=self.__limiter)
+                result.progress = uploader.upload_data(
+                    data, name, printlist, lambda state: report(address, state), crc
+                )
+                if start:
+                    result.started = PrinterService(connection).start_task(name, printlist)
+                    if not result.started:
+                        result.error = f"Printer didn't start {name}"
+        except (OSError, UploadError) as e:
+            result.error = str(e) or type(e).__name__
+        return result
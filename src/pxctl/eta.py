@@ -0,0 +1,98 @@
+import math
+import time
+from typing import Dict, Hashable
+
+from .enums import NetPrinterState
+from .structs import Estimate, PrinterState
+
+DEFAULT_TIME_CONSTANT = 60.0
+
+
+class _TaskProgress:
+    __slots__ = ("task", "progress", "changed_at", "seen_at", "stepped", "rate")
+
+    def __init__(self, task: str, progress: float, timestamp: float):
+        self.task = task
+        self.progress = progress
+        # when progress last changed, or when the task was first seen
+        self.changed_at = timestamp
+        self.seen_at = timestamp
+        self.stepped = False
+        self.rate: float | None = None
+
+
+class EtaEstimator:
+    """Smoothed progress rate and time to completion of the task of every printer.
+
+    Progress is reported in coarse steps, so the rate is only measured when
+    it changes: the step over the time since the previous change, averaged
+    exponentially and weighted by that time. Polls between two steps don't
+    pull the rate down, they only count down the ETA. The first change seen
+    may end a step that started before the task was watched, the rate is
+    known from the second one. Only the last step and the rate of every
+    printer are kept. A new task, progress going backwards or leaving the
+    printing state, e.g. a pause, starts the estimate over.
+    """
+
+    def __init__(self, time_constant: float = DEFAULT_TIME_CONSTANT):
+        self.__time_constant = time_constant
+        self.__tasks: Dict[Hashable, _TaskProgress] = {}
+
+    def update(self, key: Hashable, info: PrinterState | None, timestamp: float | None = None) -> Estimate | None:
+        """Feeds a polled state of a printer
+
+        Args:
+            key (Hashable): the printer, e.g. its address
+            info (PrinterState | None): the polled state, None if the printer didn't respond
+            timestamp (float | None): monotonic time of the poll, now if omitted
+
+        Returns:
+            Estimate | None: the estimate of the running task, None until there is one
+        """
+        if info is None:
+            # a missed poll doesn't tell anything about the task
+            return self.estimate(key)
+        if info.state != NetPrinterState.npstPrinting:
+            self.__tasks.pop(key, None)
+            return None
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        task = self.__tasks.get(key)
+        progress = info.progress_percents
+        if task is None or task.task != info.current_task_file or progress < task.progress:
+            self.__tasks[key] = _TaskProgress(info.current_task_file, progress, timestamp)
+            return None
+
+        if timestamp > task.seen_at:
+            task.seen_at = timestamp
+        if progress == task.progress:
+            return self.estimate(key)
+
+        elapsed = timestamp - task.changed_at
+        if task.stepped and elapsed > 0:
+            sample = (progress - task.progress) / elapsed
+            if task.rate is None:
+                task.rate = sample
+            else:
+                weight = 1.0 - math.exp(-elapsed / self.__time_constant)
+                task.rate += weight * (sample - task.rate)
+        task.stepped = True
+        task.progress = progress
+        task.changed_at = timestamp
+        return self.estimate(key)
+
+    def estimate(self, key: Hashable) -> Estimate | None:
+        task = self.__tasks.get(key)
+        if task is None or task.rate is None:
+            return None
+        if task.progress >= 100.0:
+            return Estimate(task.rate, 0.0)
+        if task.rate <= 0:
+            return Estimate(task.rate, None)
+        # the time spent on the current step so far is already behind
+        eta_seconds = max(0.0, (100.0 - task.progress) / task.rate - (task.seen_at - task.changed_at))
+        return Estimate(task.rate, eta_seconds)
+
+    def forget(self, key: Hashable):
+        self.__tasks.pop(key, None)
@@ -0,0 +1,34 @@
+# Uploading, starting tasks and managing print lists (codes 0x20 to 0x28) use
+# the framing of the status protocol, but their layouts are not documented for
+# the Picaso firmware and only the simulator in tools/simulator answers them.
+# They refuse to run until enabled, so an unknown opcode is never sent to a
+# production printer by accident.
+
+
+class ExperimentalCommandError(RuntimeError):
+    pass
+
+
+_enabled = False
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def require(command: str):
+    if not _enabled:
+        raise ExperimentalCommandError(
+            f"{command} is experimental and only answered by the simulator, "
+            f"enable it with pxctl.experimental.enable() or --experimental"
+        )
@@ -0,0 +1,187 @@
+import asyncio
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+from .async_printer_service import AsyncPrinterService
+from .enums import NetPrinterState
+from .structs import PrinterState
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+@dataclass
+class PrinterMetrics:
+    state: PrinterState | None = None
+    latency: float = 0.0
+    polls: int = 0
+    timeouts: int = 0
+    last_success: float = 0.0
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def render(metrics: Dict[str, PrinterMetrics]) -> bytes:
+    """Renders the printer metrics in OpenMetrics text format
+
+    Args:
+        metrics (Dict[str, PrinterMetrics]): metrics per printer address
+
+    Returns:
+        bytes: exposition ready to be served
+    """
+    families: List[Tuple[str, str, str, List[str]]] = [
+        ("pxctl_up", "gauge", "Whether the printer answered the last poll.", []),
+        ("pxctl_state", "stateset", "Printer state.", []),
+        ("pxctl_task", "info", "Current task of the printer.", []),
+        ("pxctl_temperature_celsius", "gauge", "Extruder and table temperatures.", []),
+        ("pxctl_progress_percent", "gauge", "Progress of the current task.", []),
+        ("pxctl_ready", "gauge", "Whether the printer is ready to print.", []),
+        ("pxctl_printing", "gauge", "Whether the printer is printing.", []),
+        ("pxctl_poll_latency_seconds", "gauge", "Round trip time of the last successful poll.", []),
+        ("pxctl_last_success_timestamp_seconds", "gauge", "Time of the last successful poll.", []),
+        ("pxctl_polls", "counter", "Status polls sent to the printer.", []),
+        ("pxctl_poll_timeouts", "counter", "Status polls the printer didn't answer.", []),
+    ]
+    samples = {name: lines for name, _, _, lines in families}
+
+    for address, printer in metrics.items():
+        labels = f'address="{_escape(address)}"'
+        info = printer.state
+        samples["pxctl_up"].append(f"pxctl_up{{{labels}}} {int(info is not None)}")
+        samples["pxctl_polls"].append(f"pxctl_polls_total{{{labels}}} {printer.polls}")
+        samples["pxctl_poll_timeouts"].append(f"pxctl_poll_timeouts_total{{{labels}}} {printer.timeouts}")
+        if printer.last_success:
+            samples["pxctl_last_success_timestamp_seconds"].append(
+                f"pxctl_last_success_timestamp_seconds{{{labels}}} {printer.last_success:.3f}"
+            )
+        if info is None:
+            continue
+
+        for state in NetPrinterState:
+            samples["pxctl_state"].append(
+                f'pxctl_state{{{labels},pxctl_state="{state.name}"}} {int(info.state == state)}'
+            )
+        samples["pxctl_task"].append(
+            f'pxctl_task_info{{{labels},task="{_escape(info.current_task_file)}"}} 1'
+        )
+        for sensor, value in (
+            ("left", info.left_extruder_temperature),
+            ("right", info.right_extruder_temperature),
+            ("table", info.table_temperature),
+        ):
+            samples["pxctl_temperature_celsius"].append(
+                f'pxctl_temperature_celsius{{{labels},sensor="{sensor}"}} {value:.2f}'
+            )
+        samples["pxctl_progress_percent"].append(f"pxctl_progress_percent{{{labels}}} {info.progress_percents:.2f}")
+        samples["pxctl_ready"].append(f"pxctl_ready{{{labels}}} {int(info.is_ready)}")
+        samples["pxctl_printing"].append(f"pxctl_printing{{{labels}}} {int(info.is_printing)}")
+        samples["pxctl_poll_latency_seconds"].append(f"pxctl_poll_latency_seconds{{{labels}}} {printer.latency:.6f}")
+
+    lines = []
+    for name, metric_type, help_text, family_samples in families:
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.append(f"# HELP {name} {help_text}")
+        lines.extend(family_samples)
+    lines.append("# EOF")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class MetricsExporter:
+    """Polls printers in the background and serves their cached state.
+
+    Scrapes only return the exposition rendered after the last poll round,
+    they never cause a request to a printer.
+    """
+
+    def __init__(self, addresses: List[str], interval: float = 0.6, port: int = 54321, timeout: float = 0.3):
+        self.__addresses = list(addresses)
+        self.__interval = interval
+        self.__port = port
+        self.__timeout = timeout
+        self.__metrics: Dict[str, PrinterMetrics] = {address: PrinterMetrics() for address in self.__addresses}
+        self.__payload = render(self.__metrics)
+        self.__stop = threading.Event()
+        self.__poller: threading.Thread | None = None
+        self.__server: ThreadingHTTPServer | None = None
+        self.__serving = False
+
+    @property
+    def payload(self) -> bytes:
+        return self.__payload
+
+    @property
+    def server_address(self) -> Tuple[str, int]:
+        return self.__server.server_address[:2]
+
+    async def __poll(self, print_service: AsyncPrinterService, address: str):
+        started_at = time.monotonic()
+        info = await print_service.get_printing_info(address)
+        printer = self.__metrics[address]
+        printer.polls += 1
+        printer.state = info
+        if info is None:
+            printer.timeouts += 1
+        else:
+            printer.latency = time.monotonic() - started_at
+            printer.last_success = time.time()
+
+    async def __poll_forever(self):
+        async with AsyncPrinterService(self.__addresses, self.__port, self.__timeout) as print_service:
+            next_round = time.monotonic()
+            while not self.__stop.is_set():
+                await asyncio.gather(*(self.__poll(print_service, address) for address in self.__addresses))
+                # swapping the reference is atomic, scrapers never see a half rendered payload
+                self.__payload = render(self.__metrics)
+                next_round = max(next_round + self.__interval, time.monotonic())
+                await asyncio.sleep(max(0.0, next_round - time.monotonic()))
+
+    def __run_poller(self):
+        try:
+            asyncio.run(self.__poll_forever())
+        except Exception as e:
+            print(f"Exporter poller stopped: {e}", file=sys.stderr)
+
+    def start(self, host: str = "", port: int = 9110):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                payload = exporter.payload
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.__server = ThreadingHTTPServer((host, port), Handler)
+        self.__server.daemon_threads = True
+        self.__poller = threading.Thread(target=self.__run_poller, name="pxctl-exporter-poller", daemon=True)
+        self.__poller.start()
+
+    def serve_forever(self):
+        self.__serving = True
+        try:
+            self.__server.serve_forever()
+        finally:
+            self.__serving = False
+
+    def stop(self):
+        self.__stop.set()
+        if self.__server is not None:
+            if self.__serving:
+                self.__server.shutdown()
+            self.__server.server_close()
+        if self.__poller is not None:
+            self.__poller.join()
@@ -0,0 +1,303 @@
+import json
+import mmap
+import os
+import re
+import time
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Tuple
+
+from .enums import NetPrinterState
+from .structs import PrinterState
+
+# Samples are stored column by column, one file per column, native byte order.
+# Timestamps are milliseconds since the previous sample, every CHECKPOINT_EVERY
+# samples the absolute time is kept in a separate index so a query only has to
+# sum the deltas of a single block.
+CHECKPOINT_EVERY = 4096
+MAX_DELTA_MS = 2 ** 32 - 1
+FLUSH_EVERY = 64
+
+COLUMNS: Dict[str, str] = {
+    "dt": "I",
+    "state": "B",
+    "progress": "f",
+    "left": "f",
+    "right": "f",
+    "table": "f",
+}
+CHECKPOINTS = "checkpoints"
+TASKS = "tasks.jsonl"
+
+
+def default_history_dir() -> str:
+    data_home = os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share")
+    return os.path.join(data_home, "pxctl", "history")
+
+
+def printer_dir(root: str, printer: str) -> str:
+    return os.path.join(root, re.sub(r"[^A-Za-z0-9_.-]", "_", printer))
+
+
+def parse_since(value: str, now: float | None = None) -> float:
+    """Parses a point in time given as a duration ago or as an ISO date
+
+    Args:
+        value (str): e.g. '90s', '30m', '12h', '7d' or '2024-05-01T20:00'
+        now (float | None): reference time, current time if omitted
+
+    Returns:
+        float: unix timestamp
+    """
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([smhd])", value.strip())
+    if match:
+        seconds = float(match.group(1)) * {"s": 1, "m": 60, "h": 3600, "d": 86400}[match.group(2)]
+        return (time.time() if now is None else now) - seconds
+    from datetime import datetime
+    return datetime.fromisoformat(value).timestamp()
+
+
+@dataclass
+class HistorySample:
+    timestamp: float
+    state: NetPrinterState
+    progress_percents: float
+    left_extruder_temperature: float
+    right_extruder_temperature: float
+    table_temperature: float
+    task: str
+
+
+class HistoryWriter:
+    """Appends polled samples of one printer to its columnar history."""
+
+    def __init__(self, directory: str):
+        self.__directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.__count, self.__checkpoint, self.__last_task = self.__repair()
+        # milliseconds summed since the checkpoint, as readers sum them
+        self.__since_checkpoint_ms = 0
+        self.__pending = {name: array(typecode) for name, typecode in COLUMNS.items()}
+        self.__pending_checkpoints = array("d")
+        self.__pending_tasks: List[dict] = []
+
+    def __path(self, name: str) -> str:
+        return os.path.join(self.__directory, name)
+
+    def __repair(self) -> Tuple[int, float, str | None]:
+        # columns of an interrupted flush are cut to the length of the shortest one
+        sizes = {}
+        for name, typecode in COLUMNS.items():
+            try:
+                sizes[name] = os.path.getsize(self.__path(name)) // array(typecode).itemsize
+            except OSError:
+                sizes[name] = 0
+        count = min(sizes.values())
+        for name, typecode in COLUMNS.items():
+            if sizes[name] != count:
+                with open(self.__path(name), "r+b") as f:
+                    f.truncate(count * array(typecode).itemsize)
+        checkpoints = count and (count - 1) // CHECKPOINT_EVERY + 1
+        if os.path.exists(self.__path(CHECKPOINTS)):
+            with open(self.__path(CHECKPOINTS), "r+b") as f:
+                f.truncate(checkpoints * array("d").itemsize)
+
+        tasks_path = self.__path(TASKS)
+        if os.path.exists(tasks_path):
+            with open(tasks_path, "r") as f:
+                lines = [line for line in f if line.strip()]
+            kept = [line for line in lines if json.loads(line)["start"] < count]
+            if len(kept) != len(lines):
+                with open(tasks_path, "w") as f:
+                    f.writelines(kept)
+
+        if count == 0:
+            return 0, 0.0, None
+        with HistoryReader(self.__directory) as reader:
+            return count, reader.timestamp(count - 1), reader.task_at(count - 1)
+
+    def append(self, timestamp: float, info: PrinterState):
+        index = self.__count + len(self.__pending["dt"])
+        if index % CHECKPOINT_EVERY == 0:
+            self.__pending_checkpoints.append(timestamp)
+        # the delta is taken from the time readers reconstruct, so rounding errors don't add up
+        last_timestamp = self.__checkpoint + self.__since_checkpoint_ms / 1000.0
+        delta = 0 if index == 0 else min(max(round((timestamp - last_timestamp) * 1000.0), 0), MAX_DELTA_MS)
+        self.__pending["dt"].append(delta)
+        self.__pending["state"].append(info.state.value)
+        self.__pending["progress"].append(info.progress_percents)
+        self.__pending["left"].append(info.left_extruder_temperature)
+        self.__pending["right"].append(info.right_extruder_temperature)
+        self.__pending["table"].append(info.table_temperature)
+        if info.current_task_file != self.__last_task:
+            self.__pending_tasks.append({"start": index, "name": info.current_task_file})
+            self.__last_task = info.current_task_file
+        if index % CHECKPOINT_EVERY == 0:
+            self.__checkpoint = timestamp
+            self.__since_checkpoint_ms = 0
+        else:
+            self.__since_checkpoint_ms += delta
+
+        if len(self.__pending["dt"]) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        pending = len(self.__pending["dt"])
+        if pending == 0:
+            return
+        if self.__pending_tasks:
+            with open(self.__path(TASKS), "a") as f:
+                for task in self.__pending_tasks:
+                    f.write(json.dumps(task) + "\n")
+            self.__pending_tasks.clear()
+        if self.__pending_checkpoints:
+            with open(self.__path(CHECKPOINTS), "ab") as f:
+                self.__pending_checkpoints.tofile(f)
+            self.__pending_checkpoints = array("d")
+        for name, typecode in COLUMNS.items():
+            with open(self.__path(name), "ab") as f:
+                self.__pending[name].tofile(f)
+            self.__pending[name] = array(typecode)
+        self.__count += pending
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class HistoryReader:
+    """Memory-mapped read access to the history of one printer."""
+
+    def __init__(self, directory: str):
+        self.__directory = directory
+        self.__maps: List[mmap.mmap] = []
+        self.__columns = {name: self.__map(name, typecode) for name, typecode in COLUMNS.items()}
+        self.__checkpoints = self.__map(CHECKPOINTS, "d")
+        self.__count = min(len(column) for column in self.__columns.values())
+        self.__tasks: List[dict] = []
+        try:
+            with open(os.path.join(directory, TASKS), "r") as f:
+                self.__tasks = [json.loads(line) for line in f if line.strip()]
+        except OSError:
+            pass
+        self.__task_starts = [task["start"] for task in self.__tasks]
+
+    def __map(self, name: str, typecode: str):
+        try:
+            with open(os.path.join(self.__directory, name), "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return array(typecode)
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError:
+            return array(typecode)
+        self.__maps.append(mapped)
+        view = memoryview(mapped)
+        itemsize = array(typecode).itemsize
+        return view[: len(view) // itemsize * itemsize].cast(typecode)
+
+    def close(self):
+        for column in list(self.__columns.values()) + [self.__checkpoints]:
+            if isinstance(column, memoryview):
+                column.release()
+        for mapped in self.__maps:
+            mapped.close()
+        self.__maps.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.__count
+
+    @property
+    def tasks(self) -> List[str]:
+        return list(dict.fromkeys(task["name"] for task in self.__tasks))
+
+    def timestamp(self, index: int) -> float:
+        block = index // CHECKPOINT_EVERY
+        dt = self.__columns["dt"]
+        return self.__checkpoints[block] + sum(dt[block * CHECKPOINT_EVERY + 1: index + 1]) / 1000.0
+
+    def task_at(self, index: int) -> str | None:
+        position = bisect_right(self.__task_starts, index) - 1
+        return self.__tasks[position]["name"] if position >= 0 else None
+
+    def index_at(self, timestamp: float) -> int:
+        """Gets the index of the first sample taken at or after timestamp"""
+        blocks = min(len(self.__checkpoints), (self.__count - 1) // CHECKPOINT_EVERY + 1) if self.__count else 0
+        block = max(0, bisect_right(self.__checkpoints[:blocks], timestamp) - 1)
+        index = block * CHECKPOINT_EVERY
+        if index >= self.__count:
+            return self.__count
+        checkpoint = self.__checkpoints[block]
+        elapsed_ms = 0
+        dt = self.__columns["dt"]
+        while index < self.__count and checkpoint + elapsed_ms / 1000.0 < timestamp:
+            index += 1
+            if index < self.__count:
+                elapsed_ms += dt[index]
+        return index
+
+    def task_ranges(self, name: str) -> List[Tuple[int, int]]:
+        ranges = []
+        for position, task in enumerate(self.__tasks):
+            if task["name"] != name:
+                continue
+            end = self.__tasks[position + 1]["start"] if position + 1 < len(self.__tasks) else self.__count
+            ranges.append((task["start"], min(end, self.__count)))
+        return ranges
+
+    def samples(self, start: int = 0, end: int | None = None, step: int = 1) -> Iterator[HistorySample]:
+        end = self.__count if end is None else min(end, self.__count)
+        if start >= end:
+            return
+        columns = self.__columns
+        dt = columns["dt"]
+        # deltas are summed in milliseconds from the checkpoint, as the writer summed them
+        block = start // CHECKPOINT_EVERY
+        elapsed_ms = sum(dt[block * CHECKPOINT_EVERY + 1: start + 1])
+        task_position = bisect_right(self.__task_starts, start) - 1
+        previous = start
+        for index in range(start, end, step):
+            if index // CHECKPOINT_EVERY != block:
+                block = index // CHECKPOINT_EVERY
+                elapsed_ms = sum(dt[block * CHECKPOINT_EVERY + 1: index + 1])
+            elif index != previous:
+                elapsed_ms += sum(dt[previous + 1: index + 1])
+            previous = index
+            timestamp = self.__checkpoints[block] + elapsed_ms / 1000.0
+            while task_position + 1 < len(self.__tasks) and self.__task_starts[task_position + 1] <= index:
+                task_position += 1
+            yield HistorySample(
+                timestamp=timestamp,
+                state=NetPrinterState(columns["state"][index]),
+                progress_percents=columns["progress"][index],
+                left_extruder_temperature=columns["left"][index],
+                right_extruder_temperature=columns["right"][index],
+                table_temperature=columns["table"][index],
+                task=self.__tasks[task_position]["name"] if task_position >= 0 else "",
+            )
+
+    def query(
+        self,
+        since: float | None = None,
+        until: float | None = None,
+        task: str | None = None,
+        step: int = 1,
+    ) -> Iterator[HistorySample]:
+        start = 0 if since is None else self.index_at(since)
+        end = self.__count if until is None else self.index_at(until)
+        ranges = [(start, end)] if task is None else [
+            (max(start, task_start), min(end, task_end)) for task_start, task_end in self.task_ranges(task)
+        ]
+        for range_start, range_end in ranges:
+            yield from self.samples(range_start, range_end, step)
@@ -0,0 +1,234 @@
+import threading
+import time
+from dataclasses import dataclass, field, fields
+from typing import Callable, Dict, Hashable, List, Tuple
+
+# Durations are kept in microseconds in log-linear buckets, HDR histogram
+# style: values below SUB_BUCKETS get a bucket each, larger ones share a
+# bucket with the values of the same power of two and the same top
+# SUB_BUCKET_BITS bits, so a percentile is off by at most 1 / SUB_BUCKETS.
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+
+def bucket_index(value: int) -> int:
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return SUB_BUCKETS + shift * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+
+
+def bucket_value(index: int) -> int:
+    """Gets the middle of the values counted in a bucket"""
+    if index < SUB_BUCKETS:
+        return index
+    shift, sub = divmod(index - SUB_BUCKETS, SUB_BUCKETS)
+    return ((SUB_BUCKETS + sub) << shift) + ((1 << shift) >> 1)
+
+
+class Histogram:
+    """Latency histogram with bounded relative error and constant time record."""
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts: List[int] = []
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def record(self, seconds: float):
+        value = int(seconds * 1e6)
+        if value < 0:
+            value = 0
+        index = bucket_index(value)
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+        if self.count == 0 or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+
+    def percentile(self, percent: float) -> float:
+        """Gets the duration below which percent of the recorded ones fall
+
+        Args:
+            percent (float): 0 to 100
+
+        Returns:
+            float: seconds, 0 if nothing was recorded
+        """
+        if self.count == 0:
+            return 0.0
+        rank = max(1, round(self.count * percent / 100.0))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(max(bucket_value(index), self.min), self.max) / 1e6
+        return self.max / 1e6
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count / 1e6 if self.count else 0.0
+
+    def merge(self, other: "Histogram"):
+        if other.count == 0:
+            return
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.min = other.min if self.count == 0 else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_us": self.total,
+            "min_us": self.min,
+            "max_us": self.max,
+            "buckets": {str(index): count for index, count in enumerate(self.counts) if count},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Histogram":
+        histogram = cls()
+        histogram.count = data["count"]
+        histogram.total = data["total_us"]
+        histogram.min = data["min_us"]
+        histogram.max = data["max_us"]
+        buckets = {int(index): count for index, count in data["buckets"].items()}
+        histogram.counts = [buckets.get(index, 0) for index in range(max(buckets, default=-1) + 1)]
+        return histogram
+
+
+@dataclass
+class CommandStats:
+    sends: int = 0
+    replies: int = 0
+    retries: int = 0
+    timeouts: int = 0
+    stale_frames: int = 0
+    malformed_frames: int = 0
+    latency: Histogram = field(default_factory=Histogram)
+    decode: Histogram = field(default_factory=Histogram)
+
+    @property
+    def loss_percents(self) -> float:
+        return 100.0 * (self.sends - self.replies) / self.sends if self.sends else 0.0
+
+    def merge(self, other: "CommandStats"):
+        for f in fields(self):
+            value = getattr(self, f.name)
+            if isinstance(value, Histogram):
+                value.merge(getattr(other, f.name))
+            else:
+                setattr(self, f.name, value + getattr(other, f.name))
+
+    def to_dict(self) -> dict:
+        dto = {}
+        for f in fields(self):
+            value = getattr(self, f.name)
+            dto[f.name] = value.to_dict() if isinstance(value, Histogram) else value
+        return dto
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CommandStats":
+        return cls(**{
+            f.name: Histogram.from_dict(data[f.name]) if f.default_factory is Histogram else data[f.name]
+            for f in fields(cls)
+        })
+
+
+class Instruments:
+    """Counters and latency histograms of the protocol path per printer and command code.
+
+    Connections and printer services pick up the active instruments when
+    they are created, without any they only pay a None check per request.
+    """
+
+    def __init__(self):
+        self.__stats: Dict[Tuple[str, int], CommandStats] = {}
+        self.__lock = threading.Lock()
+        self.__started_at = time.time()
+
+    @property
+    def started_at(self) -> float:
+        return self.__started_at
+
+    def of(self, address: str, code: int) -> CommandStats:
+        stats = self.__stats.get((address, code))
+        if stats is None:
+            with self.__lock:
+                stats = self.__stats.setdefault((address, code), CommandStats())
+        return stats
+
+    def snapshot(self) -> Dict[Tuple[str, int], CommandStats]:
+        with self.__lock:
+            return dict(self.__stats)
+
+    def grouped(self, group: Callable[[str], Hashable | None]) -> Dict[Tuple[Hashable, int], CommandStats]:
+        """Merges the stats of printers by group, e.g. their subnet
+
+        Args:
+            group (Callable[[str], Hashable | None]): printer address -> group, None leaves the printer out
+
+        Returns:
+            Dict[Tuple[Hashable, int], CommandStats]: merged stats per group and command code
+        """
+        merged: Dict[Tuple[Hashable, int], CommandStats] = {}
+        for (address, code), stats in self.snapshot().items():
+            key = group(address)
+            if key is None:
+                continue
+            merged.setdefault((key, code), CommandStats()).merge(stats)
+        return merged
+
+    def merge(self, other: "Instruments"):
+        self.__started_at = min(self.__started_at, other.started_at)
+        for (address, code), stats in other.snapshot().items():
+            self.of(address, code).merge(stats)
+
+    def to_dict(self) -> dict:
+        return {
+            "started_at": self.__started_at,
+            "stats": [
+                {"address": address, "code": code, **stats.to_dict()}
+                for (address, code), stats in sorted(self.snapshot().items())
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Instruments":
+        instruments = cls()
+        instruments.__started_at = data["started_at"]
+        for entry in data["stats"]:
+            instruments.__stats[(entry["address"], entry["code"])] = CommandStats.from_dict(entry)
+        return instruments
+
+
+_active: Instruments | None = None
+
+
+def active() -> Instruments | None:
+    return _active
+
+
+def enable() -> Instruments:
+    global _active
+    if _active is None:
+        _active = Instruments()
+    return _active
+
+
+def disable():
+    global _active
+    _active = None
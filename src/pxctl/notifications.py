@@ -1,27 +1,233 @@
-import subprocess
+import json
+import os
+import signal
 import sys
+import threading
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Iterable, List, Tuple
 
-from .printer_service import PrinterState
+from .enums import NetPrinterState
+from .structs import Printer, PrinterState
 
+EVENT_CONNECTED = "connected"
+EVENT_DISCONNECTED = "disconnected"
+EVENT_STATE = "state"
+EVENT_TEMPERATURE = "temperature"
+EVENT_PROGRESS = "progress"
+EVENT_PRINT_DONE = "print_done"
+EVENT_ANOMALY = "anomaly"
+EVENT_KINDS = (
+    EVENT_CONNECTED,
+    EVENT_DISCONNECTED,
+    EVENT_STATE,
+    EVENT_TEMPERATURE,
+    EVENT_PROGRESS,
+    EVENT_PRINT_DONE,
+    EVENT_ANOMALY,
+)
 
-class Notifications:
-    def __init__(self, on_success_hook: str):
-        self.__notified_latch = False
-        self.__on_success_hook = on_success_hook
+TEMPERATURE_CHANNELS = {
+    "left": "left_extruder_temperature",
+    "right": "right_extruder_temperature",
+    "table": "table_temperature",
+}
 
-    def update_state(self, info: PrinterState | None = None):
-        if self.__notified_latch:
-            return
+DONE_PROGRESS = 99.0
+
+if TYPE_CHECKING:
+    from .anomaly import AnomalyDetector
+
+
+@dataclass
+class Event:
+    kind: str
+    address: str
+    info: PrinterState | None
+    detail: Dict[str, object] = field(default_factory=dict)
+
+
+@dataclass
+class Hook:
+    command: str
+    kinds: Tuple[str, ...] = EVENT_KINDS
+
+
+class EventEngine:
+    """Turns the polled states of printers into edge-triggered events.
+
+    An event is produced once when a condition starts to hold, e.g. when a
+    temperature crosses a threshold, and not on every poll while it holds.
+    """
+
+    def __init__(
+        self,
+        temperature_thresholds: Dict[str, Iterable[float]] | None = None,
+        progress_milestones: Iterable[float] = (25.0, 50.0, 75.0, 100.0),
+        anomaly_detector: "AnomalyDetector | None" = None,
+    ):
+        self.__temperature_thresholds = {
+            channel: sorted(thresholds) for channel, thresholds in (temperature_thresholds or {}).items()
+        }
+        self.__progress_milestones = sorted(progress_milestones)
+        self.__anomaly_detector = anomaly_detector
+        self.__previous: Dict[str, PrinterState | None] = {}
+
+    def set_printers(self, printers: Iterable[Printer]):
+        """Tells the anomaly detector which material profiles the printers use"""
+        if self.__anomaly_detector is not None:
+            for printer in printers:
+                self.__anomaly_detector.set_printer(printer)
+
+    def update(self, address: str, info: PrinterState | None, timestamp: float | None = None) -> List[Event]:
+        events = self.__state_events(address, info)
+        if self.__anomaly_detector is not None:
+            for anomaly in self.__anomaly_detector.update(address, info, timestamp):
+                events.append(Event(EVENT_ANOMALY, anomaly.address, self.__previous.get(anomaly.address), {
+                    "channel": anomaly.channel,
+                    "check": anomaly.check,
+                    "value": round(anomaly.value, 2),
+                    "expected": round(anomaly.expected, 2),
+                }))
+        return events
+
+    def __state_events(self, address: str, info: PrinterState | None) -> List[Event]:
+        known = address in self.__previous
+        previous = self.__previous.get(address)
+        self.__previous[address] = info
+
+        if info is None:
+            if known and previous is None:
+                return []
+            return [Event(EVENT_DISCONNECTED, address, None)]
+        if previous is None:
+            return [Event(EVENT_CONNECTED, address, info)]
+
+        events = []
+        if info.state != previous.state:
+            events.append(Event(EVENT_STATE, address, info, {"from": previous.state.name, "to": info.state.name}))
+            if (
+                previous.state == NetPrinterState.npstPrinting
+                and info.state == NetPrinterState.npstIdle
+                and max(previous.progress_percents, info.progress_percents) >= DONE_PROGRESS
+            ):
+                events.append(Event(EVENT_PRINT_DONE, address, info, {"task": previous.current_task_file}))
+
+        for channel, thresholds in self.__temperature_thresholds.items():
+            before = getattr(previous, TEMPERATURE_CHANNELS[channel])
+            after = getattr(info, TEMPERATURE_CHANNELS[channel])
+            for threshold in thresholds:
+                if before < threshold <= after:
+                    direction = "rising"
+                elif after < threshold <= before:
+                    direction = "falling"
+                else:
+                    continue
+                events.append(Event(EVENT_TEMPERATURE, address, info, {
+                    "channel": channel,
+                    "threshold": threshold,
+                    "direction": direction,
+                    "value": after,
+                }))
 
-        if info:
-            if info.state == "SUCCESS":
-                self.run_success()
-                self.__notified_latch = True
+        # a new task starts its milestones from scratch
+        before = previous.progress_percents if info.current_task_file == previous.current_task_file else 0.0
+        for milestone in self.__progress_milestones:
+            if before < milestone <= info.progress_percents:
+                events.append(Event(EVENT_PROGRESS, address, info, {"milestone": milestone}))
 
-    def run_success(self):
-        if self.__on_success_hook is not None:
+        return events
+
+
+class HookRunner:
+    """Runs hook commands on a bounded pool of workers.
+
+    For every hook, printer and event kind at most one run is queued: a newer
+    event replaces the queued one instead of piling up behind a slow hook.
+    Hooks running longer than the timeout are killed.
+    """
+
+    def __init__(self, workers: int = 4, timeout: float = 60.0):
+        # the CLI imports this module for its event names, the pool is only needed by hooks
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.__executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pxctl-hook")
+        self.__timeout = timeout
+        self.__lock = threading.Lock()
+        self.__queued: Dict[Tuple[str, str, str], Event] = {}
+        self.coalesced = 0
+
+    def submit(self, hook: Hook, event: Event):
+        key = (hook.command, event.address, event.kind)
+        with self.__lock:
+            if key in self.__queued:
+                self.__queued[key] = event
+                self.coalesced += 1
+                return
+            self.__queued[key] = event
+        self.__executor.submit(self.__run, hook, key)
+
+    def __run(self, hook: Hook, key: Tuple[str, str, str]):
+        import subprocess
+
+        with self.__lock:
+            event = self.__queued.pop(key)
+        try:
+            process = subprocess.Popen(hook.command, shell=True, env=self.__environment(event), start_new_session=True)
+        except Exception as e:
+            print(e, file=sys.stderr)
+            return
+        try:
+            process.wait(self.__timeout)
+        except subprocess.TimeoutExpired:
+            print(f"Hook '{hook.command}' timed out after {self.__timeout}s", file=sys.stderr)
             try:
-                subprocess.run(self.__on_success_hook, shell=True)
-            except Exception as e:
-                print(e, file=sys.stderr)
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+            process.wait()
+
+    @staticmethod
+    def __environment(event: Event) -> Dict[str, str]:
+        env = dict(os.environ)
+        env["PXCTL_EVENT"] = event.kind
+        env["PXCTL_ADDRESS"] = event.address
+        env["PXCTL_DETAIL"] = json.dumps(event.detail)
+        if event.info is not None:
+            env["PXCTL_STATE"] = event.info.state.name
+            env["PXCTL_TASK"] = event.info.current_task_file
+            env["PXCTL_PROGRESS"] = f"{event.info.progress_percents:.1f}"
+        return env
+
+    def close(self, wait: bool = True):
+        self.__executor.shutdown(wait=wait)
+
+
+class Notifications:
+    def __init__(
+        self,
+        on_success_hook: str | None = None,
+        hooks: Iterable[Hook] = (),
+        engine: EventEngine | None = None,
+        runner: HookRunner | None = None,
+    ):
+        self.__hooks = list(hooks)
+        if on_success_hook is not None:
+            self.__hooks.append(Hook(on_success_hook, (EVENT_PRINT_DONE,)))
+        self.__engine = engine or EventEngine()
+        self.__runner = runner or HookRunner()
+
+    def set_printers(self, printers: Iterable[Printer]):
+        self.__engine.set_printers(printers)
+
+    def update_state(
+        self, info: PrinterState | None = None, address: str = "", timestamp: float | None = None
+    ) -> List[Event]:
+        events = self.__engine.update(address, info, timestamp)
+        for event in events:
+            for hook in self.__hooks:
+                if event.kind in hook.kinds:
+                    self.__runner.submit(hook, event)
+        return events
 
+    def close(self, wait: bool = True):
+        self.__runner.close(wait)
@@ -1,122 +1,399 @@
+import ipaddress
 import select
 import socket
 import struct
 import sys
+import time
 from dataclasses import dataclass
-from typing import List, Tuple
+from typing import Container, Dict, Iterable, List, Tuple
 
-from .utils import NetworkUtils, MagicPicasoConverters
-from .enums import NetPrinterState, PrinterType
-from .connection import Connection
-from .structs import PrinterState, Printer
+from . import capture, codecs, experimental, instrumentation
+from .utils import NetworkUtils
+from .connection import Connection, command_code, RECV_BUFFER_SIZE
+from .structs import PrinterState, Printer, PrintList, Task
+
+STATUS_CMD = b"\x01\x00\x01\x00\x00\x00\x08\x00"
+PRINTER_INFO_CMD = b"\x01\x00\x0c\x00\x00\x00\x08\x00"
+BEEP_ON_CMD = b"\x01\x00\x0e\x00\x00\x00\x08\x00"
+BEEP_OFF_CMD = b"\x01\x00\x0f\x00\x00\x00\x08\x00"
+
+# Not part of the status protocol, follows the framing of the upload commands
+# and is experimental, see pxctl.experimental
+TASK_START_CODE = 0x23
+TASK_START = struct.Struct("<64s255s")
+TASK_STATUS = struct.Struct("<B")
+
+# Print lists and tasks are listed page by page, every print list carries a
+# generation bumped on each change of its tasks so a cached copy can be checked
+# without fetching the tasks again. Like the upload, these commands are
+# experimental, see pxctl.experimental
+PRINTLISTS_CODE = 0x24
+TASKS_CODE = 0x25
+PRINTLIST_CREATE_CODE = 0x26
+PRINTLIST_DELETE_CODE = 0x27
+TASK_DELETE_CODE = 0x28
+PAGE_OFFSET = struct.Struct("<H")
+PAGE_HEADER = struct.Struct("<HB")
+PRINTLIST_NAME = struct.Struct("<64s")
+PRINTLIST_ENTRY = struct.Struct("<64sHI")
+TASKS_REQUEST = struct.Struct("<64sH")
+TASK_ENTRY = struct.Struct("<Q255s")
+TASK_DELETE = TASK_START
+
+STATUS_SIZE = codecs.STATUS_FRAME.size
+PRINTER_INFO_SIZE = codecs.PRINTER_INFO_FRAME.size
+STATUS_CODE = command_code(STATUS_CMD)
+PRINTER_INFO_CODE = command_code(PRINTER_INFO_CMD)
+
+COMMAND_NAMES: Dict[int, str] = {
+    STATUS_CODE: "status",
+    PRINTER_INFO_CODE: "printer_info",
+    command_code(BEEP_ON_CMD): "beep_on",
+    command_code(BEEP_OFF_CMD): "beep_off",
+    # the upload codes of pxctl.upload
+    0x20: "upload_begin",
+    0x21: "upload_chunk",
+    0x22: "upload_end",
+    TASK_START_CODE: "task_start",
+    PRINTLISTS_CODE: "printlists",
+    TASKS_CODE: "tasks",
+    PRINTLIST_CREATE_CODE: "printlist_create",
+    PRINTLIST_DELETE_CODE: "printlist_delete",
+    TASK_DELETE_CODE: "task_delete",
+}
+
+PRINTER_PORT = 54321
+DISCOVERY_PORT = 49149
+DISCOVERY_PROBE = "PICASO3D".encode("ascii")
+DISCOVERY_PROBES = 3
+DISCOVERY_PROBE_INTERVAL = 0.3
+DEFAULT_SWEEP_RATE = 5000.0
+SWEEP_PASSES = 2
+MAX_PROBE_BURST = 256
+
+
+class _ProbeSchedule:
+    """Passes over the discovery targets, optionally paced to rate probes per second.
+
+    The targets of a pass are sent as time allows, a paced pass doesn't drift
+    since its budget is counted from the start of the pass. Passes are
+    separated by interval, targets in skip aren't probed again.
+    """
+
+    def __init__(self, targets: List[str], passes: int, interval: float, rate: float | None = None):
+        self.__targets = targets
+        self.__passes_left = passes if targets else 0
+        self.__interval = interval
+        self.__rate = rate
+        self.__position = 0
+        self.__pass_started_at = 0.0
+        self.__next_at = time.monotonic()
+
+    @property
+    def paced(self) -> bool:
+        return self.__rate is not None
+
+    @property
+    def send_duration(self) -> float:
+        """Time to send one pass"""
+        return len(self.__targets) / self.__rate if self.__rate else 0.0
+
+    def next_at(self) -> float | None:
+        return None if self.__passes_left == 0 else self.__next_at
+
+    def due(self, now: float, skip: Container[str]) -> Tuple[bool, List[str]]:
+        """Gets the targets to probe now
+
+        Args:
+            now (float): monotonic time
+            skip (Container[str]): targets which already answered
+
+        Returns:
+            Tuple[bool, List[str]]: whether a new pass started, and the targets
+        """
+        if self.__passes_left == 0 or now < self.__next_at:
+            return False, []
+        new_pass = self.__position == 0
+        if new_pass:
+            self.__pass_started_at = now
+
+        if self.__rate is None:
+            end = len(self.__targets)
+        else:
+            allowed = int((now - self.__pass_started_at) * self.__rate) + 1
+            end = min(len(self.__targets), max(allowed, self.__position + 1), self.__position + MAX_PROBE_BURST)
+        targets = [target for target in self.__targets[self.__position:end] if target not in skip]
+        self.__position = end
+
+        if self.__position >= len(self.__targets):
+            self.__position = 0
+            self.__passes_left -= 1
+            self.__next_at = now + self.__interval
+        else:
+            self.__next_at = self.__pass_started_at + self.__position / self.__rate
+        return new_pass, targets
 
 
 class PrinterService:
     def __init__(self, connection: Connection):
         self.__connection = connection
+        self.__buffer = bytearray(RECV_BUFFER_SIZE)
+        self.__status_decoder = codecs.StatusDecoder()
+        self.__instruments = instrumentation.active()
+        self.__capture = capture.active()
 
     def get_printing_info(self) -> PrinterState | None:
-        info_cmd = b"\x01\x00\x01\x00\x00\x00\x08\x00"
-        recv_format = "8xB7x?255sh1xf15xff4xff28x"
+        nbytes = self.__connection.request_into(STATUS_CMD, self.__buffer, STATUS_SIZE)
+        if self.__capture is not None:
+            self.__capture.write(self.__connection.address, memoryview(self.__buffer)[:nbytes])
+        if nbytes == 0:
+            return None
+        started_at = time.perf_counter()
+        try:
+            info = self.__status_decoder.decode(self.__buffer, nbytes)
+        except ValueError:
+            # e.g. a state byte this version doesn't know
+            if self.__instruments is not None:
+                self.__instruments.of(self.__connection.address, STATUS_CODE).malformed_frames += 1
+            return None
+        if self.__instruments is not None:
+            self.__instruments.of(self.__connection.address, STATUS_CODE).decode.record(
+                time.perf_counter() - started_at
+            )
+        return info
+
+    def get_printer_info(self) -> Printer | None:
+        nbytes = self.__connection.request_into(PRINTER_INFO_CMD, self.__buffer, PRINTER_INFO_SIZE)
+        if nbytes == 0:
+            return None
+        started_at = time.perf_counter()
+        try:
+            printer = codecs.decode_printer(self.__buffer, self.__connection.address, nbytes)
+        except ValueError:
+            if self.__instruments is not None:
+                self.__instruments.of(self.__connection.address, PRINTER_INFO_CODE).malformed_frames += 1
+            return None
+        if self.__instruments is not None:
+            self.__instruments.of(self.__connection.address, PRINTER_INFO_CODE).decode.record(
+                time.perf_counter() - started_at
+            )
+        return printer
 
-        
+    @staticmethod
+    def decode_printing_info(data: bytes) -> PrinterState:
+        return codecs.decode_status(data)
 
-        self.__connection.send(info_cmd)
+    @staticmethod
+    def decode_printer(buf: bytes, address: str) -> Printer:
+        return codecs.decode_printer(buf, address)
 
-        data = self.__connection.recv()
-        if not data:
-            return None
-        (
-            code,
-            is_ready_to_print,
-            current_task_file_bytes,
-            printing_marker,
-            progress,
-            left_extruder_temperature,
-            right_extruder_temperature,
-            table_temperature,
-            _,
-        ) = struct.unpack(recv_format, data)
-        open("debug_dump.bin", "wb").write(data)
-        task_name = current_task_file_bytes.decode("utf-8").strip("\x00")
-
-        return PrinterState(
-            state=NetPrinterState(code),
-            left_extruder_temperature=left_extruder_temperature,
-            right_extruder_temperature=right_extruder_temperature,
-            table_temperature=table_temperature,
-            current_task_file=task_name,
-            is_printing=printing_marker != 0,
-            is_ready=is_ready_to_print,
-            progress_percents=progress,
-        )
+    @staticmethod
+    def discover_printers(
+        timeout: float = 1.0,
+        expect: int | None = None,
+        broadcast_addresses: Iterable[str] | None = None,
+    ) -> List[Printer]:
+        """Discovers printers on the local network
+
+        Probes every broadcast address at once and queries the info of each
+        responder as soon as it answers, all replies are collected until the
+        deadline.
+
+        Args:
+            timeout (float): overall discovery deadline in seconds
+            expect (int | None): return as soon as this many printers answered
+            broadcast_addresses (Iterable[str] | None): where to send probes, all ipv4 broadcast addresses if omitted
+
+        Returns:
+            List[Printer]: discovered printers
+        """
+        if broadcast_addresses is None:
+            broadcast_addresses = NetworkUtils.get_all_ipv4_broadcast_addresses()
+        schedule = _ProbeSchedule(list(broadcast_addresses), DISCOVERY_PROBES, DISCOVERY_PROBE_INTERVAL)
+        return PrinterService.__discover(schedule, timeout, expect)
+
+    @staticmethod
+    def sweep_printers(
+        subnets: Iterable[str],
+        timeout: float = 1.0,
+        expect: int | None = None,
+        rate: float = DEFAULT_SWEEP_RATE,
+    ) -> List[Printer]:
+        """Discovers printers by probing every host of routed subnets
+
+        Broadcasts don't cross routers, so each host gets a unicast probe
+        instead. Probes are paced to rate per second from one socket while
+        replies are collected, hosts which answered aren't probed again.
+
+        Args:
+            subnets (Iterable[str]): CIDR networks, e.g. '10.20.0.0/22'
+            timeout (float): how long to wait for replies after the first pass over the hosts
+            expect (int | None): return as soon as this many printers answered
+            rate (float): probes per second
+
+        Returns:
+            List[Printer]: discovered printers
+
+        Raises:
+            ValueError: a subnet is not a valid IPv4 network
+        """
+        hosts: Dict[str, None] = {}
+        for subnet in subnets:
+            network = ipaddress.ip_network(subnet, strict=False)
+            if network.version != 4:
+                raise ValueError(f"{subnet} is not an IPv4 network")
+            hosts.update((str(host), None) for host in network.hosts())
+        schedule = _ProbeSchedule(list(hosts), SWEEP_PASSES, DISCOVERY_PROBE_INTERVAL, rate)
+        return PrinterService.__discover(schedule, timeout, expect)
 
     @staticmethod
-    def discover_printers() -> List[Printer]:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        broadcast_addresses = NetworkUtils.get_all_ipv4_broadcast_addresses()
-        printers_adresses = set()
-        for b_addr in broadcast_addresses:
-            for _ in range(3):
-                sock.sendto("PICASO3D".encode("ascii"), (b_addr, 49149))
-                while True:
-                    read_ready, _, _ = select.select([sock], [], [], 0.3)
-                    if read_ready:
-                        _, (address, _) = sock.recvfrom(1024)
-                        printers_adresses.add(address)
-                    else:
-                        break
-        discover_result = []
-
-        for address in printers_adresses:
-            with Connection(address) as connection:
-                connection.send(b"\x01\x00\x0c\x00\x00\x00\x08\x00")
-                buf = connection.recv()
-                if not buf:
-                    print(f"Can't receive info from ${address}", file=sys.stderr)
-                    continue
-                (
-                    protocol_version,
-                    sub_version,
-                    low_hw_version,
-                    hi_hw_version,
-                    serial,
-                    left_extruder_profile,
-                    right_extruder_profile,
-                ) = struct.unpack("1c1c6x1c1c3x20x20s47x40s10x40sx", buf)
-                discover_result.append(
-                    Printer(
-                        protocol_version=int.from_bytes(protocol_version),
-                        sub_version=int.from_bytes(sub_version),
-                        low_hw_version=int.from_bytes(low_hw_version),
-                        hi_hw_version=int.from_bytes(hi_hw_version),
-                        printer_type=PrinterType(
-                            MagicPicasoConverters.convert_hi_hw_ver_to_printer_model(
-                                int.from_bytes(hi_hw_version)
-                            )
-                        ),
-                        serial=serial.decode("utf-8").strip("\x00"),
-                        ip_address=address,
-                        left_extruder_profile=left_extruder_profile.decode(
-                            "utf-8"
-                        ).strip("\x00"),
-                        right_extruder_profile=right_extruder_profile.decode(
-                            "utf-8"
-                        ).strip("\x00"),
-                    )
-                )
-
-        return discover_result
+    def __discover(schedule: _ProbeSchedule, timeout: float, expect: int | None) -> List[Printer]:
+        deadline = time.monotonic() + schedule.send_duration + timeout
+        discover_result: Dict[str, Printer] = {}
+        queried: Dict[str, int] = {}
+        failed_probes = 0
+
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe_sock, \
+                socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as info_sock:
+            probe_sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            probe_sock.setblocking(False)
+            info_sock.setblocking(False)
+
+            while True:
+                now = time.monotonic()
+                if expect is not None and len(discover_result) >= expect:
+                    break
+                if now >= deadline:
+                    break
+
+                new_pass, targets = schedule.due(now, queried)
+                if new_pass:
+                    # responders which didn't answer the info query yet get asked again
+                    for address, attempts in queried.items():
+                        if address not in discover_result and attempts < DISCOVERY_PROBES:
+                            info_sock.sendto(PRINTER_INFO_CMD, (address, PRINTER_PORT))
+                            queried[address] = attempts + 1
+                for target in targets:
+                    try:
+                        probe_sock.sendto(DISCOVERY_PROBE, (target, DISCOVERY_PORT))
+                    except BlockingIOError:
+                        # the send buffer is full, the next pass probes the rest
+                        failed_probes += 1
+                    except OSError as e:
+                        failed_probes += 1
+                        if not schedule.paced:
+                            print(f"Can't probe {target}: {e}", file=sys.stderr)
+
+                wait = deadline - now
+                next_at = schedule.next_at()
+                if next_at is not None:
+                    wait = min(wait, max(0.0, next_at - now))
+                read_ready, _, _ = select.select([probe_sock, info_sock], [], [], wait)
+
+                if probe_sock in read_ready:
+                    for _, (address, _) in PrinterService.__drain(probe_sock):
+                        if address not in queried:
+                            info_sock.sendto(PRINTER_INFO_CMD, (address, PRINTER_PORT))
+                            queried[address] = 1
+
+                if info_sock in read_ready:
+                    for buf, (address, _) in PrinterService.__drain(info_sock):
+                        if address in discover_result or address not in queried:
+                            continue
+                        if command_code(buf) != PRINTER_INFO_CODE or len(buf) != PRINTER_INFO_SIZE:
+                            continue
+                        try:
+                            discover_result[address] = PrinterService.decode_printer(buf, address)
+                        except ValueError:
+                            print(f"Can't decode info from {address}", file=sys.stderr)
+
+        if schedule.paced and failed_probes:
+            print(f"{failed_probes} probes couldn't be sent", file=sys.stderr)
+        for address in queried:
+            if address not in discover_result and (expect is None or len(discover_result) < expect):
+                print(f"Can't receive info from {address}", file=sys.stderr)
+
+        return list(discover_result.values())
+
+    @staticmethod
+    def __drain(sock: socket.socket) -> List[Tuple[bytes, Tuple[str, int]]]:
+        datagrams = []
+        while True:
+            try:
+                datagrams.append(sock.recvfrom(1024))
+            except (BlockingIOError, InterruptedError):
+                return datagrams
+            except OSError:
+                # ICMP errors from previous sends are reported here
+                continue
+
+    def start_task(self, name: str, printlist: str = "") -> bool:
+        experimental.require("task start")
+        payload = TASK_START.pack(printlist.encode("utf-8"), name.encode("utf-8"))
+        cmd = codecs.encode_header(TASK_START_CODE, len(payload)) + payload
+        nbytes = self.__connection.request_into(cmd, self.__buffer, codecs.HEADER.size + TASK_STATUS.size)
+        if nbytes == 0:
+            print("Printer didn't respond", file=sys.stderr)
+            return False
+        (status,) = TASK_STATUS.unpack_from(self.__buffer, codecs.HEADER.size)
+        return status == 0
+
+    def __command_status(self, code: int, payload: bytes) -> bool | None:
+        cmd = codecs.encode_header(code, len(payload)) + payload
+        nbytes = self.__connection.request_into(cmd, self.__buffer, codecs.HEADER.size + TASK_STATUS.size)
+        if nbytes == 0:
+            return None
+        (status,) = TASK_STATUS.unpack_from(self.__buffer, codecs.HEADER.size)
+        return status == 0
+
+    def __pages(self, code: int, request: bytes, entry: struct.Struct) -> List[tuple] | None:
+        entries = []
+        while True:
+            payload = request + PAGE_OFFSET.pack(len(entries))
+            cmd = codecs.encode_header(code, len(payload)) + payload
+            nbytes = self.__connection.request_into(cmd, self.__buffer)
+            if nbytes < codecs.HEADER.size + PAGE_HEADER.size:
+                return None
+            total, count = PAGE_HEADER.unpack_from(self.__buffer, codecs.HEADER.size)
+            offset = codecs.HEADER.size + PAGE_HEADER.size
+            if nbytes < offset + count * entry.size:
+                return None
+            entries.extend(entry.unpack_from(self.__buffer, offset + i * entry.size) for i in range(count))
+            if count == 0 or len(entries) >= total:
+                return entries
+
+    def get_printlists(self) -> List[PrintList] | None:
+        experimental.require("printlist list")
+        entries = self.__pages(PRINTLISTS_CODE, b"", PRINTLIST_ENTRY)
+        if entries is None:
+            return None
+        return [PrintList(codecs.c_string(name), task_count, generation) for name, task_count, generation in entries]
+
+    def get_tasks(self, printlist: str = "") -> List[Task] | None:
+        experimental.require("task list")
+        entries = self.__pages(TASKS_CODE, PRINTLIST_NAME.pack(printlist.encode("utf-8")), TASK_ENTRY)
+        if entries is None:
+            return None
+        return [Task(codecs.c_string(name), size) for size, name in entries]
+
+    def create_printlist(self, name: str) -> bool | None:
+        experimental.require("printlist create")
+        return self.__command_status(PRINTLIST_CREATE_CODE, PRINTLIST_NAME.pack(name.encode("utf-8")))
+
+    def delete_printlist(self, name: str) -> bool | None:
+        experimental.require("printlist delete")
+        return self.__command_status(PRINTLIST_DELETE_CODE, PRINTLIST_NAME.pack(name.encode("utf-8")))
+
+    def delete_task(self, name: str, printlist: str = "") -> bool | None:
+        experimental.require("task delete")
+        return self.__command_status(TASK_DELETE_CODE, TASK_DELETE.pack(printlist.encode("utf-8"), name.encode("utf-8")))
 
     def beep_on(self):
-        self.__connection.send(b"\x01\x00\x0e\x00\x00\x00\x08\x00")
-        resp = self.__connection.recv()
+        resp = self.__connection.request(BEEP_ON_CMD)
         if not resp:
             print("Printer didn't respond", file=sys.stderr)
 
     def beep_off(self):
-        self.__connection.send(b"\x01\x00\x0f\x00\x00\x00\x08\x00")
-        resp = self.__connection.recv()
+        resp = self.__connection.request(BEEP_OFF_CMD)
         if not resp:
             print("Printer didn't respond", file=sys.stderr)
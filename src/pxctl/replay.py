@@ -0,0 +1,85 @@
+import re
+import time
+from typing import Container, Dict, Iterable, Iterator, Tuple
+
+from .capture import CapturedFrame
+from .codecs import StatusDecoder
+from .structs import PrinterState
+
+
+def parse_speed(value: str) -> float | None:
+    """Parses a replay speed
+
+    Args:
+        value (str): a factor like '10x' or '0.5', or 'max'
+
+    Returns:
+        float | None: the factor, None to replay as fast as possible
+    """
+    if value.strip().lower() == "max":
+        return None
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)x?", value.strip().lower())
+    if match is None or float(match.group(1)) <= 0:
+        raise ValueError(f"Wrong speed {value}, expected a positive factor like 10x or max")
+    return float(match.group(1))
+
+
+class Replay:
+    """Decodes captured status frames as if they were being polled.
+
+    Frames go through the same status decoder as a live poll, one per
+    printer, and are handed out at the pace they were captured, sped up by
+    speed, or without waiting at all when speed is None.
+    """
+
+    def __init__(
+        self,
+        frames: Iterable[CapturedFrame],
+        speed: float | None = 1.0,
+        addresses: Container[str] | None = None,
+    ):
+        self.__frames = frames
+        self.__speed = speed
+        self.__addresses = addresses
+        self.__decoders: Dict[str, StatusDecoder] = {}
+        self.__count = 0
+        self.__malformed = 0
+        self.__now: float | None = None
+
+    @property
+    def count(self) -> int:
+        return self.__count
+
+    @property
+    def malformed(self) -> int:
+        return self.__malformed
+
+    def now(self) -> float:
+        """Gets the capture time of the frame being replayed"""
+        return self.__now if self.__now is not None else time.time()
+
+    def __iter__(self) -> Iterator[Tuple[float, str, PrinterState | None]]:
+        started_at = None
+        for frame in self.__frames:
+            if self.__addresses is not None and frame.address not in self.__addresses:
+                continue
+            if self.__speed is not None:
+                if started_at is None:
+                    started_at = (frame.timestamp, time.monotonic())
+                due = started_at[1] + (frame.timestamp - started_at[0]) / self.__speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+            info = None
+            if frame.frame is not None:
+                decoder = self.__decoders.get(frame.address)
+                if decoder is None:
+                    decoder = self.__decoders[frame.address] = StatusDecoder()
+                try:
+                    info = decoder.decode(frame.frame)
+                except ValueError:
+                    self.__malformed += 1
+            self.__count += 1
+            self.__now = frame.timestamp
+            yield frame.timestamp, frame.address, info
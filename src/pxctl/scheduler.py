@@ -0,0 +1,99 @@
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, Hashable, List
+
+from .enums import NetPrinterState
+from .structs import PrinterState
+
+SLOW_STATES = (NetPrinterState.npstIdle, NetPrinterState.npstService)
+FAST_STATES = (
+    NetPrinterState.npstPrepareForPrinting,
+    NetPrinterState.npstPrepareForPause,
+    NetPrinterState.npstPrepareForStop,
+    NetPrinterState.npstPrePrint,
+)
+
+
+@dataclass
+class PollIntervals:
+    idle: float = 5.0
+    printing: float = 0.6
+    fast: float = 0.3
+    near_completion: float = 95.0
+    jitter: float = 0.1
+    max_backoff: float = 30.0
+
+
+class PollScheduler:
+    """Picks when each printer is polled next.
+
+    The interval depends on what the printer is doing, deadlines advance
+    from the previous deadline rather than from the end of the poll so the
+    cadence doesn't drift, and each interval is jittered so a fleet doesn't
+    fall into synchronized bursts. Printers which don't respond are polled
+    with exponential backoff.
+    """
+
+    def __init__(self, intervals: PollIntervals | None = None, seed: int | None = None):
+        self.__intervals = intervals or PollIntervals()
+        self.__random = random.Random(seed)
+        self.__deadlines: Dict[Hashable, float] = {}
+        self.__failures: Dict[Hashable, int] = {}
+        self.__last_interval: Dict[Hashable, float] = {}
+
+    def interval(self, key: Hashable, info: PrinterState | None) -> float:
+        intervals = self.__intervals
+        if info is None:
+            failures = self.__failures.get(key, 0) + 1
+            self.__failures[key] = failures
+            base = self.__last_interval.get(key, intervals.printing)
+            return min(base * 2 ** failures, intervals.max_backoff)
+
+        self.__failures.pop(key, None)
+        if info.state in SLOW_STATES:
+            interval = intervals.idle
+        elif info.state in FAST_STATES or info.progress_percents >= intervals.near_completion:
+            interval = intervals.fast
+        else:
+            interval = intervals.printing
+        self.__last_interval[key] = interval
+        return interval
+
+    def add(self, key: Hashable, now: float | None = None):
+        self.__deadlines.setdefault(key, time.monotonic() if now is None else now)
+
+    def schedule(self, key: Hashable, info: PrinterState | None, now: float | None = None) -> float:
+        """Sets the next poll deadline of a printer after a poll
+
+        Args:
+            key (Hashable): the printer, e.g. its address
+            info (PrinterState | None): the polled state, None if the printer didn't respond
+            now (float | None): monotonic time, current time if omitted
+
+        Returns:
+            float: the monotonic deadline of the next poll
+        """
+        now = time.monotonic() if now is None else now
+        jitter = self.__intervals.jitter
+        interval = self.interval(key, info) * self.__random.uniform(1.0 - jitter, 1.0 + jitter)
+        deadline = self.__deadlines.get(key, now) + interval
+        if deadline < now:
+            # the poll overran its slot, missed ticks are skipped instead of bursting
+            deadline = now + interval
+        self.__deadlines[key] = deadline
+        return deadline
+
+    def due(self, now: float | None = None) -> List[Hashable]:
+        now = time.monotonic() if now is None else now
+        return [key for key, deadline in self.__deadlines.items() if deadline <= now]
+
+    def deadline(self, key: Hashable) -> float:
+        return self.__deadlines[key]
+
+    def next_deadline(self) -> float:
+        return min(self.__deadlines.values())
+
+    def sleep_time(self, now: float | None = None) -> float:
+        now = time.monotonic() if now is None else now
+        return max(0.0, self.next_deadline() - now)
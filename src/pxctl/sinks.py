@@ -0,0 +1,281 @@
+import json
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import BinaryIO, Deque, Iterator, List
+
+from .enums import NetPrinterState
+from .structs import PrinterState
+
+SINK_FORMATS = ("ndjson", "csv", "binary")
+BACKPRESSURE_POLICIES = ("drop-oldest", "block")
+
+CSV_COLUMNS = (
+    "timestamp",
+    "address",
+    "serial",
+    "state",
+    "task_name",
+    "progress_percent",
+    "left_extruder_temperature",
+    "right_extruder_temperature",
+    "table_temperature",
+    "is_ready",
+)
+
+# Binary stream: MAGIC once, then one record per sample. A record is
+# RECORD_HEADER followed by the address, serial and task name, each a
+# length-prefixed utf-8 string. A printer that didn't respond has state 0
+# and zero temperatures.
+MAGIC = b"PXS1"
+RECORD_HEADER = struct.Struct("<dBBffff")
+STRING_LENGTH = struct.Struct("<H")
+NOT_CONNECTED = 0
+FLAG_READY = 1
+FLAG_PRINTING = 2
+
+
+@dataclass
+class SinkRecord:
+    timestamp: float
+    address: str
+    serial: str | None
+    info: PrinterState | None
+
+
+def record_dto(record: SinkRecord) -> dict:
+    dto = {
+        "timestamp": round(record.timestamp, 3),
+        "address": record.address,
+        "serial": record.serial,
+    }
+    info = record.info
+    if info is None:
+        dto["state"] = "NOT_CONNECTED"
+        return dto
+    dto.update({
+        "state": info.state.name,
+        "task_name": info.current_task_file,
+        "progress_percent": round(info.progress_percents, 1),
+        "left_extruder_temperature": round(info.left_extruder_temperature, 1),
+        "right_extruder_temperature": round(info.right_extruder_temperature, 1),
+        "table_temperature": round(info.table_temperature, 1),
+        "is_ready": info.is_ready,
+    })
+    return dto
+
+
+class NdjsonFormat:
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, record: SinkRecord) -> bytes:
+        return json.dumps(record_dto(record)).encode("utf-8") + b"\n"
+
+
+class CsvFormat:
+    def header(self) -> bytes:
+        return (",".join(CSV_COLUMNS) + "\r\n").encode("utf-8")
+
+    def encode(self, record: SinkRecord) -> bytes:
+        import csv
+        import io
+
+        dto = record_dto(record)
+        line = io.StringIO()
+        csv.writer(line).writerow([dto.get(column, "") for column in CSV_COLUMNS])
+        return line.getvalue().encode("utf-8")
+
+
+def _pack_string(value: str | None) -> bytes:
+    raw = (value or "").encode("utf-8")[:0xFFFF]
+    return STRING_LENGTH.pack(len(raw)) + raw
+
+
+class BinaryFormat:
+    def header(self) -> bytes:
+        return MAGIC
+
+    def encode(self, record: SinkRecord) -> bytes:
+        info = record.info
+        if info is None:
+            head = RECORD_HEADER.pack(record.timestamp, NOT_CONNECTED, 0, 0.0, 0.0, 0.0, 0.0)
+            task = None
+        else:
+            flags = (FLAG_READY if info.is_ready else 0) | (FLAG_PRINTING if info.is_printing else 0)
+            head = RECORD_HEADER.pack(
+                record.timestamp,
+                info.state.value,
+                flags,
+                info.progress_percents,
+                info.left_extruder_temperature,
+                info.right_extruder_temperature,
+                info.table_temperature,
+            )
+            task = info.current_task_file
+        return head + _pack_string(record.address) + _pack_string(record.serial) + _pack_string(task)
+
+
+def read_binary(data: bytes) -> Iterator[SinkRecord]:
+    """Decodes a stream written in the binary sink format
+
+    Args:
+        data (bytes): the whole stream, starting with the magic
+
+    Yields:
+        SinkRecord: the records in the order they were written, a truncated last record is skipped
+    """
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a pxctl binary stream")
+    offset = len(MAGIC)
+    while offset + RECORD_HEADER.size <= len(data):
+        timestamp, state, flags, progress, left, right, table = RECORD_HEADER.unpack_from(data, offset)
+        offset += RECORD_HEADER.size
+        strings = []
+        for _ in range(3):
+            if offset + STRING_LENGTH.size > len(data):
+                return
+            (length,) = STRING_LENGTH.unpack_from(data, offset)
+            offset += STRING_LENGTH.size
+            if offset + length > len(data):
+                return
+            strings.append(data[offset:offset + length].decode("utf-8"))
+            offset += length
+        address, serial, task = strings
+        info = None
+        if state != NOT_CONNECTED:
+            info = PrinterState(
+                NetPrinterState(state),
+                left,
+                right,
+                table,
+                task,
+                bool(flags & FLAG_PRINTING),
+                bool(flags & FLAG_READY),
+                progress,
+            )
+        yield SinkRecord(timestamp, address, serial or None, info)
+
+
+def get_format(name: str):
+    return {"ndjson": NdjsonFormat, "csv": CsvFormat, "binary": BinaryFormat}[name]()
+
+
+class SinkWriter:
+    """Writes records to a stream from a background thread.
+
+    Records are queued by the poll loop and written in batches, so a slow
+    consumer, e.g. a stalled pipe, never holds up polling. When the queue
+    is full the oldest record is dropped, or with the "block" policy the
+    producer waits for room and nothing is lost.
+    """
+
+    def __init__(
+        self,
+        stream: BinaryIO,
+        format_name: str = "ndjson",
+        policy: str = "drop-oldest",
+        queue_size: int = 10000,
+        batch_size: int = 256,
+        flush_interval: float = 0.0,
+        header: bool = True,
+    ):
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown back-pressure policy {policy}, expected {', '.join(BACKPRESSURE_POLICIES)}")
+        self.__stream = stream
+        self.__format = get_format(format_name)
+        self.__policy = policy
+        self.__queue: Deque[SinkRecord] = deque()
+        self.__queue_size = max(1, queue_size)
+        self.__batch_size = max(1, batch_size)
+        self.__flush_interval = flush_interval
+        self.__condition = threading.Condition()
+        self.__closed = False
+        self.__error: OSError | None = None
+        self.__written = 0
+        self.__dropped = 0
+        self.__thread = threading.Thread(target=self.__run, name="pxctl-sink", daemon=True)
+        self.__pending_header = self.__format.header() if header else b""
+        self.__thread.start()
+
+    @property
+    def written(self) -> int:
+        return self.__written
+
+    @property
+    def dropped(self) -> int:
+        return self.__dropped
+
+    def write(self, record: SinkRecord):
+        with self.__condition:
+            if self.__error is not None:
+                raise self.__error
+            if self.__closed:
+                raise ValueError("Write to a closed sink")
+            if len(self.__queue) >= self.__queue_size:
+                if self.__policy == "block":
+                    self.__condition.wait_for(
+                        lambda: len(self.__queue) < self.__queue_size or self.__error is not None
+                    )
+                    if self.__error is not None:
+                        raise self.__error
+                else:
+                    self.__queue.popleft()
+                    self.__dropped += 1
+            self.__queue.append(record)
+            self.__condition.notify_all()
+
+    def __take(self) -> List[SinkRecord] | None:
+        with self.__condition:
+            self.__condition.wait_for(lambda: self.__queue or self.__closed)
+            if not self.__queue:
+                return None
+            count = min(len(self.__queue), self.__batch_size)
+            batch = [self.__queue.popleft() for _ in range(count)]
+            self.__condition.notify_all()
+            return batch
+
+    def __run(self):
+        flushed_at = time.monotonic()
+        try:
+            if self.__pending_header:
+                self.__stream.write(self.__pending_header)
+            while True:
+                batch = self.__take()
+                if batch is None:
+                    break
+                self.__stream.write(b"".join(self.__format.encode(record) for record in batch))
+                self.__written += len(batch)
+                now = time.monotonic()
+                # with an interval, a busy stream is flushed at most that often, an idle one right away
+                with self.__condition:
+                    idle = not self.__queue
+                if idle or now - flushed_at >= self.__flush_interval:
+                    self.__stream.flush()
+                    flushed_at = now
+            self.__stream.flush()
+        except OSError as e:
+            with self.__condition:
+                self.__error = e
+                self.__queue.clear()
+                self.__condition.notify_all()
+
+    def close(self, timeout: float = 5.0):
+        """Writes the queued records and stops the writer thread
+
+        Args:
+            timeout (float): give up on a consumer that doesn't read for this many seconds
+        """
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+        self.__thread.join(timeout)
+        if self.__thread.is_alive():
+            with self.__condition:
+                self.__dropped += len(self.__queue)
+        # a reader which went away doesn't want to hear about what it missed
+        if self.__dropped and not isinstance(self.__error, BrokenPipeError):
+            print(f"Output sink dropped {self.__dropped} records of a slow consumer", file=sys.stderr)
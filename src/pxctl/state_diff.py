@@ -0,0 +1,78 @@
+from dataclasses import dataclass, fields
+from typing import Dict, Hashable
+
+from .structs import PrinterState
+
+TEMPERATURE_FIELDS = (
+    "left_extruder_temperature",
+    "right_extruder_temperature",
+    "table_temperature",
+)
+PROGRESS_FIELDS = ("progress_percents",)
+STATE_FIELDS = tuple(f.name for f in fields(PrinterState))
+
+
+@dataclass
+class Deadbands:
+    temperature: float = 0.5
+    progress: float = 0.1
+
+
+class ChangeDetector:
+    """Tells which fields of a printer state meaningfully changed.
+
+    Temperatures and progress are compared with the last emitted value, not
+    the last polled one, so slow drift is still reported once it exceeds the
+    deadband.
+    """
+
+    def __init__(self, deadbands: Deadbands | None = None):
+        self.__deadbands = deadbands or Deadbands()
+        self.__emitted: Dict[Hashable, PrinterState | None] = {}
+
+    def changes(self, key: Hashable, info: PrinterState | None) -> Dict[str, object] | None:
+        """Gets the fields changed since the last emitted state of the printer
+
+        Args:
+            key (Hashable): the printer, e.g. its address
+            info (PrinterState | None): the polled state, None if the printer didn't respond
+
+        Returns:
+            Dict[str, object] | None: changed fields and their new values, None if nothing changed.
+                A printer which stopped responding is reported as {"state": None}.
+        """
+        if key not in self.__emitted:
+            self.__emitted[key] = info
+            if info is None:
+                return {"state": None}
+            return {name: getattr(info, name) for name in STATE_FIELDS}
+
+        previous = self.__emitted[key]
+        if info is None:
+            if previous is None:
+                return None
+            self.__emitted[key] = None
+            return {"state": None}
+        if previous is None:
+            self.__emitted[key] = info
+            return {name: getattr(info, name) for name in STATE_FIELDS}
+
+        changed = {}
+        for name in STATE_FIELDS:
+            value = getattr(info, name)
+            if name in TEMPERATURE_FIELDS:
+                significant = abs(value - getattr(previous, name)) >= self.__deadbands.temperature
+            elif name in PROGRESS_FIELDS:
+                significant = abs(value - getattr(previous, name)) >= self.__deadbands.progress
+            else:
+                significant = value != getattr(previous, name)
+            if significant:
+                changed[name] = value
+        if not changed:
+            return None
+
+        # only the reported fields move the baseline, the others keep accumulating drift
+        baseline = {name: getattr(previous, name) for name in STATE_FIELDS}
+        baseline.update(changed)
+        self.__emitted[key] = PrinterState(**baseline)
+        return changed
@@ -1,4 +1,5 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Dict, List
 
 from .enums import NetPrinterState, PrinterType
 
@@ -25,4 +26,31 @@ class Printer:
     serial: str
     ip_address: str
     left_extruder_profile: str
-    right_extruder_profile: str
\ No newline at end of file
+    right_extruder_profile: str
+
+
+@dataclass
+class PrintList:
+    name: str
+    task_count: int
+    generation: int
+
+
+@dataclass
+class Task:
+    name: str
+    size: int
+
+
+@dataclass
+class PrinterCatalog:
+    serial: str
+    refreshed_at: float = 0.0
+    printlists: Dict[str, PrintList] = field(default_factory=dict)
+    tasks: Dict[str, List[Task]] = field(default_factory=dict)
+
+
+@dataclass
+class Estimate:
+    progress_rate: float
+    eta_seconds: float | None
@@ -0,0 +1,253 @@
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Callable, Dict, Tuple
+
+from . import experimental
+from .codecs import HEADER, encode_header
+from .connection import Connection, command_code
+
+# The transfer commands are not part of the status protocol decoded elsewhere
+# in pxctl and are experimental, see pxctl.experimental. Their layout follows
+# the common header: BEGIN announces the file and returns the offset already
+# stored on the printer, CHUNK carries one slice of the file and is acknowledged
+# by its offset, END verifies the crc32 of the file.
+UPLOAD_BEGIN_CODE = 0x20
+UPLOAD_CHUNK_CODE = 0x21
+UPLOAD_END_CODE = 0x22
+
+UPLOAD_BEGIN = struct.Struct("<QI64s255s")
+UPLOAD_OFFSET = struct.Struct("<Q")
+UPLOAD_END = struct.Struct("<QI")
+UPLOAD_STATUS = struct.Struct("<B")
+
+UPLOAD_OK = 0
+UPLOAD_INCOMPLETE = 1
+UPLOAD_CORRUPTED = 2
+
+DEFAULT_CHUNK_SIZE = 1024
+DEFAULT_WINDOW = 32
+MIN_RTO = 0.02
+PROGRESS_EVERY = 0.25
+
+
+class UploadError(Exception):
+    pass
+
+
+class BandwidthLimiter:
+    """Token bucket shared by uploads which together must not exceed a rate.
+
+    Bursts are limited to a tenth of a second worth of bytes, so parallel
+    uploads interleave instead of flooding the link in turns.
+    """
+
+    def __init__(self, bytes_per_second: float):
+        self.__rate = bytes_per_second
+        self.__capacity = max(bytes_per_second / 10.0, 2.0 * DEFAULT_CHUNK_SIZE)
+        self.__tokens = self.__capacity
+        self.__updated_at = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def acquire(self, nbytes: int):
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(self.__capacity, self.__tokens + (now - self.__updated_at) * self.__rate)
+            self.__updated_at = now
+            self.__tokens -= nbytes
+            wait = -self.__tokens / self.__rate if self.__tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+
+@dataclass
+class UploadProgress:
+    name: str
+    total: int
+    acked: int = 0
+    resumed_from: int = 0
+    retransmits: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def percents(self) -> float:
+        return 100.0 * self.acked / self.total if self.total else 100.0
+
+    @property
+    def throughput(self) -> float:
+        """Bytes per second transferred in this session, resumed bytes excluded"""
+        return (self.acked - self.resumed_from) / self.elapsed if self.elapsed else 0.0
+
+
+class Uploader:
+    """Streams a file to the printer through a sliding window of chunks.
+
+    The file is memory-mapped and chunks are sent straight from the mapping.
+    Up to window chunks are in flight, each one is acknowledged on its own and
+    only the chunks whose acknowledgement timed out are sent again.
+    """
+
+    def __init__(
+        self,
+        connection: Connection,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        window: int = DEFAULT_WINDOW,
+        timeout: float = 0.3,
+        retries: int = 8,
+        limiter: BandwidthLimiter | None = None,
+    ):
+        self.__connection = connection
+        self.__chunk_size = chunk_size
+        self.__window = window
+        self.__timeout = timeout
+        self.__retries = retries
+        self.__limiter = limiter
+        self.__buffer = bytearray(2048)
+        self.__chunk_header = encode_header(UPLOAD_CHUNK_CODE, UPLOAD_OFFSET.size + chunk_size)
+
+    def __request(self, code: int, payload: bytes, reply: struct.Struct) -> tuple:
+        cmd = encode_header(code, len(payload)) + payload
+        nbytes = self.__connection.request_into(cmd, self.__buffer, HEADER.size + reply.size)
+        if nbytes == 0:
+            raise UploadError("Printer didn't respond")
+        return reply.unpack_from(self.__buffer, HEADER.size)
+
+    def __send_chunk(self, data, index: int, size: int):
+        offset = index * self.__chunk_size
+        end = min(offset + self.__chunk_size, size)
+        header = self.__chunk_header
+        if end - offset != self.__chunk_size:
+            header = encode_header(UPLOAD_CHUNK_CODE, UPLOAD_OFFSET.size + end - offset)
+        if self.__limiter is not None:
+            self.__limiter.acquire(end - offset)
+        with memoryview(data)[offset:end] as chunk:
+            self.__connection.send_parts(header, UPLOAD_OFFSET.pack(offset), chunk)
+
+    def __receive_acks(self, timeout: float, size: int) -> list:
+        acks = []
+        nbytes = self.__connection.receive_into(self.__buffer, timeout)
+        while nbytes:
+            if nbytes == HEADER.size + UPLOAD_OFFSET.size and command_code(self.__buffer) == UPLOAD_CHUNK_CODE:
+                (offset,) = UPLOAD_OFFSET.unpack_from(self.__buffer, HEADER.size)
+                if offset < size and offset % self.__chunk_size == 0:
+                    acks.append(offset // self.__chunk_size)
+            nbytes = self.__connection.receive_into(self.__buffer, 0)
+        return acks
+
+    def upload(
+        self,
+        path: str,
+        name: str | None = None,
+        printlist: str = "",
+        progress: Callable[[UploadProgress], None] | None = None,
+    ) -> UploadProgress:
+        """Uploads a file, resuming a previously interrupted upload of it
+
+        Args:
+            path (str): the file to upload
+            name (str | None): the task name on the printer, the file name if omitted
+            printlist (str): the print list to put the task into
+            progress (Callable[[UploadProgress], None] | None): called periodically during the transfer
+
+        Returns:
+            UploadProgress: the final state of the transfer
+        """
+        name = name or os.path.basename(path)
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+            try:
+                return self.upload_data(data, name, printlist, progress)
+            finally:
+                if size:
+                    data.close()
+
+    def upload_data(
+        self,
+        data,
+        name: str,
+        printlist: str = "",
+        progress: Callable[[UploadProgress], None] | None = None,
+        crc: int | None = None,
+    ) -> UploadProgress:
+        """Uploads a file already in memory, e.g. mapped once and sent to several printers
+
+        Args:
+            data: the content of the file, any buffer
+            name (str): the task name on the printer
+            printlist (str): the print list to put the task into
+            progress (Callable[[UploadProgress], None] | None): called periodically during the transfer
+            crc (int | None): crc32 of data, computed if omitted
+
+        Returns:
+            UploadProgress: the final state of the transfer
+
+        Raises:
+            ExperimentalCommandError: if experimental commands aren't enabled
+        """
+        experimental.require("upload")
+        size = len(data)
+        started_at = time.monotonic()
+        (resume_offset,) = self.__request(
+            UPLOAD_BEGIN_CODE,
+            UPLOAD_BEGIN.pack(size, self.__chunk_size, printlist.encode("utf-8"), name.encode("utf-8")),
+            UPLOAD_OFFSET,
+        )
+        resume_offset = min(resume_offset - resume_offset % self.__chunk_size, size)
+        state = UploadProgress(name=name, total=size, acked=resume_offset, resumed_from=resume_offset)
+
+        chunks = (size + self.__chunk_size - 1) // self.__chunk_size
+        next_chunk = resume_offset // self.__chunk_size
+        in_flight: Dict[int, Tuple[float, int]] = {}
+        acked = bytearray(chunks)
+        srtt = None
+        rto = self.__timeout
+        reported_at = started_at
+
+        while next_chunk < chunks or in_flight:
+            while next_chunk < chunks and len(in_flight) < self.__window:
+                self.__send_chunk(data, next_chunk, size)
+                in_flight[next_chunk] = (time.monotonic(), 1)
+                next_chunk += 1
+
+            oldest = min(sent_at for sent_at, _ in in_flight.values())
+            for index in self.__receive_acks(max(0.0, oldest + rto - time.monotonic()), size):
+                if acked[index]:
+                    continue
+                acked[index] = 1
+                state.acked += min(self.__chunk_size, size - index * self.__chunk_size)
+                sent_at, attempts = in_flight.pop(index, (None, 0))
+                if attempts == 1:
+                    # only unambiguous samples, a retransmitted chunk may be acked for either copy
+                    rtt = time.monotonic() - sent_at
+                    srtt = rtt if srtt is None else 0.875 * srtt + 0.125 * rtt
+                    rto = min(self.__timeout, max(MIN_RTO, 4 * srtt))
+
+            now = time.monotonic()
+            for index, (sent_at, attempts) in list(in_flight.items()):
+                if now - sent_at < rto:
+                    continue
+                if attempts > self.__retries:
+                    raise UploadError(f"Chunk at offset {index * self.__chunk_size} wasn't acknowledged")
+                self.__send_chunk(data, index, size)
+                in_flight[index] = (now, attempts + 1)
+                state.retransmits += 1
+
+            if progress is not None and now - reported_at >= PROGRESS_EVERY:
+                state.elapsed = now - started_at
+                progress(state)
+                reported_at = now
+
+        (status,) = self.__request(UPLOAD_END_CODE, UPLOAD_END.pack(size, zlib.crc32(data) if crc is None else crc), UPLOAD_STATUS)
+        state.elapsed = time.monotonic() - started_at
+        if progress is not None:
+            progress(state)
+        if status == UPLOAD_INCOMPLETE:
+            raise UploadError("Printer reports the upload is incomplete")
+        if status != UPLOAD_OK:
+            raise UploadError("Printer reports the uploaded file is corrupted")
+        return state
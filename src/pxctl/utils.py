@@ -1,34 +1,117 @@
-from typing import List, Set
-import ipaddress
-
-import netifaces
+import os
+import socket
+import time
+from fnmatch import fnmatch
+from typing import Dict, Iterable, List, Set, Tuple
 
 from .enums import PrinterType
 
+SYS_CLASS_NET = "/sys/class/net"
+# container and VM plumbing, probes sent there never reach a printer
+VIRTUAL_INTERFACE_PREFIXES = (
+    "docker", "veth", "br-", "virbr", "vnet", "vmnet", "cni", "flannel", "cali", "weave",
+    "lxc", "lxd", "podman", "tap", "ifb", "dummy", "kube", "tailscale", "wg", "zt",
+)
+INTERFACE_CACHE_TTL = 60.0
+
 
 class NetworkUtils:
+    __cache: Dict[tuple, Tuple[float, Set[str]]] = {}
+
+    @staticmethod
+    def list_interfaces() -> List[Tuple[int, str]]:
+        """Gets (index, name) of all network interfaces without querying their addresses"""
+        try:
+            return socket.if_nameindex()
+        except (AttributeError, OSError):
+            import netifaces
+
+            return list(enumerate(netifaces.interfaces()))
+
     @staticmethod
-    def get_all_ipv4_broadcast_addresses() -> Set[str]:
-        """Gets all ipv4 broadcast addresses
+    def is_loopback(name: str) -> bool:
+        return name == "lo" or (name.startswith("lo") and name[2:].isdigit())
+
+    @staticmethod
+    def is_virtual(name: str) -> bool:
+        if name.startswith(VIRTUAL_INTERFACE_PREFIXES):
+            return True
+        path = os.path.join(SYS_CLASS_NET, name)
+        return os.path.islink(path) and "/devices/virtual/" in os.path.realpath(path)
+
+    @staticmethod
+    def is_down(name: str) -> bool:
+        try:
+            with open(os.path.join(SYS_CLASS_NET, name, "operstate"), "r") as f:
+                return f.read().strip() == "down"
+        except OSError:
+            # no sysfs, e.g. macOS, the interface is asked for its addresses anyway
+            return False
+
+    @classmethod
+    def select_interfaces(cls, include: Iterable[str] = (), exclude: Iterable[str] = ()) -> List[str]:
+        """Picks the interfaces to broadcast on
+
+        Loopback, virtual and down interfaces are skipped unless they match an
+        include pattern, interfaces matching an exclude pattern are always skipped.
+
+        Args:
+            include (Iterable[str]): shell patterns, e.g. 'eth*', only matching interfaces are used if given
+            exclude (Iterable[str]): shell patterns of interfaces never used
+
+        Returns:
+            List[str]: interface names
+        """
+        include, exclude = list(include), list(exclude)
+        selected = []
+        for _, name in cls.list_interfaces():
+            if any(fnmatch(name, pattern) for pattern in exclude):
+                continue
+            if include:
+                if any(fnmatch(name, pattern) for pattern in include) and not cls.is_down(name):
+                    selected.append(name)
+                continue
+            if cls.is_loopback(name) or cls.is_virtual(name) or cls.is_down(name):
+                continue
+            selected.append(name)
+        return selected
+
+    @classmethod
+    def get_all_ipv4_broadcast_addresses(cls, include: Iterable[str] = (), exclude: Iterable[str] = ()) -> Set[str]:
+        """Gets ipv4 broadcast addresses of the selected interfaces
+
+        The result is cached until the set of interfaces changes, addresses
+        are re-read at most every INTERFACE_CACHE_TTL seconds in case DHCP
+        changed them.
+
+        Args:
+            include (Iterable[str]): shell patterns of the interfaces to use, see select_interfaces
+            exclude (Iterable[str]): shell patterns of the interfaces to skip
 
         Returns:
             Set[str]: all broadcast addresses
         """
+        key = (tuple(cls.list_interfaces()), tuple(include), tuple(exclude))
+        cached = cls.__cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < INTERFACE_CACHE_TTL:
+            return set(cached[1])
+
+        import netifaces
+
         broadcast_addresses = set()
-        interfaces = netifaces.interfaces()
-        for interface in interfaces:
-            interface_data: dict = netifaces.ifaddresses(interface)
-            for data_values in interface_data.values():
-                for data in data_values:
-                    if not data.get("netmask"):
-                        continue
-                    broadcast_addr = data.get("broadcast")
-                    if not broadcast_addr:
-                        continue
-                    if not isinstance(ipaddress.ip_address(broadcast_addr), ipaddress.IPv4Address):
-                        continue
-                    broadcast_addresses.add(broadcast_addr)
-        return broadcast_addresses
+        for interface in cls.select_interfaces(include, exclude):
+            try:
+                addresses = netifaces.ifaddresses(interface).get(netifaces.AF_INET, [])
+            except ValueError:
+                # gone since it was listed
+                continue
+            for data in addresses:
+                if data.get("netmask") and data.get("broadcast"):
+                    broadcast_addresses.add(data["broadcast"])
+
+        cls.__cache.clear()
+        cls.__cache[key] = (time.monotonic(), broadcast_addresses)
+        return set(broadcast_addresses)
 
 
 class MagicPicasoConverters:
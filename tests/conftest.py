@@ -0,0 +1,17 @@
+import pytest
+
+from pxctl import experimental
+from tools.simulator import Simulator
+
+
+@pytest.fixture
+def simulator():
+    with Simulator(count=2, seed=1) as simulator:
+        yield simulator
+
+
+@pytest.fixture
+def experimental_commands():
+    experimental.enable()
+    yield
+    experimental.disable()
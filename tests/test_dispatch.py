@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from pxctl.dispatch import BatchUploader
+from pxctl.experimental import ExperimentalCommandError
+
+
+@pytest.fixture
+def model(tmp_path):
+    path = tmp_path / "model.plgx"
+    path.write_bytes(os.urandom(100 * 1024))
+    return path
+
+
+def test_batch_upload_is_refused_unless_enabled(simulator, model):
+    with pytest.raises(ExperimentalCommandError):
+        BatchUploader(simulator.addresses).upload(str(model))
+    assert all(printer.storage.find("", model.name) is None for printer in simulator.printers)
+
+
+def test_batch_upload_starts_the_task_on_every_printer(simulator, model, experimental_commands):
+    done = []
+    results = BatchUploader(simulator.addresses, parallel=1, bandwidth=10e6).upload(
+        str(model), "cube.plgx", start=True, done=lambda result, batch: done.append(result.address)
+    )
+    assert sorted(done) == sorted(results) == sorted(simulator.addresses)
+    for printer in simulator.printers:
+        result = results[printer.address]
+        assert result.ok and result.started
+        assert result.progress.acked == model.stat().st_size
+        assert printer.storage.find("", "cube.plgx") == model.read_bytes()
+        assert printer.task_name == "cube.plgx"
+
+
+def test_batch_upload_reports_unreachable_printers(simulator, model, experimental_commands):
+    # nothing listens on the address after the simulated fleet
+    addresses = simulator.addresses + ["127.0.1.3"]
+    results = BatchUploader(addresses).upload(str(model))
+    assert [address for address, result in results.items() if not result.ok] == ["127.0.1.3"]
@@ -0,0 +1,61 @@
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from pxctl.exporter import MetricsExporter
+
+UNREACHABLE = "127.0.1.3"
+
+
+@pytest.fixture
+def exporter(simulator):
+    # one poll round for the whole test, later scrapes must be served from it
+    exporter = MetricsExporter(simulator.addresses + [UNREACHABLE], interval=60.0, timeout=0.2)
+    exporter.start("127.0.0.1", 0)
+    thread = threading.Thread(target=exporter.serve_forever, daemon=True)
+    thread.start()
+    yield exporter
+    exporter.stop()
+    thread.join()
+
+
+def scrape(exporter: MetricsExporter, path: str = "/metrics") -> str:
+    host, port = exporter.server_address
+    with urllib.request.urlopen(f"http://{host}:{port}{path}", timeout=5) as response:
+        assert response.headers["Content-Type"].startswith("application/openmetrics-text")
+        return response.read().decode("utf-8")
+
+
+def wait_for_poll(exporter: MetricsExporter, address: str) -> str:
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        payload = scrape(exporter)
+        if f'pxctl_polls_total{{address="{address}"}} 1' in payload:
+            return payload
+        time.sleep(0.05)
+    pytest.fail(f"{address} wasn't polled")
+
+
+def test_scrape_serves_the_polled_fleet(simulator, exporter):
+    payload = wait_for_poll(exporter, UNREACHABLE)
+    assert payload.endswith("# EOF\n")
+    for address in simulator.addresses:
+        assert f'pxctl_up{{address="{address}"}} 1' in payload
+        assert f'pxctl_poll_timeouts_total{{address="{address}"}} 0' in payload
+    assert f'pxctl_up{{address="{UNREACHABLE}"}} 0' in payload
+    assert f'pxctl_poll_timeouts_total{{address="{UNREACHABLE}"}} 1' in payload
+
+
+def test_scrapes_never_poll_the_printers(simulator, exporter):
+    payload = wait_for_poll(exporter, UNREACHABLE)
+    for _ in range(5):
+        assert scrape(exporter, "/") == payload
+
+
+def test_unknown_path_is_not_found(exporter):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        scrape(exporter, "/status")
+    assert error.value.code == 404
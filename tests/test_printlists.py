@@ -0,0 +1,38 @@
+import pytest
+
+from pxctl.connection import Connection
+from pxctl.experimental import ExperimentalCommandError
+from pxctl.printer_service import PrinterService
+
+
+def test_printlist_commands_are_refused_unless_enabled(simulator):
+    simulator.printers[0].storage.printlists["weekend"] = {"model.plgx": b"G28"}
+    with Connection(simulator.addresses[0]) as connection:
+        service = PrinterService(connection)
+        for command in (
+            service.get_printlists,
+            lambda: service.get_tasks("weekend"),
+            lambda: service.create_printlist("monday"),
+            lambda: service.delete_printlist("weekend"),
+            lambda: service.delete_task("model.plgx", "weekend"),
+        ):
+            with pytest.raises(ExperimentalCommandError):
+                command()
+    assert simulator.printers[0].storage.printlists == {"": {}, "weekend": {"model.plgx": b"G28"}}
+
+
+def test_printlists_and_tasks(simulator, experimental_commands):
+    storage = simulator.printers[0].storage
+    with Connection(simulator.addresses[0]) as connection:
+        service = PrinterService(connection)
+        assert service.create_printlist("weekend")
+        assert not service.create_printlist("weekend")
+        storage.printlists["weekend"]["model.plgx"] = b"G28"
+        assert sorted(printlist.name for printlist in service.get_printlists()) == ["", "weekend"]
+        assert [(task.name, task.size) for task in service.get_tasks("weekend")] == [("model.plgx", 3)]
+
+        assert service.delete_task("model.plgx", "weekend")
+        assert not service.delete_task("model.plgx", "weekend")
+        assert service.get_tasks("weekend") == []
+        assert service.delete_printlist("weekend")
+    assert "weekend" not in storage.printlists
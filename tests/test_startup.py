@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+from tools.simulator import startup
+
+# import times depend on the machine and its neighbours, shared runners get some slack,
+# python -m tools.simulator.startup checks the exact budgets
+SLACK = float(os.environ.get("PXCTL_IMPORT_SLACK", "1.5"))
+
+
+@pytest.fixture(scope="module")
+def results():
+    results, _ = startup.run(SLACK, repeat=3)
+    return {result["command"].split(" -a ")[0]: result for result in results}
+
+
+@pytest.mark.parametrize("command", [command.split(" -a ")[0] for command, _, _, _ in startup.COMMANDS])
+def test_command_stays_within_import_budget(results, command):
+    result = results[command]
+    assert not result["forbidden"], f"{command} loads {', '.join(result['forbidden'])}"
+    assert result["modules"] <= result["max_modules"]
+    assert result["imports_ms"] <= result["budget_ms"]
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from pxctl.connection import Connection
+from pxctl.experimental import ExperimentalCommandError
+from pxctl.printer_service import PrinterService
+from pxctl.upload import BandwidthLimiter, Uploader, UploadProgress
+
+
+class Interrupted(Exception):
+    pass
+
+
+def interrupt(progress: UploadProgress):
+    raise Interrupted()
+
+
+@pytest.fixture
+def model(tmp_path):
+    path = tmp_path / "model.plgx"
+    path.write_bytes(os.urandom(256 * 1024 + 123))
+    return path
+
+
+def test_upload_is_refused_unless_enabled(simulator, model):
+    with Connection(simulator.addresses[0]) as connection:
+        with pytest.raises(ExperimentalCommandError):
+            Uploader(connection).upload(str(model))
+        with pytest.raises(ExperimentalCommandError):
+            PrinterService(connection).start_task(model.name)
+    assert simulator.printers[0].storage.find("", model.name) is None
+
+
+def test_upload_stores_the_file(simulator, model, experimental_commands):
+    with Connection(simulator.addresses[0]) as connection:
+        progress = Uploader(connection).upload(str(model), printlist="weekend")
+    assert progress.acked == progress.total == model.stat().st_size
+    assert progress.resumed_from == 0
+    assert simulator.printers[0].storage.find("weekend", model.name) == model.read_bytes()
+    assert simulator.printers[1].storage.find("weekend", model.name) is None
+
+
+def test_interrupted_upload_is_resumed(simulator, model, experimental_commands):
+    with Connection(simulator.addresses[0]) as connection:
+        # slow enough for the first progress report to arrive mid transfer
+        with pytest.raises(Interrupted):
+            Uploader(connection, limiter=BandwidthLimiter(400_000)).upload(str(model), progress=interrupt)
+        assert simulator.printers[0].storage.find("", model.name) is None
+
+        progress = Uploader(connection).upload(str(model))
+    assert 0 < progress.resumed_from < progress.total
+    assert simulator.printers[0].storage.find("", model.name) == model.read_bytes()
+
+
+def test_start_task_starts_an_uploaded_task(simulator, model, experimental_commands):
+    printer = simulator.printers[0]
+    with Connection(printer.address) as connection:
+        service = PrinterService(connection)
+        assert not service.start_task(model.name)
+        Uploader(connection).upload(str(model), name="cube.plgx")
+        assert service.start_task("cube.plgx")
+    assert printer.task_name == "cube.plgx"
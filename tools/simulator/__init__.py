@@ -0,0 +1,2 @@
+from .printer import VirtualPrinter
+from .server import Simulator
@@ -0,0 +1,36 @@
+import argparse
+
+from .server import Simulator
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m tools.simulator",
+                                     description="Run a fleet of virtual printers on loopback addresses.")
+    parser.add_argument("-n", "--count", type=int, default=1, help="Number of virtual printers. Default: %(default)s")
+    parser.add_argument("--first-address", type=str, default="127.0.1.1",
+                        help="Address of the first printer, the others follow it. Default: %(default)s")
+    parser.add_argument("--latency", type=float, default=0.0, help="Reply delay in seconds. Default: %(default)s")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="Random extra reply delay up to JITTER seconds. Default: %(default)s")
+    parser.add_argument("--loss", type=float, default=0.0, help="Probability to drop a reply. Default: %(default)s")
+    parser.add_argument("--reorder", type=float, default=0.0,
+                        help="Probability to hold a reply back behind the next ones. Default: %(default)s")
+    parser.add_argument("--print-time", type=float, default=3600.0,
+                        help="Duration of the simulated print in seconds. Default: %(default)s")
+    parser.add_argument("--prepare-time", type=float, default=30.0,
+                        help="Duration of the preparation before the simulated print in seconds. Default: %(default)s")
+    args = parser.parse_args()
+
+    simulator = Simulator(args.count, first_address=args.first_address, latency=args.latency, jitter=args.jitter,
+                          loss=args.loss, reorder=args.reorder, print_time=args.print_time,
+                          prepare_time=args.prepare_time)
+    simulator.start()
+    print(f"Simulating {args.count} printers: {simulator.addresses[0]} - {simulator.addresses[-1]}", flush=True)
+    try:
+        simulator.wait()
+    except KeyboardInterrupt:
+        simulator.stop()
+
+
+if __name__ == '__main__':
+    main()
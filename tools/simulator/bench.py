@@ -0,0 +1,130 @@
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+from pxctl.async_printer_service import AsyncPrinterService
+from pxctl.connection import Connection
+from pxctl.printer_service import PrinterService
+
+from .server import Simulator
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100.0 * len(ordered)))]
+
+
+def _summary(latencies: List[float], elapsed: float, failures: int) -> Dict[str, float]:
+    return {
+        "polls_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000.0,
+        "p99_ms": percentile(latencies, 99) * 1000.0,
+        "failures": failures,
+    }
+
+
+def bench_discovery(simulator: Simulator, timeout: float) -> Dict[str, float]:
+    started_at = time.perf_counter()
+    printers = PrinterService.discover_printers(
+        timeout=timeout,
+        expect=len(simulator.printers),
+        broadcast_addresses=[simulator.broadcast_address],
+    )
+    return {"discovery_s": time.perf_counter() - started_at, "discovered": len(printers)}
+
+
+def bench_sync_polls(simulator: Simulator, rounds: int) -> Dict[str, float]:
+    latencies = []
+    failures = 0
+    started_at = time.perf_counter()
+    for address in simulator.addresses:
+        with Connection(address) as connection:
+            print_service = PrinterService(connection)
+            for _ in range(rounds):
+                sent_at = time.perf_counter()
+                if print_service.get_printing_info() is None:
+                    failures += 1
+                    continue
+                latencies.append(time.perf_counter() - sent_at)
+    return _summary(latencies, time.perf_counter() - started_at, failures)
+
+
+async def _async_polls(simulator: Simulator, rounds: int) -> Dict[str, float]:
+    latencies = []
+    failures = 0
+
+    async def poll(print_service: AsyncPrinterService, address: str):
+        nonlocal failures
+        sent_at = time.perf_counter()
+        if await print_service.get_printing_info(address) is None:
+            failures += 1
+            return
+        latencies.append(time.perf_counter() - sent_at)
+
+    async with AsyncPrinterService(simulator.addresses) as print_service:
+        started_at = time.perf_counter()
+        for _ in range(rounds):
+            await asyncio.gather(*(poll(print_service, address) for address in simulator.addresses))
+        return _summary(latencies, time.perf_counter() - started_at, failures)
+
+
+def bench_async_polls(simulator: Simulator, rounds: int) -> Dict[str, float]:
+    return asyncio.run(_async_polls(simulator, rounds))
+
+
+def run(sizes: List[int], rounds: int, discovery_timeout: float, **impairments) -> List[dict]:
+    results = []
+    for size in sizes:
+        with Simulator(size, seed=size, **impairments) as simulator:
+            result = {"printers": size}
+            result.update(bench_discovery(simulator, discovery_timeout))
+            result.update({f"sync_{k}": v for k, v in bench_sync_polls(simulator, rounds).items()})
+            result.update({f"async_{k}": v for k, v in bench_async_polls(simulator, rounds).items()})
+            results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m tools.simulator.bench",
+                                     description="Benchmark discovery and polling against simulated fleets.")
+    parser.add_argument("--sizes", type=str, default="1,10,50,200",
+                        help="Comma separated fleet sizes. Default: %(default)s")
+    parser.add_argument("--rounds", type=int, default=20, help="Polls per printer. Default: %(default)s")
+    parser.add_argument("--discovery-timeout", type=float, default=3.0,
+                        help="Discovery deadline in seconds. Default: %(default)s")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated reply delay in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Simulated random extra delay in seconds.")
+    parser.add_argument("--loss", type=float, default=0.0, help="Simulated reply loss probability.")
+    parser.add_argument("--reorder", type=float, default=0.0, help="Simulated reply reorder probability.")
+    parser.add_argument("-j", "--json", help="Output the results in JSON format.", action="store_true")
+    args = parser.parse_args()
+
+    results = run(
+        [int(size) for size in args.sizes.split(",")],
+        args.rounds,
+        args.discovery_timeout,
+        latency=args.latency,
+        jitter=args.jitter,
+        loss=args.loss,
+        reorder=args.reorder,
+    )
+
+    if args.json:
+        print(json.dumps(results))
+        return
+
+    widths = {column: max(len(column), 10) for column in results[0]}
+    print("  ".join(f"{column:>{width}}" for column, width in widths.items()))
+    for result in results:
+        print("  ".join(
+            f"{value:>{widths[column]}.3f}" if isinstance(value, float) else f"{value:>{widths[column]}}"
+            for column, value in result.items()
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+import math
+import random
+import struct
+import time
+
+from typing import Callable, Dict
+
+from pxctl.codecs import c_string
+from pxctl.connection import command_code
+from pxctl.enums import NetPrinterState, PrinterType
+from pxctl.printer_service import (
+    PRINTLIST_CREATE_CODE,
+    PRINTLIST_DELETE_CODE,
+    PRINTLISTS_CODE,
+    TASK_DELETE_CODE,
+    TASK_START,
+    TASK_START_CODE,
+    TASK_STATUS,
+    TASKS_CODE,
+)
+from pxctl.upload import UPLOAD_BEGIN_CODE, UPLOAD_CHUNK_CODE, UPLOAD_END_CODE
+from pxctl.utils import MagicPicasoConverters
+
+from .storage import TaskStorage
+
+STATUS_FORMAT = struct.Struct("8xB7x?255sh1xf15xff4xff28x")
+PRINTER_INFO_FORMAT = struct.Struct("2x6xBB3x20x20s47x40s10x40sx")
+HEADER_SIZE = 8
+
+
+class VirtualPrinter:
+    """State of a simulated printer, frames are built from the wall clock.
+
+    The printer prepares for a while, prints its task for print_time seconds,
+    then stays idle until the task is restarted.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        serial: str,
+        printer_type: PrinterType = PrinterType.DesignerXPro,
+        task_name: str = "model.plgx",
+        print_time: float = 3600.0,
+        prepare_time: float = 30.0,
+        seed: int | None = None,
+    ):
+        self.address = address
+        self.serial = serial
+        self.printer_type = printer_type
+        self.task_name = task_name
+        self.print_time = print_time
+        self.prepare_time = prepare_time
+        self.left_extruder_profile = "PLA"
+        self.right_extruder_profile = "PLA"
+        self.beeping = False
+        self.state_override: NetPrinterState | None = None
+        self.storage = TaskStorage()
+        self.handlers: Dict[int, Callable[[bytes], bytes | None]] = {
+            0x01: self.status_frame,
+            0x0C: self.info_frame,
+            0x0E: self.beep_on,
+            0x0F: self.beep_off,
+            UPLOAD_BEGIN_CODE: self.storage.upload_begin,
+            UPLOAD_CHUNK_CODE: self.storage.upload_chunk,
+            UPLOAD_END_CODE: self.storage.upload_end,
+            TASK_START_CODE: self.start_task,
+            PRINTLISTS_CODE: self.storage.list_printlists,
+            TASKS_CODE: self.storage.list_tasks,
+            PRINTLIST_CREATE_CODE: self.storage.create_printlist,
+            PRINTLIST_DELETE_CODE: self.storage.delete_printlist,
+            TASK_DELETE_CODE: self.storage.delete_task,
+        }
+        self.__random = random.Random(seed)
+        self.__started_at = time.monotonic() - self.__random.uniform(0, prepare_time + print_time)
+
+    def restart_task(self, task_name: str | None = None):
+        if task_name is not None:
+            self.task_name = task_name
+        self.__started_at = time.monotonic()
+
+    def __progress(self) -> tuple[NetPrinterState, float]:
+        elapsed = time.monotonic() - self.__started_at
+        if elapsed < self.prepare_time:
+            return NetPrinterState.npstPrepareForPrinting, 0.0
+        elapsed -= self.prepare_time
+        if elapsed < self.print_time:
+            return NetPrinterState.npstPrinting, 100.0 * elapsed / self.print_time
+        return NetPrinterState.npstIdle, 100.0
+
+    def __temperature(self, target: float, heating: bool) -> float:
+        noise = self.__random.gauss(0.0, 0.3)
+        if not heating:
+            return 25.0 + noise
+        return target + 1.5 * math.sin(time.monotonic() / 7.0) + noise
+
+    def status_frame(self, header: bytes) -> bytes:
+        state, progress = self.__progress()
+        if self.state_override is not None:
+            state = self.state_override
+        heating = state in (NetPrinterState.npstPrinting, NetPrinterState.npstPrepareForPrinting)
+        frame = STATUS_FORMAT.pack(
+            state.value,
+            state == NetPrinterState.npstIdle,
+            self.task_name.encode("utf-8"),
+            int(state == NetPrinterState.npstPrinting),
+            progress,
+            self.__temperature(210.0, heating),
+            self.__temperature(215.0, heating),
+            self.__temperature(60.0, heating),
+            0.0,
+        )
+        return header[:HEADER_SIZE] + frame[HEADER_SIZE:]
+
+    def info_frame(self, header: bytes) -> bytes:
+        try:
+            hi_hw_version = MagicPicasoConverters.HW_to_type.index(self.printer_type)
+        except ValueError:
+            hi_hw_version = 0
+        frame = PRINTER_INFO_FORMAT.pack(
+            1,
+            hi_hw_version,
+            self.serial.encode("utf-8"),
+            self.left_extruder_profile.encode("utf-8"),
+            self.right_extruder_profile.encode("utf-8"),
+        )
+        return header[:HEADER_SIZE] + frame[HEADER_SIZE:]
+
+    def ack_frame(self, header: bytes) -> bytes:
+        return header[:HEADER_SIZE]
+
+    def beep_on(self, header: bytes) -> bytes:
+        self.beeping = True
+        return self.ack_frame(header)
+
+    def beep_off(self, header: bytes) -> bytes:
+        self.beeping = False
+        return self.ack_frame(header)
+
+    def start_task(self, frame: bytes) -> bytes:
+        printlist, name = TASK_START.unpack_from(frame, HEADER_SIZE)
+        printlist, name = c_string(printlist), c_string(name)
+        found = self.storage.find(printlist, name) is not None
+        if found:
+            self.restart_task(name)
+        return frame[:HEADER_SIZE] + TASK_STATUS.pack(0 if found else 1)
+
+    def handle(self, frame: bytes) -> bytes | None:
+        """Builds the reply to a command frame
+
+        Args:
+            frame (bytes): command frame
+
+        Returns:
+            bytes | None: the reply, None for unknown commands
+        """
+        handler = self.handlers.get(command_code(frame))
+        if handler is None:
+            return None
+        return handler(frame)
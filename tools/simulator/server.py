@@ -0,0 +1,172 @@
+import asyncio
+import ipaddress
+import random
+import socket
+import sys
+import threading
+from typing import Callable, List, Tuple
+
+from .printer import VirtualPrinter
+
+DISCOVERY_REPLY = "PICASO3D".encode("ascii")
+
+
+class _Endpoint(asyncio.DatagramProtocol):
+    def __init__(self, on_datagram: Callable[["_Endpoint", bytes, Tuple[str, int]], None]):
+        self.__on_datagram = on_datagram
+        self.transport: asyncio.DatagramTransport | None = None
+
+    def connection_made(self, transport: asyncio.DatagramTransport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]):
+        self.__on_datagram(self, data, addr)
+
+    def error_received(self, exc: Exception):
+        pass
+
+
+class Simulator:
+    """A fleet of virtual printers answering on loopback addresses.
+
+    Every printer listens on its own 127.x.y.z address, so replies come from
+    distinct sources just like from a real fleet. Broadcast discovery probes
+    sent to 127.255.255.255 are answered by all of them.
+    """
+
+    def __init__(
+        self,
+        count: int = 1,
+        first_address: str = "127.0.1.1",
+        port: int = 54321,
+        discovery_port: int = 49149,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        loss: float = 0.0,
+        reorder: float = 0.0,
+        seed: int | None = None,
+        **printer_kwargs,
+    ):
+        first = ipaddress.IPv4Address(first_address)
+        self.printers: List[VirtualPrinter] = [
+            VirtualPrinter(
+                str(first + i),
+                f"SIM{i:05d}",
+                seed=None if seed is None else seed + i,
+                **printer_kwargs,
+            )
+            for i in range(count)
+        ]
+        self.__port = port
+        self.__discovery_port = discovery_port
+        self.__latency = latency
+        self.__jitter = jitter
+        self.__loss = loss
+        self.__reorder = reorder
+        self.__random = random.Random(seed)
+        self.__loop: asyncio.AbstractEventLoop | None = None
+        self.__thread: threading.Thread | None = None
+        self.__endpoints: List[_Endpoint] = []
+        self.__error: Exception | None = None
+
+    @property
+    def addresses(self) -> List[str]:
+        return [printer.address for printer in self.printers]
+
+    @property
+    def broadcast_address(self) -> str:
+        return "127.255.255.255"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def __deliver(self, endpoint: _Endpoint, frame: bytes | None, addr: Tuple[str, int]):
+        if frame is None or self.__random.random() < self.__loss:
+            return
+        delay = self.__latency + self.__random.uniform(0.0, self.__jitter)
+        if self.__random.random() < self.__reorder:
+            # held back long enough for the following replies to overtake it
+            delay += self.__latency + self.__jitter + 0.001
+        if delay <= 0:
+            endpoint.transport.sendto(frame, addr)
+        else:
+            self.__loop.call_later(delay, endpoint.transport.sendto, frame, addr)
+
+    async def __open(self):
+        loop = asyncio.get_running_loop()
+        printer_endpoints = []
+        for printer in self.printers:
+            _, command_endpoint = await loop.create_datagram_endpoint(
+                lambda printer=printer: _Endpoint(
+                    lambda endpoint, data, addr: self.__deliver(endpoint, printer.handle(data), addr)
+                ),
+                local_addr=(printer.address, self.__port),
+            )
+            discovery_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            discovery_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            discovery_sock.bind((printer.address, self.__discovery_port))
+            _, discovery_endpoint = await loop.create_datagram_endpoint(
+                lambda: _Endpoint(
+                    lambda endpoint, data, addr: self.__deliver(endpoint, DISCOVERY_REPLY, addr)
+                ),
+                sock=discovery_sock,
+            )
+            self.__endpoints += [command_endpoint, discovery_endpoint]
+            printer_endpoints.append(discovery_endpoint)
+
+        def on_broadcast(endpoint: _Endpoint, data: bytes, addr: Tuple[str, int]):
+            for discovery_endpoint in printer_endpoints:
+                self.__deliver(discovery_endpoint, DISCOVERY_REPLY, addr)
+
+        broadcast_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        broadcast_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            broadcast_sock.bind(("", self.__discovery_port))
+        except OSError as e:
+            broadcast_sock.close()
+            print(f"Broadcast discovery is not simulated: {e}", file=sys.stderr)
+            return
+        _, broadcast_endpoint = await loop.create_datagram_endpoint(
+            lambda: _Endpoint(on_broadcast), sock=broadcast_sock
+        )
+        self.__endpoints.append(broadcast_endpoint)
+
+    def __run(self, ready: threading.Event):
+        asyncio.set_event_loop(self.__loop)
+        try:
+            self.__loop.run_until_complete(self.__open())
+        except Exception as e:
+            self.__error = e
+        ready.set()
+        if self.__error is None:
+            self.__loop.run_forever()
+        for endpoint in self.__endpoints:
+            if endpoint.transport is not None:
+                endpoint.transport.close()
+        self.__loop.run_until_complete(asyncio.sleep(0))
+        self.__loop.close()
+
+    def start(self):
+        self.__loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, args=(ready,), name="pxctl-simulator", daemon=True)
+        self.__thread.start()
+        ready.wait()
+        if self.__error is not None:
+            self.__thread.join()
+            raise self.__error
+
+    def stop(self):
+        if self.__thread is None:
+            return
+        if self.__error is None:
+            self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
+        self.__thread = None
+
+    def wait(self):
+        self.__thread.join()
@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+from .server import Simulator
+
+# Every command runs against a simulated printer in a fresh interpreter, its
+# imports are measured with -X importtime against a budget in milliseconds
+# and a budget of modules on top of a bare interpreter. Modules a command
+# must not load are listed with it, e.g. a plain beep has no use for
+# tabulate or netifaces.
+COMMANDS: List[Tuple[str, float, int, Tuple[str, ...]]] = [
+    ("beep enable -a {address} --no-daemon", 100.0, 90, ("asyncio", "netifaces", "tabulate")),
+    ("show --json -a {address} --no-daemon", 120.0, 115, ("asyncio", "netifaces", "tabulate")),
+    ("show -a {address} --no-daemon", 180.0, 170, ("asyncio", "netifaces")),
+    ("discover --json --no-daemon -t 0.2", 100.0, 90, ("asyncio", "tabulate")),
+]
+
+
+def _environment() -> Dict[str, str]:
+    # the measured interpreter imports the same pxcli as this one, installed or from the source tree
+    import pxcli
+
+    source = os.path.dirname(os.path.dirname(os.path.abspath(pxcli.__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(path for path in (source, env.get("PYTHONPATH")) if path)
+    return env
+
+
+def import_times(argv: List[str]) -> Dict[str, int]:
+    """Runs python -X importtime and gets the imported modules
+
+    Args:
+        argv (List[str]): python arguments after -X importtime
+
+    Returns:
+        Dict[str, int]: module name -> cumulative import microseconds, 0 for nested imports
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *argv],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        env=_environment(),
+    )
+    imports = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        try:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            cumulative = int(cumulative)
+        except ValueError:
+            continue
+        module = name.strip()
+        # nested imports are already part of the cumulative time of their importer
+        nested = name.startswith("  ")
+        imports[module] = imports.get(module, 0) + (0 if nested else cumulative)
+    return imports
+
+
+def fastest_import_times(argv: List[str], repeat: int) -> Dict[str, int]:
+    # other processes only ever add to import times, the fastest run is the one closest to the real cost
+    return min((import_times(argv) for _ in range(repeat)), key=lambda imports: sum(imports.values()))
+
+
+def measure(
+    command: str,
+    budget: float,
+    max_modules: int,
+    forbidden: Tuple[str, ...],
+    baseline: Dict[str, int],
+    repeat: int = 1,
+) -> dict:
+    code = f"import sys; sys.argv = ['pxctl'] + {command.split()!r}; from pxcli.main import main; main()"
+    imports = fastest_import_times(["-c", code], repeat)
+    total = sum(imports.values()) - sum(baseline.values())
+    return {
+        "command": command,
+        "imports_ms": total / 1000.0,
+        "budget_ms": budget,
+        "modules": len(imports) - len(baseline),
+        "max_modules": max_modules,
+        "forbidden": [module for module in forbidden if module in imports],
+    }
+
+
+def run(slack: float = 1.0, repeat: int = 1) -> Tuple[List[dict], bool]:
+    simulator = Simulator(count=1, prepare_time=0.0)
+    simulator.start()
+    try:
+        baseline = fastest_import_times(["-c", "pass"], repeat)
+        results = [
+            measure(command.format(address=simulator.addresses[0]), budget * slack, max_modules, forbidden, baseline, repeat)
+            for command, budget, max_modules, forbidden in COMMANDS
+        ]
+    finally:
+        simulator.stop()
+    ok = all(
+        result["imports_ms"] <= result["budget_ms"] and result["modules"] <= result["max_modules"] and not result["forbidden"]
+        for result in results
+    )
+    return results, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m tools.simulator.startup",
+                                     description="Measure the import time of pxctl commands against a budget.")
+    parser.add_argument("--slack", type=float, default=1.0, metavar="FACTOR",
+                        help="Multiply the import time budget of every command, e.g. on slow CI machines. Default: %(default)s")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="Run every command this many times and keep the fastest run. Default: %(default)s")
+    parser.add_argument("-j", "--json", help="Output the results in JSON format.", action="store_true")
+    args = parser.parse_args()
+
+    results, ok = run(args.slack, args.repeat)
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for result in results:
+            forbidden = f", loads {', '.join(result['forbidden'])}" if result["forbidden"] else ""
+            print(
+                f"{result['imports_ms']:7.1f} / {result['budget_ms']:5.0f} ms {result['modules']:4d} / {result['max_modules']:3d} modules  "
+                f"{result['command']}{forbidden}"
+            )
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from pxctl.codecs import HEADER, c_string
+from pxctl.printer_service import (
+    PAGE_HEADER,
+    PAGE_OFFSET,
+    PRINTLIST_ENTRY,
+    PRINTLIST_NAME,
+    TASK_DELETE,
+    TASK_ENTRY,
+    TASK_STATUS,
+    TASKS_REQUEST,
+)
+from pxctl.upload import (
+    UPLOAD_BEGIN,
+    UPLOAD_CORRUPTED,
+    UPLOAD_END,
+    UPLOAD_INCOMPLETE,
+    UPLOAD_OFFSET,
+    UPLOAD_OK,
+    UPLOAD_STATUS,
+)
+
+
+@dataclass
+class _PartialUpload:
+    size: int
+    chunk_size: int
+    data: bytearray
+    received: bytearray = field(default_factory=bytearray)
+
+    def contiguous_offset(self) -> int:
+        received = self.received.find(0)
+        if received < 0:
+            return self.size
+        return received * self.chunk_size
+
+
+class TaskStorage:
+    """Print lists and uploaded tasks of a simulated printer.
+
+    Interrupted uploads are kept, so a new upload of the same file resumes
+    from the first chunk the printer is missing.
+    """
+
+    def __init__(self):
+        self.printlists: Dict[str, Dict[str, bytes]] = {"": {}}
+        self.generations: Dict[str, int] = {"": 0}
+        self.__next_generation = 1
+        self.__uploads: Dict[Tuple[str, str], _PartialUpload] = {}
+        self.__current: Tuple[str, str] | None = None
+
+    def upload_begin(self, frame: bytes) -> bytes:
+        size, chunk_size, printlist, name = UPLOAD_BEGIN.unpack_from(frame, HEADER.size)
+        key = (c_string(printlist), c_string(name))
+        upload = self.__uploads.get(key)
+        if upload is None or upload.size != size or upload.chunk_size != chunk_size:
+            chunks = (size + chunk_size - 1) // chunk_size
+            upload = self.__uploads[key] = _PartialUpload(size, chunk_size, bytearray(size), bytearray(chunks))
+        self.__current = key
+        return frame[:HEADER.size] + UPLOAD_OFFSET.pack(upload.contiguous_offset())
+
+    def upload_chunk(self, frame: bytes) -> bytes | None:
+        upload = self.__uploads.get(self.__current)
+        if upload is None:
+            return None
+        (offset,) = UPLOAD_OFFSET.unpack_from(frame, HEADER.size)
+        payload = frame[HEADER.size + UPLOAD_OFFSET.size:]
+        if offset % upload.chunk_size or offset + len(payload) > upload.size:
+            return None
+        upload.data[offset:offset + len(payload)] = payload
+        upload.received[offset // upload.chunk_size] = 1
+        return frame[:HEADER.size] + UPLOAD_OFFSET.pack(offset)
+
+    def upload_end(self, frame: bytes) -> bytes:
+        size, crc = UPLOAD_END.unpack_from(frame, HEADER.size)
+        upload = self.__uploads.get(self.__current)
+        stored = self.find(*self.__current) if self.__current else None
+        if upload is None and stored is not None and len(stored) == size and zlib.crc32(stored) == crc:
+            # the reply to the first END got lost
+            status = UPLOAD_OK
+        elif upload is None or upload.size != size or upload.contiguous_offset() < size:
+            status = UPLOAD_INCOMPLETE
+        elif zlib.crc32(upload.data) != crc:
+            status = UPLOAD_CORRUPTED
+            del self.__uploads[self.__current]
+        else:
+            status = UPLOAD_OK
+            printlist, name = self.__current
+            self.printlists.setdefault(printlist, {})[name] = bytes(upload.data)
+            self.__touch(printlist)
+            del self.__uploads[self.__current]
+        return frame[:HEADER.size] + UPLOAD_STATUS.pack(status)
+
+    def find(self, printlist: str, name: str) -> bytes | None:
+        return self.printlists.get(printlist, {}).get(name)
+
+    def __touch(self, printlist: str):
+        # generations are unique across lists, a deleted and recreated list never looks unchanged
+        self.generations[printlist] = self.__next_generation
+        self.__next_generation += 1
+
+    @staticmethod
+    def __page(frame: bytes, offset: int, entries: List[bytes], page_size: int) -> bytes:
+        page = entries[offset:offset + page_size]
+        return frame[:HEADER.size] + PAGE_HEADER.pack(len(entries), len(page)) + b"".join(page)
+
+    def list_printlists(self, frame: bytes) -> bytes:
+        (offset,) = PAGE_OFFSET.unpack_from(frame, HEADER.size)
+        entries = [
+            PRINTLIST_ENTRY.pack(name.encode("utf-8"), len(tasks), self.generations[name])
+            for name, tasks in self.printlists.items()
+        ]
+        return self.__page(frame, offset, entries, 16)
+
+    def list_tasks(self, frame: bytes) -> bytes:
+        printlist, offset = TASKS_REQUEST.unpack_from(frame, HEADER.size)
+        tasks = self.printlists.get(c_string(printlist), {})
+        entries = [TASK_ENTRY.pack(len(data), name.encode("utf-8")) for name, data in tasks.items()]
+        return self.__page(frame, offset, entries, 6)
+
+    def create_printlist(self, frame: bytes) -> bytes:
+        name = c_string(PRINTLIST_NAME.unpack_from(frame, HEADER.size)[0])
+        created = name not in self.printlists
+        if created:
+            self.printlists[name] = {}
+            self.__touch(name)
+        return frame[:HEADER.size] + TASK_STATUS.pack(0 if created else 1)
+
+    def delete_printlist(self, frame: bytes) -> bytes:
+        name = c_string(PRINTLIST_NAME.unpack_from(frame, HEADER.size)[0])
+        deleted = name != "" and self.printlists.pop(name, None) is not None
+        if deleted:
+            del self.generations[name]
+        return frame[:HEADER.size] + TASK_STATUS.pack(0 if deleted else 1)
+
+    def delete_task(self, frame: bytes) -> bytes:
+        printlist, name = (c_string(raw) for raw in TASK_DELETE.unpack_from(frame, HEADER.size))
+        deleted = self.printlists.get(printlist, {}).pop(name, None) is not None
+        if deleted:
+            self.__touch(printlist)
+        return frame[:HEADER.size] + TASK_STATUS.pack(0 if deleted else 1)